@@ -0,0 +1,30 @@
+"""
+Настройки кэша, которые задаются переменными окружения.
+"""
+import os
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+
+def cache_config(env=os.environ):
+    """
+    CACHE_BACKEND=locmem|file|redis, CACHE_LOCATION - имя locmem-кэша, каталог
+    или redis://host:port/db. Локальный кэш живет внутри процесса, поэтому при
+    нескольких воркерах gunicorn инвалидация видна только в том воркере, который
+    записал изменения; для нескольких процессов нужен file или redis.
+    """
+    backend = env.get('CACHE_BACKEND', 'locmem')
+    defaults = {
+        'locmem': 'tutor',
+        'file': '/tmp/tutor-cache',
+        'redis': 'redis://127.0.0.1:6379/1',
+    }
+    return {
+        'BACKEND': CACHE_BACKENDS[backend],
+        'LOCATION': env.get('CACHE_LOCATION', defaults[backend]),
+        'TIMEOUT': int(env.get('CACHE_TIMEOUT', 300)),
+    }
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from app.cache import cache_config
+from app.db import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,6 +38,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'tutor.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', 100)),
 }
 
 # Application definition
@@ -56,6 +62,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 MIDDLEWARE = [
+    'tutor.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +71,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'tutor.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,13 +97,55 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_ENGINE=postgres переключает на PostgreSQL, см. app/db.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR / 'db.sqlite3'),
+}
+
+
+# Cache
+# CACHE_BACKEND=locmem|file|redis, см. app/cache.py
+
+CACHES = {
+    'default': cache_config(),
 }
 
+# Время жизни закэшированных ответов справочных ViewSet'ов (tutor/cache.py)
+TUTOR_RESPONSE_CACHE_TIMEOUT = int(os.getenv('TUTOR_RESPONSE_CACHE_TIMEOUT', 300))
+
+# TUTOR_ASYNC_VIEWS=1 подключает асинхронные версии тяжелых эндпоинтов чтения
+# (tutor/async_views.py) - имеет смысл при запуске под ASGI (uvicorn)
+TUTOR_ASYNC_VIEWS = os.getenv('TUTOR_ASYNC_VIEWS', '0') == '1'
+
+# Сервис истории версий (version_control/main.py), например http://versioncontrol:8001;
+# пусто - ревизии записей журнала и комментариев к урокам не отправляются
+VERSION_CONTROL_URL = os.getenv('VERSION_CONTROL_URL', '')
+VERSION_CONTROL_TIMEOUT = float(os.getenv('VERSION_CONTROL_TIMEOUT', 2))
+# Сколько ревизий ждут отправки в памяти; лишние пропускаются с предупреждением в лог
+VERSION_CONTROL_QUEUE_SIZE = int(os.getenv('VERSION_CONTROL_QUEUE_SIZE', 10000))
+
+# Метрики запросов (tutor/metrics.py, GET /metrics): предупреждение в лог, если один
+# SQL повторился за запрос столько раз или больше; 0 - не проверять
+TUTOR_NPLUSONE_THRESHOLD = int(os.getenv('TUTOR_NPLUSONE_THRESHOLD', 0))
+
+# Журнал SQL-запросов (tutor/querylog.py, manage.py query_report): отпечатки запросов,
+# медленные запросы и периодические снимки топа в ротируемые файлы, по файлу на процесс
+# (queries.<pid>.log); по умолчанию выключен
+TUTOR_QUERY_LOG = os.getenv('TUTOR_QUERY_LOG', '0') == '1'
+TUTOR_QUERY_LOG_FILE = os.getenv('TUTOR_QUERY_LOG_FILE', str(BASE_DIR / 'logs' / 'queries.log'))
+TUTOR_SLOW_QUERY_MS = float(os.getenv('TUTOR_SLOW_QUERY_MS', 100))
+TUTOR_QUERY_LOG_INTERVAL = float(os.getenv('TUTOR_QUERY_LOG_INTERVAL', 60))
+TUTOR_QUERY_LOG_TOP = int(os.getenv('TUTOR_QUERY_LOG_TOP', 50))
+# Стек вызова снимается у первого и каждого N-го выполнения отпечатка
+TUTOR_QUERY_STACK_EVERY = int(os.getenv('TUTOR_QUERY_STACK_EVERY', 100))
+
+# Профилирование запроса по X-Tutor-Profile: 1 или ?profile=1 для staff-пользователей
+# (tutor/profiling.py, GET /api/profiles/); хранятся последние TUTOR_PROFILE_KEEP профилей
+TUTOR_PROFILING = os.getenv('TUTOR_PROFILING', '0') == '1'
+TUTOR_PROFILE_DIR = os.getenv('TUTOR_PROFILE_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+TUTOR_PROFILE_INTERVAL_MS = float(os.getenv('TUTOR_PROFILE_INTERVAL_MS', 1))
+TUTOR_PROFILE_KEEP = int(os.getenv('TUTOR_PROFILE_KEEP', 100))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
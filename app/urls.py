@@ -1,9 +1,14 @@
 """
 URL configuration for app project.
 """
+from django.conf import settings
 from django.contrib import admin
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from tutor.metrics import metrics_view
+from tutor.profiling import profile_detail_view, profile_list_view
 from tutor.views import (
     TeacherViewSet,  
     LearningGoalViewSet, 
@@ -15,6 +20,9 @@ from tutor.views import (
     HomeworkViewSet,  
     JournalViewSet,  
     HomeworkResultViewSet,
+    StudentTopicMasteryViewSet,
+    AnalyticsViewSet,
+    cache_stats_view,
 )
 
 router = DefaultRouter()
@@ -28,8 +36,31 @@ router.register(r'lessons', LessonViewSet)
 router.register(r'homework', HomeworkViewSet)
 router.register(r'homework-results', HomeworkResultViewSet)
 router.register(r'journal', JournalViewSet)
+router.register(r'mastery', StudentTopicMasteryViewSet)
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+
+api_urls = router.urls
+if settings.TUTOR_ASYNC_VIEWS:
+    from tutor import async_views
+    # Асинхронные маршруты перекрывают list/generate роутера по тем же адресам
+    api_urls = async_views.urlpatterns + api_urls
+
+
+def health(request):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError as exc:
+        return JsonResponse({'status': 'unhealthy', 'database': str(exc)}, status=503)
+    return JsonResponse({'status': 'healthy', 'database': connection.vendor})
+
 
 urlpatterns = [
+    path('health', health),
+    path('metrics', metrics_view),
     path('admin/', admin.site.urls),
-    path('api/', include(router.urls)),
+    path('api/cache-stats/', cache_stats_view),
+    path('api/profiles/', profile_list_view),
+    path('api/profiles/<str:profile_id>/', profile_detail_view),
+    path('api/', include(api_urls)),
 ]
\ No newline at end of file
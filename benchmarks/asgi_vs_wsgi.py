@@ -0,0 +1,149 @@
+"""
+Сравнение задержки и пропускной способности тяжелых эндпоинтов чтения под
+WSGI (gunicorn, синхронные ViewSet'ы) и ASGI (uvicorn, асинхронные
+представления из tutor/async_views.py и, для справки, синхронные).
+
+Данные генерируются во временной SQLite-базе (рабочая db.sqlite3 не
+трогается), серверы запускаются отдельными процессами, нагрузку дает
+benchmarks/loadgen.py.
+
+    python benchmarks/asgi_vs_wsgi.py --clients 200 --duration 10 --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT
+from benchmarks.loadgen import load_test
+
+
+def seed(students_count, lessons_count, results_count):
+    from tutor.models import (
+        Homework, HomeworkResult, JournalEntry, LearningCategory, LearningGoal, Lesson, LessonType, Student,
+        Teacher, Topic,
+    )
+
+    teacher = Teacher.objects.create(full_name="Бенчмарк", subject="Математика")
+    category = LearningCategory.objects.create(name="Бенчмарк")
+    goal = LearningGoal.objects.create(name="Бенчмарк")
+    goal.categories.add(category)
+    lesson_type = LessonType.objects.create(name="Индивидуальный")
+    topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(20)])
+    students = Student.objects.bulk_create([
+        Student(full_name=f"Ученик {i}", grade=5, learning_goal=goal, learning_category=category, teacher=teacher)
+        for i in range(students_count)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(student=student, lesson_type=lesson_type, topic=topics[i % len(topics)])
+        for student in students for i in range(lessons_count)
+    ], batch_size=1000)
+    homeworks = Homework.objects.bulk_create([Homework(lesson=lesson) for lesson in lessons], batch_size=1000)
+    HomeworkResult.objects.bulk_create([
+        HomeworkResult(homework=homework, topic=topics[i % len(topics)], difficulty=['EASY', 'MEDIUM', 'HARD'][i % 3],
+                       correct_count=i % 11, total_count=10)
+        for homework in homeworks for i in range(results_count)
+    ], batch_size=1000)
+    JournalEntry.objects.bulk_create([
+        JournalEntry(student=student, good_results="-", bad_results="-", working_on="-",
+                     recommended_lessons=1, recommendation_reason="-")
+        for student in students for _ in range(lessons_count)
+    ], batch_size=1000)
+    return [student.pk for student in students]
+
+
+def prepare_database(path, args):
+    os.environ['SQLITE_PATH'] = path
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return seed(args.students, args.lessons, args.results)
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not start in {timeout} s')
+
+
+SERVERS = {
+    'wsgi-gunicorn': lambda port, args: (
+        ['gunicorn', 'app.wsgi:application', '-b', f'127.0.0.1:{port}', '-w', str(args.workers),
+         '-k', 'gthread', '--threads', str(args.threads), '--log-level', 'warning'],
+        {'TUTOR_ASYNC_VIEWS': '0'},
+    ),
+    'asgi-uvicorn-async': lambda port, args: (
+        ['uvicorn', 'app.asgi:application', '--port', str(port), '--workers', str(args.workers),
+         '--no-access-log', '--log-level', 'warning'],
+        {'TUTOR_ASYNC_VIEWS': '1'},
+    ),
+    'asgi-uvicorn-sync': lambda port, args: (
+        ['uvicorn', 'app.asgi:application', '--port', str(port), '--workers', str(args.workers),
+         '--no-access-log', '--log-level', 'warning'],
+        {'TUTOR_ASYNC_VIEWS': '0'},
+    ),
+}
+
+
+def run_server(name, db_path, paths, args):
+    port = args.port
+    command, extra_env = SERVERS[name](port, args)
+    env = {**os.environ, 'SQLITE_PATH': db_path, **extra_env}
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(url)
+        report = load_test(url, paths, args.clients, args.duration, args.warmup, args.processes)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {'server': name, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--lessons', type=int, default=40, help='Lessons (and journal entries) per student')
+    parser.add_argument('--results', type=int, default=5, help='Homework results per lesson')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--processes', type=int, default=None, help='Load generator processes')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='asgi-bench-')
+    db_path = os.path.join(workdir, 'db.sqlite3')
+    try:
+        student_ids = prepare_database(db_path, args)
+        paths = [
+            path
+            for pk in student_ids
+            for path in (f'/api/lessons/?student={pk}', f'/api/homework/?lesson__student={pk}',
+                         f'/api/journal/?student={pk}')
+        ]
+        report = [run_server(name, db_path, paths, args) for name in args.servers]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
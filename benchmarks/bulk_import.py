@@ -0,0 +1,71 @@
+"""
+Бенчмарк массового импорта уроков из CSV (tutor.importer).
+
+    python benchmarks/bulk_import.py --lessons 100000 --students 500 --topics 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django
+
+
+def seed(students_count, topics_count):
+    from tutor.models import LearningCategory, LearningGoal, LessonType, Student, Teacher, Topic
+
+    teacher = Teacher.objects.create(full_name="Бенчмарк", subject="Математика")
+    category = LearningCategory.objects.create(name="Бенчмарк")
+    goal = LearningGoal.objects.create(name="Бенчмарк")
+    students = Student.objects.bulk_create([
+        Student(full_name=f"Ученик {i}", grade=5, learning_goal=goal, learning_category=category, teacher=teacher)
+        for i in range(students_count)
+    ])
+    topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(topics_count)])
+    lesson_type = LessonType.objects.create(name="Индивидуальный")
+    return [s.id for s in students], [t.id for t in topics], lesson_type.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lessons', type=int, default=100000)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--topics', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from tutor.importer import import_file
+
+    student_ids, topic_ids, lesson_type_id = seed(args.students, args.topics)
+    lines = ['student_id,lesson_type_id,topic_id,date,comment']
+    lines += [
+        f'{student_ids[i % len(student_ids)]},{lesson_type_id},{topic_ids[i % len(topic_ids)]},'
+        f'2024-09-01T10:00:00Z,Урок {i}'
+        for i in range(args.lessons)
+    ]
+    content = '\n'.join(lines)
+
+    reset_queries()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        report = import_file('lessons', content, 'csv', batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'lessons': args.lessons,
+        'created': report['created'],
+        'failed': report['failed'],
+        'seconds': round(elapsed, 2),
+        'rows_per_sec': round(args.lessons / elapsed),
+        'queries': len(ctx.captured_queries),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
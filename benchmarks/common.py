@@ -0,0 +1,44 @@
+"""
+Общие утилиты для бенчмарков: поднимают Django на временной тестовой БД.
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """Настраивает Django и создает пустую тестовую БД (рабочая db.sqlite3 не трогается)."""
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def timed(func, repeat):
+    """Запускает func repeat раз, возвращает список длительностей в миллисекундах."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+def summarize(durations):
+    ordered = sorted(durations)
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 2),
+        'p50_ms': round(statistics.median(ordered), 2),
+        'max_ms': round(ordered[-1], 2),
+    }
@@ -0,0 +1,135 @@
+"""
+Синтетические данные для бенчмарков: Teachers -> Students -> Lessons ->
+Homework -> HomeworkResults заданного размера, детерминированно по seed.
+
+Размер задается числом результатов ДЗ (SCALES: 1k, 100k, 1m), остальное
+выводится из пропорций shape(): 10 результатов на ДЗ, одно ДЗ на урок,
+20 уроков на ученика, 25 учеников на учителя. Ученики изучают по несколько
+тем, результаты ДЗ приходятся на эти темы, даты растянуты на год - как в
+живой базе, а не "все в одну секунду".
+
+Вставка идет bulk_create порциями учеников в одной транзакции; таблица
+освоения тем пересчитывается один раз при фиксации (tutor.mastery).
+"""
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DIFFICULTIES = ['EASY', 'MEDIUM', 'HARD']
+BATCH_SIZE = 2000
+
+
+def shape(results, results_per_homework=10, lessons_per_student=20, students_per_teacher=25, topics=50,
+          topics_per_student=5, journal_per_student=2):
+    """Размеры таблиц для results результатов ДЗ."""
+    lessons = math.ceil(results / results_per_homework)
+    students = math.ceil(lessons / lessons_per_student)
+    return {
+        'results': results,
+        'results_per_homework': results_per_homework,
+        'lessons': lessons,
+        'lessons_per_student': lessons_per_student,
+        'students': students,
+        'teachers': math.ceil(students / students_per_teacher),
+        'topics': topics,
+        'topics_per_student': min(topics_per_student, topics),
+        'journal_per_student': journal_per_student,
+    }
+
+
+def generate(sizes, seed=0, chunk_students=200, progress=None):
+    """
+    Заполняет текущую БД по sizes (см. shape()) и возвращает id учеников.
+    progress(done_students, total_students) вызывается после каждой порции.
+    """
+    from django.db import transaction
+
+    from tutor.models import (
+        Homework, HomeworkResult, JournalEntry, LearningCategory, LearningGoal, Lesson, LessonType, Student,
+        Teacher, Topic,
+    )
+    from tutor.utils import keep_timestamps
+
+    rng = random.Random(seed)
+    with transaction.atomic(), keep_timestamps(Lesson, Homework, HomeworkResult, JournalEntry):
+        # slug категории считается в save(), поэтому категории создаются по одной
+        categories = [LearningCategory.objects.create(name=f"Категория {i}") for i in range(5)]
+        goals = LearningGoal.objects.bulk_create([LearningGoal(name=f"Цель {i}") for i in range(10)])
+        LearningGoal.categories.through.objects.bulk_create([
+            LearningGoal.categories.through(learninggoal_id=goal.pk, learningcategory_id=categories[i % 5].pk)
+            for i, goal in enumerate(goals)
+        ])
+        lesson_types = LessonType.objects.bulk_create([
+            LessonType(name=name) for name in ("Индивидуальный", "Групповой", "Пробный")
+        ])
+        topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(sizes['topics'])])
+        teachers = Teacher.objects.bulk_create([
+            Teacher(full_name=f"Учитель {i}", subject=rng.choice(["Математика", "Физика", "Информатика"]))
+            for i in range(sizes['teachers'])
+        ], batch_size=BATCH_SIZE)
+
+        student_ids = []
+        lessons_left = sizes['lessons']
+        results_left = sizes['results']
+        for start in range(0, sizes['students'], chunk_students):
+            count = min(chunk_students, sizes['students'] - start)
+            students = Student.objects.bulk_create([
+                Student(full_name=f"Ученик {start + i}", grade=rng.randint(1, 11),
+                        learning_goal=rng.choice(goals), learning_category=rng.choice(categories),
+                        teacher=teachers[(start + i) % len(teachers)])
+                for i in range(count)
+            ])
+            student_ids.extend(student.pk for student in students)
+
+            studied = {student.pk: rng.sample(topics, sizes['topics_per_student']) for student in students}
+            Topic.students.through.objects.bulk_create([
+                Topic.students.through(topic_id=topic.pk, student_id=student_id)
+                for student_id, student_topics in studied.items() for topic in student_topics
+            ], batch_size=BATCH_SIZE)
+
+            lessons = []
+            for student in students:
+                for _ in range(min(sizes['lessons_per_student'], lessons_left)):
+                    lessons.append(Lesson(
+                        student=student, lesson_type=rng.choice(lesson_types), topic=rng.choice(studied[student.pk]),
+                        date=EPOCH + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                        comment=f"Комментарий {rng.randrange(1000)}" if rng.random() < 0.3 else None,
+                    ))
+                    lessons_left -= 1
+            lessons = Lesson.objects.bulk_create(lessons, batch_size=BATCH_SIZE)
+
+            homeworks = Homework.objects.bulk_create([
+                Homework(lesson=lesson, created_at=lesson.date + timedelta(hours=1)) for lesson in lessons
+            ], batch_size=BATCH_SIZE)
+            homework_topics = {
+                homework.pk: rng.sample(studied[homework.lesson.student_id], rng.randint(1, 3)) for homework in homeworks
+            }
+            Homework.topics.through.objects.bulk_create([
+                Homework.topics.through(homework_id=homework_id, topic_id=topic.pk)
+                for homework_id, homework_topic_list in homework_topics.items() for topic in homework_topic_list
+            ], batch_size=BATCH_SIZE)
+
+            results = []
+            for homework in homeworks:
+                for index in range(min(sizes['results_per_homework'], results_left)):
+                    total = rng.choice([5, 10, 20])
+                    results.append(HomeworkResult(
+                        homework=homework, topic=rng.choice(homework_topics[homework.pk]),
+                        difficulty=rng.choice(DIFFICULTIES), correct_count=rng.randint(0, total), total_count=total,
+                        created_at=homework.created_at + timedelta(days=1, minutes=index),
+                    ))
+                    results_left -= 1
+            HomeworkResult.objects.bulk_create(results, batch_size=BATCH_SIZE)
+
+            JournalEntry.objects.bulk_create([
+                JournalEntry(student=student, good_results="-", bad_results="-", working_on="-",
+                             recommended_lessons=rng.randint(1, 5), recommendation_reason="-",
+                             created_at=EPOCH + timedelta(days=rng.randrange(365)))
+                for student in students for _ in range(sizes['journal_per_student'])
+            ], batch_size=BATCH_SIZE)
+            if progress is not None:
+                progress(start + count, sizes['students'])
+    return student_ids
+
@@ -0,0 +1,79 @@
+"""
+Бенчмарк POST /api/journal/generate/ для ученика с большим числом результатов ДЗ.
+
+    python benchmarks/journal_generate.py --results 10000 --lessons 20
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django, summarize, timed
+
+
+def seed(results_count, lessons_count, topics_count):
+    from tutor.models import (
+        Homework, HomeworkResult, LearningCategory, LearningGoal, Lesson, LessonType, Student, Teacher, Topic,
+    )
+
+    teacher = Teacher.objects.create(full_name="Бенчмарк", subject="Математика")
+    category = LearningCategory.objects.create(name="Бенчмарк")
+    goal = LearningGoal.objects.create(name="Бенчмарк")
+    student = Student.objects.create(
+        full_name="Бенчмарк", grade=5, learning_goal=goal, learning_category=category, teacher=teacher
+    )
+    lesson_type = LessonType.objects.create(name="Индивидуальный")
+    topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(topics_count)])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(student=student, lesson_type=lesson_type, topic=topics[i % topics_count])
+        for i in range(lessons_count)
+    ])
+    homeworks = Homework.objects.bulk_create([Homework(lesson=lesson) for lesson in lessons])
+    difficulties = ['EASY', 'MEDIUM', 'HARD']
+    HomeworkResult.objects.bulk_create([
+        HomeworkResult(
+            homework=homeworks[i % lessons_count],
+            topic=topics[i % topics_count],
+            difficulty=difficulties[i % 3],
+            correct_count=i % 11,
+            total_count=10,
+        )
+        for i in range(results_count)
+    ], batch_size=1000)
+    return student
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--results', type=int, default=10000)
+    parser.add_argument('--lessons', type=int, default=20)
+    parser.add_argument('--topics', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    student = seed(args.results, args.lessons, args.topics)
+    client = APIClient()
+    payload = {'student_id': student.id, 'lessons_count': args.lessons}
+
+    def generate():
+        response = client.post('/api/journal/generate/', payload, format='json')
+        assert response.status_code == 201, response.content
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as ctx:
+        generate()
+
+    report = summarize(timed(generate, args.repeat))
+    report.update({'results': args.results, 'lessons': args.lessons, 'queries': len(ctx.captured_queries)})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
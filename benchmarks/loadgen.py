@@ -0,0 +1,149 @@
+"""
+Генератор HTTP-нагрузки на asyncio без сторонних зависимостей: N клиентов
+с keep-alive соединениями по кругу запрашивают адреса из списка в течение
+заданного времени. Клиенты делятся между несколькими процессами, чтобы
+генератор сам не упирался в одно ядро.
+
+    python benchmarks/loadgen.py http://127.0.0.1:8000 /api/lessons/ /api/journal/ -c 200 -d 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+class HTTPError(Exception):
+    pass
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise HTTPError('connection closed')
+    status = int(status_line.split()[1])
+    length, chunked, close = 0, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection' and value == 'close':
+            close = True
+    body = b''
+    if chunked:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            chunks.append((await reader.readexactly(size + 2))[:size])
+            if size == 0:
+                break
+        body = b''.join(chunks)
+    elif length:
+        body = await reader.readexactly(length)
+    return status, close, body
+
+
+async def client(host, port, paths, deadline, warmup_until, results):
+    connection = None
+    for path in paths:
+        if time.monotonic() >= deadline:
+            break
+        request = f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: application/json\r\n\r\n'.encode()
+        started = time.monotonic()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            writer.write(request)
+            await writer.drain()
+            status, close, _ = await read_response(reader)
+        except (OSError, HTTPError, ValueError, asyncio.IncompleteReadError):
+            status, close = None, True
+        finished = time.monotonic()
+        if close and connection is not None:
+            connection[1].close()
+            connection = None
+        if started >= warmup_until:
+            results['latencies'].append((finished - started) * 1000)
+            results['statuses'][str(status)] = results['statuses'].get(str(status), 0) + 1
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_clients(url, paths, clients, duration, warmup, offset):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    now = time.monotonic()
+    results = {'latencies': [], 'statuses': {}}
+    await asyncio.gather(*(
+        client(host, port, itertools.islice(itertools.cycle(paths), offset + index, None),
+               now + warmup + duration, now + warmup, results)
+        for index in range(clients)
+    ))
+    return results
+
+
+def _worker(args):
+    url, paths, clients, duration, warmup, offset = args
+    return asyncio.run(run_clients(url, paths, clients, duration, warmup, offset))
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 2)
+
+
+def load_test(url, paths, clients=200, duration=10.0, warmup=2.0, processes=None):
+    """
+    Нагружает сервер url клиентами clients в течение duration секунд (после
+    warmup секунд прогрева). Возвращает сводку: p50/p99 в мс, запросы в секунду,
+    число ошибок (нет ответа или статус >= 500) и распределение статусов.
+    """
+    processes = processes or min(clients, multiprocessing.cpu_count())
+    shares = [clients // processes + (1 if index < clients % processes else 0) for index in range(processes)]
+    tasks = [(url, list(paths), share, duration, warmup, index * 7) for index, share in enumerate(shares) if share]
+    with multiprocessing.Pool(len(tasks)) as pool:
+        parts = pool.map(_worker, tasks)
+
+    latencies = sorted(itertools.chain.from_iterable(part['latencies'] for part in parts))
+    statuses = {}
+    for part in parts:
+        for status, count in part['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    errors = sum(count for status, count in statuses.items() if status == 'None' or int(status) >= 500)
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(latencies), 2) if latencies else None,
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'errors': errors,
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help='Base URL, e.g. http://127.0.0.1:8000')
+    parser.add_argument('paths', nargs='+', help='Paths requested round-robin')
+    parser.add_argument('-c', '--clients', type=int, default=200)
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Seconds excluded from the results')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(load_test(args.url, args.paths, args.clients, args.duration, args.warmup, args.processes), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+"""
+Нагрузочный тест развернутого стека (nginx -> gunicorn/uvicorn) сценариями,
+повторяющими работу репетитора во фронтенде:
+
+- browse: список учеников категории, карточка ученика, его уроки, урок и ДЗ к нему;
+- homework: уроки ученика и POST /api/homework/ с 50 результатами;
+- journal: POST /api/journal/generate/ и журнал ученика.
+
+Каждый виртуальный пользователь держит keep-alive соединение и по кругу
+выполняет сценарии с весами --mix (после каждого - пауза --think). Клиенты
+делятся между процессами (benchmarks/loadgen.py). Отчет: сессии и запросы в
+секунду, p50/p90/p99 и доля ошибок (нет ответа или неожиданный статус) по
+каждому шагу и в целом.
+
+Сценарии пишут в базу (ДЗ, записи журнала): запускайте на локальном стеке
+или копии, не на рабочих данных. Ученики и темы берутся из API при старте.
+
+    # готовый стек, например prod/docker-compose.yml на порту 80
+    python benchmarks/loadtest.py --url http://localhost -c 50 -d 30
+
+    # подбор числа воркеров и потоков gunicorn: временная база из
+    # benchmarks/datagen.py, каждая конфигурация - на своей копии
+    python benchmarks/loadtest.py --sweep 1x8 2x4 4x2 4x8 --scale 100k -c 50 -d 20
+    python benchmarks/loadtest.py --sweep 1 2 4 --server uvicorn
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.asgi_vs_wsgi import wait_ready
+from benchmarks.common import ROOT
+from benchmarks.datagen import SCALES
+from benchmarks.loadgen import HTTPError, percentile, read_response
+
+HOMEWORK_RESULTS = 50
+STUDENT_EXPAND = 'expand=learning_goal,learning_category,teacher'
+LESSON_EXPAND = 'expand=lesson_type,topic'
+
+SERVERS = {
+    'gunicorn': lambda port, workers, threads: [
+        'gunicorn', 'app.wsgi:application', '-b', f'127.0.0.1:{port}', '-w', str(workers),
+        '-k', 'gthread', '--threads', str(threads), '--log-level', 'warning',
+    ],
+    'uvicorn': lambda port, workers, threads: [
+        'uvicorn', 'app.asgi:application', '--port', str(port), '--workers', str(workers),
+        '--no-access-log', '--log-level', 'warning',
+    ],
+}
+
+
+class Connection:
+    """Keep-alive соединение; после Connection: close или ошибки открывается заново."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.streams = None
+
+    async def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: application/json\r\n'
+        if body is not None:
+            head += f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n'
+        message = head.encode() + b'\r\n' + data
+        # Сервер мог закрыть простаивавшее соединение (keepalive gunicorn - 2 с): одна повторная попытка
+        for attempt in (0, 1):
+            reused = self.streams is not None
+            if self.streams is None:
+                self.streams = await asyncio.open_connection(self.host, self.port)
+            reader, writer = self.streams
+            try:
+                writer.write(message)
+                await writer.drain()
+                status, close, content = await read_response(reader)
+            except (OSError, HTTPError, asyncio.IncompleteReadError):
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if close:
+                self.close()
+            return status, content
+
+    def close(self):
+        if self.streams is not None:
+            self.streams[1].close()
+            self.streams = None
+
+
+class User:
+    """Виртуальный пользователь: соединение, свой генератор случайных чисел и запись замеров."""
+
+    def __init__(self, connection, catalog, rng, results, warmup_until):
+        self.connection = connection
+        self.catalog = catalog
+        self.rng = rng
+        self.results = results
+        self.warmup_until = warmup_until
+
+    async def call(self, step, method, path, body=None, expected=200):
+        started = time.monotonic()
+        try:
+            status, content = await self.connection.request(method, path, body)
+        except (OSError, HTTPError, ValueError, asyncio.IncompleteReadError):
+            status, content = None, b''
+        finished = time.monotonic()
+        if started >= self.warmup_until:
+            stats = self.results['steps'].setdefault(step, {'latencies': [], 'statuses': {}, 'failures': 0})
+            stats['latencies'].append((finished - started) * 1000)
+            stats['statuses'][str(status)] = stats['statuses'].get(str(status), 0) + 1
+            if status != expected:
+                stats['failures'] += 1
+        if status != expected:
+            return None
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def student(self):
+        return self.rng.choice(self.catalog['students'])
+
+
+async def browse(user):
+    student = user.student()
+    await user.call('students', 'GET', f"/api/students/?learning_category={student['learning_category']}&{STUDENT_EXPAND}")
+    await user.call('student', 'GET', f"/api/students/{student['id']}/?{STUDENT_EXPAND}")
+    lessons = await user.call('lessons', 'GET', f"/api/lessons/?student={student['id']}&{LESSON_EXPAND}")
+    if lessons and lessons['results']:
+        lesson = user.rng.choice(lessons['results'])
+        await user.call('lesson', 'GET', f"/api/lessons/{lesson['id']}/?{LESSON_EXPAND}")
+        await user.call('lesson_homework', 'GET', f"/api/homework/?lesson={lesson['id']}")
+
+
+async def homework(user):
+    student = user.student()
+    lessons = await user.call('lessons', 'GET', f"/api/lessons/?student={student['id']}&{LESSON_EXPAND}")
+    if not lessons or not lessons['results']:
+        return
+    lesson = user.rng.choice(lessons['results'])
+    topics = user.rng.sample(user.catalog['topics'], min(3, len(user.catalog['topics'])))
+    results = []
+    for _ in range(HOMEWORK_RESULTS):
+        total = user.rng.choice([5, 10, 20])
+        results.append({'topic_id': user.rng.choice(topics), 'difficulty': user.rng.choice(['EASY', 'MEDIUM', 'HARD']),
+                        'correct_count': user.rng.randint(0, total), 'total_count': total})
+    await user.call('homework_create', 'POST', '/api/homework/',
+                    {'lesson_id': lesson['id'], 'topic_ids': topics, 'results': results}, expected=201)
+
+
+async def journal(user):
+    student = user.student()
+    await user.call('journal_generate', 'POST', '/api/journal/generate/', {'student_id': student['id']}, expected=201)
+    await user.call('journal', 'GET', f"/api/journal/?student={student['id']}")
+
+
+SCENARIOS = {'browse': browse, 'homework': homework, 'journal': journal}
+
+
+async def run_user(host, port, catalog, mix, think, seed, deadline, warmup_until, results):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    connection = Connection(host, port)
+    user = User(connection, catalog, rng, results, warmup_until)
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.monotonic()
+            await SCENARIOS[name](user)
+            if started >= warmup_until:
+                results['sessions'][name] = results['sessions'].get(name, 0) + 1
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+    finally:
+        connection.close()
+
+
+async def run_users(url, catalog, mix, think, users, duration, warmup, seed):
+    parts = urlsplit(url)
+    now = time.monotonic()
+    results = {'steps': {}, 'sessions': {}}
+    await asyncio.gather(*(
+        run_user(parts.hostname, parts.port or 80, catalog, mix, think, seed + index,
+                 now + warmup + duration, now + warmup, results)
+        for index in range(users)
+    ))
+    return results
+
+
+def _worker(args):
+    return asyncio.run(run_users(*args))
+
+
+def discover(url):
+    """Ученики (id, категория) и темы из API."""
+    def get(path):
+        with urllib.request.urlopen(url + path, timeout=30) as response:
+            return json.loads(response.read())['results']
+
+    catalog = {
+        'students': get('/api/students/?fields=id,learning_category&page_size=1000'),
+        'topics': [topic['id'] for topic in get('/api/topics/?fields=id&page_size=1000')],
+    }
+    if not catalog['students'] or not catalog['topics']:
+        raise SystemExit(f'{url}: no students or topics to work with - seed the database first')
+    return catalog
+
+
+def summarize(latencies, requests, failures, duration):
+    ordered = sorted(latencies)
+    return {
+        'requests': requests,
+        'rps': round(requests / duration, 1),
+        'p50_ms': percentile(ordered, 0.5),
+        'p90_ms': percentile(ordered, 0.9),
+        'p99_ms': percentile(ordered, 0.99),
+        'max_ms': round(ordered[-1], 2) if ordered else None,
+        'error_rate': round(failures / requests, 4) if requests else None,
+    }
+
+
+def load_test(url, users=50, duration=30.0, warmup=5.0, mix=None, think=0.0, processes=None, seed=0):
+    """Гоняет users виртуальных пользователей по url и возвращает сводку."""
+    mix = mix or {'browse': 70, 'homework': 20, 'journal': 10}
+    catalog = discover(url)
+    processes = processes or min(users, multiprocessing.cpu_count())
+    shares = [users // processes + (1 if index < users % processes else 0) for index in range(processes)]
+    tasks = [
+        (url, catalog, mix, think, share, duration, warmup, seed + index * 100_000)
+        for index, share in enumerate(shares) if share
+    ]
+    with multiprocessing.Pool(len(tasks)) as pool:
+        parts = pool.map(_worker, tasks)
+
+    steps, sessions = {}, {}
+    for part in parts:
+        for name, count in part['sessions'].items():
+            sessions[name] = sessions.get(name, 0) + count
+        for name, stats in part['steps'].items():
+            merged = steps.setdefault(name, {'latencies': [], 'statuses': {}, 'failures': 0})
+            merged['latencies'].extend(stats['latencies'])
+            merged['failures'] += stats['failures']
+            for status, count in stats['statuses'].items():
+                merged['statuses'][status] = merged['statuses'].get(status, 0) + count
+
+    report = {
+        'url': url,
+        'users': users,
+        'duration': duration,
+        'mix': mix,
+        'sessions_per_second': round(sum(sessions.values()) / duration, 2),
+        'sessions': sessions,
+        'total': summarize(
+            list(itertools.chain.from_iterable(stats['latencies'] for stats in steps.values())),
+            sum(len(stats['latencies']) for stats in steps.values()),
+            sum(stats['failures'] for stats in steps.values()), duration,
+        ),
+        'steps': {},
+    }
+    for name, stats in sorted(steps.items()):
+        report['steps'][name] = {
+            **summarize(stats['latencies'], len(stats['latencies']), stats['failures'], duration),
+            'statuses': stats['statuses'],
+        }
+    return report
+
+
+def parse_config(value):
+    """'4x2' -> (4, 2): воркеры x потоки; '4' -> (4, 1)."""
+    workers, _, threads = value.partition('x')
+    try:
+        return int(workers), int(threads or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected WORKERSxTHREADS, got {value!r}')
+
+
+def prepare_database(path, scale, seed):
+    os.environ['SQLITE_PATH'] = path
+    os.environ['TUTOR_QUERY_LOG_FILE'] = ''
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    from benchmarks.datagen import generate, shape
+
+    call_command('migrate', verbosity=0)
+    generate(shape(SCALES[scale]), seed=seed)
+    connections.close_all()
+
+
+def sweep(args):
+    """Прогон load_test на каждой конфигурации воркеров/потоков; у каждой своя копия базы."""
+    workdir = tempfile.mkdtemp(prefix='tutor-loadtest-')
+    seeded = os.path.join(workdir, 'seed.sqlite3')
+    reports = []
+    try:
+        print(f'seeding {args.scale} into {seeded}', file=sys.stderr)
+        prepare_database(seeded, args.scale, args.seed)
+        for workers, threads in args.sweep:
+            db_path = os.path.join(workdir, f'{workers}x{threads}.sqlite3')
+            shutil.copy(seeded, db_path)
+            command = SERVERS[args.server](args.port, workers, threads)
+            env = {**os.environ, 'SQLITE_PATH': db_path, 'TUTOR_QUERY_LOG_FILE': os.path.join(workdir, 'queries.log')}
+            url = f'http://127.0.0.1:{args.port}'
+            print(f'{args.server} {workers}x{threads}', file=sys.stderr)
+            server = subprocess.Popen(command, cwd=ROOT, env=env)
+            try:
+                wait_ready(url)
+                report = load_test(url, args.clients, args.duration, args.warmup, args.mix, args.think,
+                                   args.processes, args.seed)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            reports.append({'server': args.server, 'workers': workers, 'threads': threads, **report})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return reports
+
+
+def recommend(reports, slo_ms, max_error_rate):
+    """Конфигурация с наибольшим числом сессий в секунду среди укладывающихся в p99 и долю ошибок."""
+    passing = [
+        report for report in reports
+        if report['total']['p99_ms'] is not None and report['total']['p99_ms'] <= slo_ms
+        and report['total']['error_rate'] <= max_error_rate
+    ]
+    return max(passing, key=lambda report: report['sessions_per_second'], default=None)
+
+
+def parse_mix(value):
+    """'browse=70,homework=20,journal=10' -> словарь весов."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}, expected one of {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Running stack, e.g. http://localhost')
+    target.add_argument('--sweep', nargs='+', type=parse_config, metavar='WORKERSxTHREADS',
+                        help='Start local servers with each config on a seeded copy of the database')
+    parser.add_argument('-c', '--clients', type=int, default=50, help='Virtual users')
+    parser.add_argument('-d', '--duration', type=float, default=30.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds excluded from the results')
+    parser.add_argument('--mix', type=parse_mix, default=None, help='Scenario weights, default browse=70,homework=20,journal=10')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean pause between sessions, seconds')
+    parser.add_argument('--processes', type=int, default=None, help='Load generator processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server', choices=SERVERS, default='gunicorn', help='Server started by --sweep')
+    parser.add_argument('--scale', default='1k', choices=SCALES, help='Dataset for --sweep')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--slo-ms', type=float, default=500.0, help='p99 limit for the --sweep recommendation')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--output', default=None, help='Save the JSON report to this path')
+    args = parser.parse_args()
+
+    if args.url:
+        report = load_test(args.url.rstrip('/'), args.clients, args.duration, args.warmup, args.mix, args.think,
+                           args.processes, args.seed)
+    else:
+        reports = sweep(args)
+        best = recommend(reports, args.slo_ms, args.max_error_rate)
+        for item in reports:
+            total = item['total']
+            print(f"{item['server']:<9} {item['workers']:>2}x{item['threads']:<3} "
+                  f"sessions/s {item['sessions_per_second']:>8.2f}  rps {total['rps']:>8.1f}  "
+                  f"p50 {total['p50_ms']} ms  p99 {total['p99_ms']} ms  errors {total['error_rate'] or 0:.2%}",
+                  file=sys.stderr)
+        if best is None:
+            print(f'no configuration met p99 <= {args.slo_ms} ms and errors <= {args.max_error_rate:.0%}', file=sys.stderr)
+        else:
+            print(f"recommended: {best['workers']} workers x {best['threads']} threads", file=sys.stderr)
+        report = {'reports': reports, 'recommended': best and {'workers': best['workers'], 'threads': best['threads']}}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Сериализация больших списков: ModelSerializer + JSONRenderer против
+values_list() + ValuesMapper + ORJSONRenderer (tutor/fastpath.py).
+
+Замеряется выборка и кодирование всех строк одним списком, без HTTP и
+пагинации; ответы обоих путей сравниваются побайтно.
+
+    python benchmarks/serialization.py --rows 10000 --repeat 10
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import setup_django, summarize, timed
+
+
+def seed(rows):
+    from tutor.models import (
+        Homework, HomeworkResult, LearningCategory, LearningGoal, Lesson, LessonType, Student, Teacher, Topic,
+    )
+
+    teacher = Teacher.objects.create(full_name="Бенчмарк", subject="Математика")
+    category = LearningCategory.objects.create(name="Бенчмарк")
+    goal = LearningGoal.objects.create(name="Бенчмарк")
+    lesson_type = LessonType.objects.create(name="Индивидуальный")
+    topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(20)])
+    students = Student.objects.bulk_create([
+        Student(full_name=f"Ученик {i}", grade=5, learning_goal=goal, learning_category=category, teacher=teacher)
+        for i in range(100)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(student=students[i % len(students)], lesson_type=lesson_type, topic=topics[i % len(topics)],
+               comment=f"Комментарий {i}" if i % 2 else None)
+        for i in range(rows)
+    ], batch_size=1000)
+    homeworks = Homework.objects.bulk_create([Homework(lesson=lesson) for lesson in lessons[:rows // 10 or 1]])
+    HomeworkResult.objects.bulk_create([
+        HomeworkResult(homework=homeworks[i % len(homeworks)], topic=topics[i % len(topics)],
+                       difficulty=['EASY', 'MEDIUM', 'HARD'][i % 3], correct_count=i % 11, total_count=10,
+                       percentage=(i % 11) * 10.0)
+        for i in range(rows)
+    ], batch_size=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--expand', default=None, help='Same as ?expand= on the list endpoints')
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from tutor.fastpath import mapper_for
+    from tutor.models import HomeworkResult, Lesson
+    from tutor.eager import plan_for
+    from tutor.renderers import ORJSONRenderer
+    from tutor.serializers import HomeworkResultSerializer, LessonSerializer
+
+    seed(args.rows)
+    report = []
+    for name, model, serializer_class in (
+        ('lessons', Lesson, LessonSerializer),
+        ('homework-results', HomeworkResult, HomeworkResultSerializer),
+    ):
+        queryset = model.objects.order_by('-id')
+        plan = plan_for(serializer_class, expand=args.expand)
+        mapper = mapper_for(serializer_class, expand=args.expand)
+        if mapper is None:
+            raise SystemExit(f'{name}: ?expand={args.expand} is not supported by the values path')
+
+        def serializer_path():
+            data = serializer_class(plan.apply(queryset), many=True, expand=args.expand).data
+            return JSONRenderer().render(data)
+
+        def values_path():
+            return ORJSONRenderer().render(mapper(queryset.values_list(*mapper.lookups)))
+
+        same = serializer_path() == values_path()
+        serializer_report = summarize(timed(serializer_path, args.repeat))
+        values_report = summarize(timed(values_path, args.repeat))
+        report.append({
+            'resource': name, 'rows': args.rows, 'identical': same,
+            'serializer': serializer_report, 'values': values_report,
+            'speedup': round(serializer_report['p50_ms'] / values_report['p50_ms'], 1),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
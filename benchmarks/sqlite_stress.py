@@ -0,0 +1,138 @@
+"""
+Нагрузочный тест конкурентного доступа к SQLite: несколько процессов-писателей
+и читателей работают с копией db.sqlite3, сначала с настройками SQLite по
+умолчанию, затем с PRAGMA из app.db. Для каждого режима печатается
+пропускная способность и число ошибок "database is locked".
+
+    python benchmarks/sqlite_stress.py --writers 4 --readers 8 --duration 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import sqlite_pragmas
+
+# Так Django открывает SQLite без настройки: timeout 5 с, DEFERRED-транзакции
+DEFAULT_MODE = {'pragmas': {}, 'timeout': 5.0, 'begin': 'BEGIN'}
+
+
+def tuned_mode():
+    pragmas = sqlite_pragmas()
+    return {'pragmas': pragmas, 'timeout': int(pragmas['busy_timeout']) / 1000, 'begin': 'BEGIN IMMEDIATE'}
+
+
+def connect(path, mode):
+    conn = sqlite3.connect(path, timeout=mode['timeout'], isolation_level=None)
+    for name, value in mode['pragmas'].items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def writer(path, mode, deadline, counters):
+    conn = connect(path, mode)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            # Как в типичном atomic() Django: сначала чтение, затем запись
+            conn.execute(mode['begin'])
+            conn.execute('SELECT COUNT(*) FROM stress_journal WHERE student_id = ?', (done % 50,)).fetchone()
+            conn.execute(
+                'INSERT INTO stress_journal (student_id, body, created_at) VALUES (?, ?, ?)',
+                (done % 50, 'x' * 200, time.time()),
+            )
+            conn.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError as exc:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            errors += 1
+    counters.put(('write', done, errors))
+
+
+def reader(path, mode, deadline, counters):
+    conn = connect(path, mode)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute(
+                'SELECT id, body FROM stress_journal WHERE student_id = ? ORDER BY created_at DESC LIMIT 20',
+                (done % 50,),
+            ).fetchall()
+            done += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            errors += 1
+    counters.put(('read', done, errors))
+
+
+def run(source, mode_name, mode, args):
+    workdir = tempfile.mkdtemp(prefix='sqlite-stress-')
+    path = os.path.join(workdir, 'db.sqlite3')
+    if os.path.exists(source):
+        shutil.copyfile(source, path)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=DELETE')  # режим WAL сохраняется в файле, сбрасываем его
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS stress_journal '
+        '(id INTEGER PRIMARY KEY, student_id INTEGER, body TEXT, created_at REAL)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS stress_journal_student ON stress_journal (student_id, created_at)')
+    conn.close()
+
+    counters = multiprocessing.Queue()
+    deadline = time.time() + args.duration
+    processes = [
+        multiprocessing.Process(target=writer, args=(path, mode, deadline, counters)) for _ in range(args.writers)
+    ] + [
+        multiprocessing.Process(target=reader, args=(path, mode, deadline, counters)) for _ in range(args.readers)
+    ]
+    for process in processes:
+        process.start()
+    totals = {'write': [0, 0], 'read': [0, 0]}
+    for _ in processes:
+        kind, done, errors = counters.get()
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    for process in processes:
+        process.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'mode': mode_name,
+        'writes_per_sec': round(totals['write'][0] / args.duration, 1),
+        'reads_per_sec': round(totals['read'][0] / args.duration, 1),
+        'write_lock_errors': totals['write'][1],
+        'read_lock_errors': totals['read'][1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db.sqlite3'),
+                        help='Database to copy as the starting point (never modified)')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode')
+    args = parser.parse_args()
+
+    report = [
+        run(args.db, 'default', DEFAULT_MODE, args),
+        run(args.db, 'tuned', tuned_mode(), args),
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
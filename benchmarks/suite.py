@@ -0,0 +1,229 @@
+"""
+Набор бенчмарков горячих эндпоинтов на синтетических данных
+(benchmarks/datagen.py) через тестовый клиент Django.
+
+Для каждого сценария: прогрев, затем --repeat замеров по разным ученикам
+(одна и та же последовательность при одном --seed). В отчете p50/p95/max
+задержки, число SQL-запросов на запрос, размер ответа и пиковая память
+Python (tracemalloc, отдельный прогон). Кэш ответов очищается перед каждым
+запросом вне замера, поэтому меряется сама работа, а не попадание в кэш.
+
+Отчет сохраняется в JSON (--output, по умолчанию benchmarks/results/);
+--compare сравнивает с прошлым отчетом и завершается с кодом 1, если p50 или
+p95 выросли больше чем на --threshold или выросло число запросов.
+
+    python benchmarks/suite.py --scale 100k --repeat 30
+    python benchmarks/suite.py --scale 100k --compare benchmarks/results/baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import ROOT, setup_django
+from benchmarks.datagen import SCALES, generate, shape
+
+# (имя, метод, адрес, тело, ожидаемый статус); {student} - id очередного ученика
+SCENARIOS = [
+    ('lessons_by_student', 'get', '/api/lessons/?student={student}&expand=lesson_type,topic', None, 200),
+    ('homework_with_results', 'get', '/api/homework/?lesson__student={student}', None, 200),
+    ('journal_generate', 'post', '/api/journal/generate/', {'student_id': '{student}'}, 201),
+    ('topics_with_students', 'get', '/api/topics/?expand=students', None, 200),
+]
+SAMPLE_STUDENTS = 50
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def fill(value, student):
+    if isinstance(value, dict):
+        return {key: fill(item, student) for key, item in value.items()}
+    if value == '{student}':
+        return student
+    return value.format(student=student) if isinstance(value, str) else value
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(client, scenario, students, repeat, warmup):
+    from django.core.cache import cache
+    from django.db import connection
+
+    name, method, path, body, expected = scenario
+
+    def request(student):
+        kwargs = {'data': fill(body, student), 'format': 'json'} if body is not None else {}
+        response = getattr(client, method)(fill(path, student), **kwargs)
+        if response.status_code != expected:
+            raise SystemExit(f'{name}: {method.upper()} {fill(path, student)} -> {response.status_code}: '
+                             f'{response.content[:500]!r}')
+        return response
+
+    cycle = itertools.cycle(students)
+    for _ in range(warmup):
+        cache.clear()
+        request(next(cycle))
+
+    latencies, queries, sizes = [], [], []
+    for _ in range(repeat):
+        student = next(cycle)
+        cache.clear()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = request(student)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+        sizes.append(len(response.content))
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        request(next(cycle))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    return {
+        'method': method.upper(),
+        'path': path,
+        'runs': repeat,
+        'p50_ms': round(statistics.median(ordered), 2),
+        'p95_ms': round(percentile(ordered, 0.95), 2),
+        'min_ms': round(ordered[0], 2),
+        'max_ms': round(ordered[-1], 2),
+        'queries_p50': statistics.median(queries),
+        'queries_max': max(queries),
+        'response_bytes_p50': statistics.median(sizes),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def environment():
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(report, baseline, threshold):
+    """Строки сравнения с baseline и список регрессий."""
+    lines, regressions = [], []
+    if baseline.get('sizes') != report['sizes'] or baseline.get('seed') != report['seed']:
+        lines.append('warning: baseline was generated with different sizes or seed')
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            lines.append(f'{name:<24} new')
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms'):
+            ratio = current[key] / previous[key] if previous[key] else 1
+            changes.append(f'{key} {previous[key]:>9.2f} -> {current[key]:>9.2f} ({ratio - 1:+.0%})')
+            if ratio > 1 + threshold:
+                regressions.append(f'{name}: {key} {previous[key]} -> {current[key]}')
+        changes.append(f"queries {previous['queries_max']} -> {current['queries_max']}")
+        if current['queries_max'] > previous['queries_max']:
+            regressions.append(f"{name}: queries {previous['queries_max']} -> {current['queries_max']}")
+        lines.append(f'{name:<24} ' + '  '.join(changes))
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='Number of homework results')
+    parser.add_argument('--results', type=int, default=None, help='Exact number of homework results (overrides --scale)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--scenario', action='append', choices=[scenario[0] for scenario in SCENARIOS],
+                        help='Scenarios to run (all by default)')
+    parser.add_argument('--output', default=None, help='Report path (benchmarks/results/<scale>-<time>.json by default)')
+    parser.add_argument('--compare', default=None, help='Previous report to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p50/p95 growth, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    # Медленные INSERT'ы генератора не должны попадать в журнал запросов рабочего каталога
+    os.environ.setdefault('TUTOR_QUERY_LOG_FILE', '')
+    setup_django()
+    from rest_framework.test import APIClient
+
+    sizes = shape(args.results or SCALES[args.scale])
+    print(f"generating {json.dumps(sizes)}", file=sys.stderr)
+    started = time.perf_counter()
+    student_ids = generate(sizes, seed=args.seed, progress=lambda done, total: print(
+        f"\r  students {done}/{total}", end='' if done < total else '\n', file=sys.stderr, flush=True,
+    ))
+    generate_seconds = round(time.perf_counter() - started, 1)
+    students = student_ids[::max(1, len(student_ids) // SAMPLE_STUDENTS)][:SAMPLE_STUDENTS]
+
+    client = APIClient()
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        'seed': args.seed,
+        'sizes': sizes,
+        'generate_seconds': generate_seconds,
+        'scenarios': {},
+    }
+    for scenario in SCENARIOS:
+        if args.scenario and scenario[0] not in args.scenario:
+            continue
+        print(f'running {scenario[0]}', file=sys.stderr)
+        report['scenarios'][scenario[0]] = run_scenario(client, scenario, students, args.repeat, args.warmup)
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report['max_rss_mb'] = round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f"{args.results or args.scale}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(json.dumps(report['scenarios'], indent=2))
+    print(f'saved {output}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        lines, regressions = compare(report, baseline, args.threshold)
+        print('\n'.join(lines), file=sys.stderr)
+        if regressions:
+            print('regressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
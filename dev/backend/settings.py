@@ -3,6 +3,7 @@ Django settings for backend project.
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -60,11 +61,14 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
+# Профиль БД общий с основным проектом (app/db.py): SQLite с PRAGMA или PostgreSQL
+# (DB_ENGINE=postgres, DATABASE_URL, POSTGRES_POOL=1 и т.д.)
+if str(BASE_DIR.parent) not in sys.path:
+    sys.path.append(str(BASE_DIR.parent))
+from app.db import database_config  # noqa: E402
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.getenv('DB_PATH', BASE_DIR / 'data' / 'db.sqlite3'),
-    }
+    'default': database_config(os.getenv('DB_PATH', BASE_DIR / 'data' / 'db.sqlite3')),
 }
 
 # Password validation
@@ -0,0 +1,27 @@
+import axios from 'axios';
+
+// Наибольший page_size, который принимает API (KeysetPagination.max_page_size)
+const PAGE_SIZE = 1000;
+
+// Сколько строк истории (уроки, журнал) показывать до нажатия "Показать ещё"
+export const LIST_PAGE_SIZE = 20;
+
+// Одна страница списка: { items, next }; next - ссылка на следующую страницу или null.
+// Чтобы догрузить список, передайте next как url - он уже содержит все параметры запроса
+export async function fetchPage(url, config = {}) {
+  const response = await axios.get(url, config);
+  return { items: response.data.results, next: response.data.next };
+}
+
+// Весь список - для небольших справочников (выпадающие списки, фильтры); историю
+// загружайте по страницам через fetchPage
+export async function fetchAll(url, config = {}) {
+  const items = [];
+  let response = await axios.get(url, { ...config, params: { page_size: PAGE_SIZE, ...config.params } });
+  items.push(...response.data.results);
+  while (response.data.next) {
+    response = await axios.get(response.data.next, { ...config, params: undefined });
+    items.push(...response.data.results);
+  }
+  return items;
+}
@@ -1,30 +1,102 @@
-from fastapi import FastAPI
+"""
+Быстрая read-only реплика API tutor на FastAPI: ученики, уроки, результаты ДЗ
+и журнал читаются напрямую из базы Django (тот же профиль БД, что в
+app/db.py) через асинхронный пул соединений и отдаются через orjson.
+
+Адреса, фильтры, курсоры пагинации и формат ответов совпадают с DRF
+(tutor/serializers.py, tutor/pagination.py), поэтому дашборд может читать
+отсюда, а запись по-прежнему идет через Django.
+
+    uvicorn main:app --port 8002 --workers 4
+"""
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import orjson
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+
+from app.db import database_config
+from replica import schemas
+from replica.db import connect
+from replica.queries import RESOURCES, APIError, fetch_object, fetch_page
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+class JSONResponse(ORJSONResponse):
+    # Время в UTC с суффиксом Z, как у DRF
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def create_app(database=None):
+    """database - словарь настроек Django; по умолчанию DATABASES['default'] из app/settings.py."""
+    database = database or database_config(BASE_DIR / 'db.sqlite3')
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.db = connect(database)
+        await app.state.db.open()
+        try:
+            yield
+        finally:
+            await app.state.db.close()
+
+    app = FastAPI(
+        title="Tutor Control API",
+        description="Read-only replica of the tutor API for dashboard traffic",
+        version="1.0.0",
+        default_response_class=JSONResponse,
+        lifespan=lifespan,
+    )
+
+    # Add CORS for frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # For development
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.exception_handler(APIError)
+    async def api_error(request, exc):
+        return JSONResponse(exc.payload, status_code=exc.status)
+
+    @app.get("/")
+    async def root():
+        return {"message": "Tutor Control API is running"}
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy", "database": app.state.db.vendor}
+
+    @app.get("/api/status")
+    async def api_status():
+        return {"status": "API is running", "resources": list(RESOURCES)}
+
+    # Ответы собираются словарями и сериализуются orjson без повторной проверки
+    # pydantic; модели schemas описывают формат в OpenAPI
+    def register(path, resource, schema):
+        async def list_view(request: Request):
+            return JSONResponse(await fetch_page(request.app.state.db, resource, request.query_params, str(request.url)))
+
+        async def detail_view(request: Request, pk: str):
+            return JSONResponse(await fetch_object(request.app.state.db, resource, pk, request.query_params))
+
+        responses = {400: {'description': 'Invalid filter'}, 404: {'model': schemas.Error}}
+        app.get(f'/api/{path}/', response_model=schemas.Page[schema], responses=responses,
+                name=f'{path}-list')(list_view)
+        app.get(f'/api/{path}/{{pk}}/', response_model=schema, responses=responses,
+                name=f'{path}-detail')(detail_view)
+
+    register('students', RESOURCES['students'], schemas.Student)
+    register('lessons', RESOURCES['lessons'], schemas.Lesson)
+    register('homework-results', RESOURCES['homework-results'], schemas.HomeworkResult)
+    register('journal', RESOURCES['journal'], schemas.JournalEntry)
+    return app
+
 
-app = FastAPI(
-    title="Tutor Control API",
-    description="Backend API for Tutor Control application",
-    version="1.0.0"
-)
-
-# Add CORS for frontend
-app.add_middleware(
-
-    CORSMiddleware,
-    allow_origins=["*"],  # For development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
-async def root():
-    return {"message": "Tutor Control API is running"}
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
-
-@app.get("/api/status")
-async def api_status():
-    return {"status": "API is running"}
\ No newline at end of file
+app = create_app()
@@ -0,0 +1,3 @@
+"""
+FastAPI-реплика для чтения горячих ресурсов tutor напрямую из базы Django (см. main.py).
+"""
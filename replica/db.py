@@ -0,0 +1,129 @@
+"""
+Пулы асинхронных соединений с базой Django для FastAPI-реплики.
+
+Параметры берутся из того же профиля, что и у Django (app.db.database_config):
+PostgreSQL - через psycopg_pool.AsyncConnectionPool, SQLite - пул обычных
+соединений sqlite3, запросы к которым выполняются в потоках (так же устроен
+aiosqlite, но без лишней зависимости). SQL пишется с плейсхолдерами %s.
+"""
+import asyncio
+import datetime
+import os
+import sqlite3
+
+import orjson
+
+UTC = datetime.timezone.utc
+
+
+class SQLiteDatabase:
+    vendor = 'sqlite'
+
+    def __init__(self, name, init_command='', size=4):
+        self.name = str(name)
+        self.init_command = init_command
+        self.size = size
+        self._idle = None
+        self._connections = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.name, uri=self.name.startswith('file:'), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.init_command:
+            conn.executescript(self.init_command)
+        conn.execute('PRAGMA query_only=1')
+        return conn
+
+    async def open(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await asyncio.to_thread(self._connect)
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections.clear()
+
+    @staticmethod
+    def _run(conn, sql, params):
+        return [dict(row) for row in conn.execute(sql.replace('%s', '?'), params).fetchall()]
+
+    async def fetch(self, sql, params=()):
+        conn = await self._idle.get()
+        try:
+            return await asyncio.to_thread(self._run, conn, sql, list(params))
+        finally:
+            self._idle.put_nowait(conn)
+
+    def datetime_param(self, value):
+        # Django хранит время в SQLite строкой в UTC без зоны
+        return str(value.astimezone(UTC).replace(tzinfo=None))
+
+    def to_datetime(self, value):
+        if value is None:
+            return None
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=UTC)
+
+    def to_json(self, value):
+        return None if value is None else orjson.loads(value)
+
+
+class PostgresDatabase:
+    vendor = 'postgresql'
+
+    def __init__(self, conninfo, min_size=2, max_size=10, timeout=10.0):
+        self.conninfo = conninfo
+        self.min_size, self.max_size, self.timeout = min_size, max_size, timeout
+        self.pool = None
+
+    async def open(self):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            kwargs={**self.conninfo, 'row_factory': dict_row, 'autocommit': True},
+            min_size=self.min_size, max_size=self.max_size, timeout=self.timeout, open=False,
+        )
+        await self.pool.open()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def fetch(self, sql, params=()):
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(sql, list(params))
+            return await cursor.fetchall()
+
+    def datetime_param(self, value):
+        return value
+
+    def to_datetime(self, value):
+        return None if value is None else value.astimezone(UTC)
+
+    def to_json(self, value):
+        return value
+
+
+def connect(config, env=os.environ):
+    """
+    База по словарю настроек Django (DATABASES['default']). Размер пула задают
+    REPLICA_POOL_SIZE (SQLite) и POSTGRES_POOL_MIN_SIZE / POSTGRES_POOL_MAX_SIZE.
+    """
+    options = config.get('OPTIONS', {})
+    if 'postgresql' in config['ENGINE']:
+        pool = options.get('pool') or {}
+        conninfo = {
+            'dbname': config['NAME'], 'user': config['USER'], 'password': config['PASSWORD'],
+            'host': config['HOST'], 'port': config['PORT'],
+            'connect_timeout': options.get('connect_timeout', 5),
+        }
+        return PostgresDatabase(
+            {key: value for key, value in conninfo.items() if value not in (None, '')},
+            min_size=pool.get('min_size', int(env.get('POSTGRES_POOL_MIN_SIZE', 2))),
+            max_size=pool.get('max_size', int(env.get('POSTGRES_POOL_MAX_SIZE', 10))),
+        )
+    return SQLiteDatabase(
+        config['NAME'], options.get('init_command', ''), size=int(env.get('REPLICA_POOL_SIZE', 4)),
+    )
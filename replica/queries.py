@@ -0,0 +1,402 @@
+"""
+Выборки ресурсов для реплики: один SQL-запрос на страницу (вложенные объекты
+по ForeignKey - через JOIN) плюс по одному запросу на каждую связь M2M, как
+план жадной загрузки tutor.eager для тех же сериализаторов.
+
+Фильтры и сортировка совпадают с ViewSet'ами, а курсоры и разбор ?fields= /
+?expand= берутся из tutor.querystring, как у tutor.pagination.KeysetPagination и
+ExpandableFieldsMixin, поэтому ссылки next/previous реплики и DRF
+взаимозаменяемы. Нераскрытые связи отдаются id, их M2M не запрашиваются.
+"""
+import datetime
+import os
+
+from rest_framework.utils.urls import remove_query_param
+
+from tutor.querystring import ALL, decode_cursor, encode_cursor, parse_selection
+
+PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = 1000
+INVALID_CHOICE = 'Select a valid choice. That choice is not one of the available choices.'
+STUDENT_RELATIONS = {'learning_goal': {'categories': {}}, 'learning_category': {}, 'teacher': {}}
+
+
+class APIError(Exception):
+    def __init__(self, status, payload):
+        super().__init__(status, payload)
+        self.status = status
+        self.payload = payload
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def expanded(expand, *path):
+    """Раскрыта ли связь по пути path."""
+    for name in path:
+        if expand != ALL:
+            if name not in expand:
+                return False
+            expand = expand[name]
+    return True
+
+
+def shape(item, relations, only, expand):
+    """Оставляет поля only; нераскрытые связи relations заменяются их id."""
+    result = {}
+    for name, value in item.items():
+        if only and name not in only:
+            continue
+        if name in relations:
+            if expanded(expand, name):
+                nested = ALL if expand == ALL else expand[name]
+                if isinstance(value, list):
+                    value = [shape(v, relations[name], only.get(name, {}), nested) for v in value]
+                else:
+                    value = shape(value, relations[name], only.get(name, {}), nested)
+            else:
+                value = [v['id'] for v in value] if isinstance(value, list) else value['id']
+        result[name] = value
+    return result
+
+
+def student_columns(alias):
+    return (
+        f'{alias}.id AS {alias}_id, {alias}.full_name AS {alias}_full_name, {alias}.grade AS {alias}_grade, '
+        f'{alias}_g.id AS {alias}_goal_id, {alias}_g.name AS {alias}_goal_name, '
+        f'{alias}_c.id AS {alias}_category_id, {alias}_c.name AS {alias}_category_name, '
+        f'{alias}_c.slug AS {alias}_category_slug, '
+        f'{alias}_t.id AS {alias}_teacher_id, {alias}_t.full_name AS {alias}_teacher_full_name, '
+        f'{alias}_t.subject AS {alias}_teacher_subject'
+    )
+
+
+def student_joins(alias):
+    return (
+        f' JOIN tutor_learninggoal {alias}_g ON {alias}_g.id = {alias}.learning_goal_id'
+        f' JOIN tutor_learningcategory {alias}_c ON {alias}_c.id = {alias}.learning_category_id'
+        f' JOIN tutor_teacher {alias}_t ON {alias}_t.id = {alias}.teacher_id'
+    )
+
+
+async def goal_categories(db, goal_ids):
+    """{goal_id: [категории]} одним запросом."""
+    categories = {goal_id: [] for goal_id in goal_ids}
+    if goal_ids:
+        goal_ids = sorted(goal_ids)
+        rows = await db.fetch(
+            'SELECT gc.learninggoal_id AS goal_id, c.id, c.name, c.slug '
+            'FROM tutor_learninggoal_categories gc '
+            'JOIN tutor_learningcategory c ON c.id = gc.learningcategory_id '
+            f'WHERE gc.learninggoal_id IN ({_placeholders(goal_ids)}) ORDER BY gc.learninggoal_id, c.id',
+            goal_ids,
+        )
+        for row in rows:
+            categories[row['goal_id']].append({'id': row['id'], 'name': row['name'], 'slug': row['slug']})
+    return categories
+
+
+async def topic_students(db, topic_ids):
+    """{topic_id: [id учеников]} одним запросом."""
+    students = {topic_id: [] for topic_id in topic_ids}
+    if topic_ids:
+        topic_ids = sorted(topic_ids)
+        rows = await db.fetch(
+            'SELECT topic_id, student_id FROM tutor_topic_students '
+            f'WHERE topic_id IN ({_placeholders(topic_ids)}) ORDER BY topic_id, student_id',
+            topic_ids,
+        )
+        for row in rows:
+            students[row['topic_id']].append(row['student_id'])
+    return students
+
+
+def build_student(row, alias, categories):
+    return {
+        'id': row[f'{alias}_id'],
+        'full_name': row[f'{alias}_full_name'],
+        'grade': row[f'{alias}_grade'],
+        'learning_goal': {
+            'id': row[f'{alias}_goal_id'],
+            'name': row[f'{alias}_goal_name'],
+            'categories': categories.get(row[f'{alias}_goal_id'], []),
+        },
+        'learning_category': {
+            'id': row[f'{alias}_category_id'],
+            'name': row[f'{alias}_category_name'],
+            'slug': row[f'{alias}_category_slug'],
+        },
+        'teacher': {
+            'id': row[f'{alias}_teacher_id'],
+            'full_name': row[f'{alias}_teacher_full_name'],
+            'subject': row[f'{alias}_teacher_subject'],
+        },
+    }
+
+
+class Resource:
+    """
+    Описание ресурса: таблица, выбираемые колонки и JOIN'ы, сортировка
+    (поля пагинации -> колонки), фильтры {параметр: (колонка, проверяемая таблица)}.
+    Таблица None - фильтр без проверки существования, как в get_queryset() ViewSet'а.
+    """
+    model_name = None
+    table = None
+    alias = None
+    columns = ''
+    joins = ''
+    ordering = ('id',)
+    datetime_fields = ()
+    filters = {}
+    # Вложенные объекты, которые раскрываются через ?expand=
+    relations = {}
+
+    def column(self, field):
+        return f'{self.alias}.{field}'
+
+    async def build(self, db, rows, expand):
+        """Строки в полном виде; M2M запрашиваются только для раскрытых связей."""
+        raise NotImplementedError
+
+
+class StudentResource(Resource):
+    model_name = 'Student'
+    table = 'tutor_student'
+    alias = 's'
+    columns = student_columns('s')
+    joins = student_joins('s')
+    filters = {'learning_category': ('s.learning_category_id', 'tutor_learningcategory')}
+    relations = STUDENT_RELATIONS
+
+    async def build(self, db, rows, expand):
+        categories = {}
+        if expanded(expand, 'learning_goal'):
+            categories = await goal_categories(db, {row['s_goal_id'] for row in rows})
+        return [build_student(row, 's', categories) for row in rows]
+
+
+class LessonResource(Resource):
+    model_name = 'Lesson'
+    table = 'tutor_lesson'
+    alias = 'l'
+    columns = (
+        'l.id, l.date, l.comment, lt.id AS lesson_type_id, lt.name AS lesson_type_name, '
+        'tp.id AS topic_id, tp.name AS topic_name, ' + student_columns('s')
+    )
+    joins = (
+        ' JOIN tutor_student s ON s.id = l.student_id' + student_joins('s')
+        + ' JOIN tutor_lessontype lt ON lt.id = l.lesson_type_id'
+        + ' JOIN tutor_topic tp ON tp.id = l.topic_id'
+    )
+    ordering = ('-date', '-id')
+    datetime_fields = ('date',)
+    filters = {'student': ('l.student_id', 'tutor_student')}
+    relations = {'student': STUDENT_RELATIONS, 'lesson_type': {}, 'topic': {}}
+
+    async def build(self, db, rows, expand):
+        categories, students = {}, {}
+        if expanded(expand, 'student', 'learning_goal'):
+            categories = await goal_categories(db, {row['s_goal_id'] for row in rows})
+        if expanded(expand, 'topic'):
+            students = await topic_students(db, {row['topic_id'] for row in rows})
+        return [
+            {
+                'id': row['id'],
+                'student': build_student(row, 's', categories),
+                'lesson_type': {'id': row['lesson_type_id'], 'name': row['lesson_type_name']},
+                'topic': {'id': row['topic_id'], 'name': row['topic_name'], 'students': students.get(row['topic_id'], [])},
+                'date': db.to_datetime(row['date']),
+                'comment': row['comment'],
+            }
+            for row in rows
+        ]
+
+
+class HomeworkResultResource(Resource):
+    model_name = 'HomeworkResult'
+    table = 'tutor_homeworkresult'
+    alias = 'r'
+    columns = 'r.id, r.topic_id, r.difficulty, r.correct_count, r.total_count, r.percentage, r.created_at'
+    joins = ' JOIN tutor_homework h ON h.id = r.homework_id'
+    ordering = ('-created_at', '-id')
+    datetime_fields = ('created_at',)
+    filters = {
+        'homework__lesson': ('h.lesson_id', 'tutor_lesson'),
+        'homework__lesson__student': ('(SELECT hl.student_id FROM tutor_lesson hl WHERE hl.id = h.lesson_id)', 'tutor_student'),
+    }
+
+    async def build(self, db, rows, expand):
+        return [{**row, 'created_at': db.to_datetime(row['created_at'])} for row in rows]
+
+
+class JournalResource(Resource):
+    model_name = 'JournalEntry'
+    table = 'tutor_journalentry'
+    alias = 'j'
+    columns = (
+        'j.id, j.created_at, j.good_results, j.bad_results, j.covered_topics, j.working_on, '
+        'j.recommended_lessons, j.recommendation_reason, ' + student_columns('s')
+    )
+    joins = ' JOIN tutor_student s ON s.id = j.student_id' + student_joins('s')
+    ordering = ('-created_at', '-id')
+    datetime_fields = ('created_at',)
+    filters = {'student': ('j.student_id', None)}
+    relations = {'student': STUDENT_RELATIONS}
+
+    async def build(self, db, rows, expand):
+        categories = {}
+        if expanded(expand, 'student', 'learning_goal'):
+            categories = await goal_categories(db, {row['s_goal_id'] for row in rows})
+        return [
+            {
+                'id': row['id'],
+                'student': build_student(row, 's', categories),
+                'created_at': db.to_datetime(row['created_at']),
+                'good_results': row['good_results'],
+                'bad_results': row['bad_results'],
+                'covered_topics': db.to_json(row['covered_topics']),
+                'working_on': row['working_on'],
+                'recommended_lessons': row['recommended_lessons'],
+                'recommendation_reason': row['recommendation_reason'],
+            }
+            for row in rows
+        ]
+
+
+RESOURCES = {
+    'students': StudentResource(),
+    'lessons': LessonResource(),
+    'homework-results': HomeworkResultResource(),
+    'journal': JournalResource(),
+}
+
+
+def _int(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return int(value)
+
+
+async def filter_conditions(db, resource, params):
+    """WHERE-условия по параметрам запроса; ошибки - как у DjangoFilterBackend."""
+    conditions, values, errors = [], [], {}
+    for name, (column, table) in resource.filters.items():
+        value = params.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            pk = _int(value)
+        except ValueError:
+            if table is None:
+                raise APIError(400, {'detail': f"Field '{name}' expected a number but got {value!r}."})
+            errors[name] = [INVALID_CHOICE]
+            continue
+        if table is not None and not await db.fetch(f'SELECT 1 FROM {table} WHERE id = %s', [pk]):
+            errors[name] = [INVALID_CHOICE]
+            continue
+        conditions.append(f'{column} = %s')
+        values.append(pk)
+    if errors:
+        raise APIError(400, errors)
+    return conditions, values
+
+
+def page_size(params):
+    try:
+        size = int(params['page_size'])
+    except (KeyError, ValueError):
+        return PAGE_SIZE
+    if size <= 0:
+        return PAGE_SIZE
+    return min(size, MAX_PAGE_SIZE)
+
+
+def decode_position(resource, encoded):
+    if encoded is None:
+        return None, False
+    try:
+        values, reverse = decode_cursor(encoded, len(resource.ordering))
+        position = []
+        for field, value in zip(resource.ordering, values):
+            if field.lstrip('-') in resource.datetime_fields:
+                value = datetime.datetime.fromisoformat(value)
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=datetime.timezone.utc)
+            else:
+                value = _int(value)
+            position.append(value)
+        return position, reverse
+    except Exception:
+        raise APIError(404, {'detail': 'Invalid cursor'})
+
+
+async def fetch_page(db, resource, params, base_url):
+    """Страница ресурса в формате KeysetPagination: {'next', 'previous', 'results'}."""
+    conditions, values = await filter_conditions(db, resource, params)
+    size = page_size(params)
+    position, reverse = decode_position(resource, params.get('cursor'))
+
+    ordering = resource.ordering
+    if reverse:
+        ordering = tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+    if position is not None:
+        # (date < d) OR (date = d AND id < i)
+        steps = []
+        for index, field in enumerate(ordering):
+            parts = [f'{resource.column(previous.lstrip("-"))} = %s' for previous in ordering[:index]]
+            parts.append(f'{resource.column(field.lstrip("-"))} {"<" if field.startswith("-") else ">"} %s')
+            steps.append('(' + ' AND '.join(parts) + ')')
+            values.extend(
+                db.datetime_param(value) if isinstance(value, datetime.datetime) else value
+                for value in position[:index + 1]
+            )
+        conditions.append('(' + ' OR '.join(steps) + ')')
+
+    sql = f'SELECT {resource.columns} FROM {resource.table} {resource.alias}{resource.joins}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(
+        f'{resource.column(field.lstrip("-"))} {"DESC" if field.startswith("-") else "ASC"}' for field in ordering
+    )
+    sql += f' LIMIT {size + 1}'
+
+    only, expand = parse_selection(params.get('fields')), parse_selection(params.get('expand'))
+    rows = await db.fetch(sql, values)
+    has_more = len(rows) > size
+    page = await resource.build(db, rows[:size], expand)
+    if reverse:
+        page.reverse()
+        has_next, has_previous = position is not None, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+
+    # Курсор - по полным объектам: ?fields= может не включать поля сортировки
+    def link(exists, item, reverse):
+        if not exists:
+            return None
+        if item is None:
+            return remove_query_param(base_url, 'cursor')
+        return encode_cursor(base_url, [item[field.lstrip('-')] for field in resource.ordering], reverse)
+
+    return {
+        'next': link(has_next, page[-1] if page else None, False),
+        'previous': link(has_previous, page[0] if page else None, True),
+        'results': [shape(item, resource.relations, only, expand) for item in page],
+    }
+
+
+async def fetch_object(db, resource, pk, params=None):
+    try:
+        pk = _int(pk)
+    except ValueError:
+        raise APIError(404, {'detail': 'Not found.'})
+    rows = await db.fetch(
+        f'SELECT {resource.columns} FROM {resource.table} {resource.alias}{resource.joins} '
+        f'WHERE {resource.column("id")} = %s', [pk],
+    )
+    if not rows:
+        raise APIError(404, {'detail': f'No {resource.model_name} matches the given query.'})
+    params = params or {}
+    only, expand = parse_selection(params.get('fields')), parse_selection(params.get('expand'))
+    return shape((await resource.build(db, rows, expand))[0], resource.relations, only, expand)
@@ -0,0 +1,90 @@
+"""
+Pydantic-модели ответов реплики - зеркало сериализаторов tutor/serializers.py
+(только поля, которые отдаются при чтении). Связи без ?expand= отдаются id,
+а ?fields= может убрать любое поле - модели описывают полный ответ.
+"""
+import datetime
+from typing import Generic, Optional, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar('T')
+
+
+class Teacher(BaseModel):
+    id: int
+    full_name: str
+    subject: str
+
+
+class LearningCategory(BaseModel):
+    id: int
+    name: str
+    slug: str
+
+
+class LearningGoal(BaseModel):
+    id: int
+    name: str
+    categories: list[int] | list[LearningCategory]
+
+
+class Student(BaseModel):
+    id: int
+    full_name: str
+    grade: int
+    learning_goal: int | LearningGoal
+    learning_category: int | LearningCategory
+    teacher: int | Teacher
+
+
+class LessonType(BaseModel):
+    id: int
+    name: str
+
+
+class Topic(BaseModel):
+    id: int
+    name: str
+    students: list[int]
+
+
+class Lesson(BaseModel):
+    id: int
+    student: int | Student
+    lesson_type: int | LessonType
+    topic: int | Topic
+    date: datetime.datetime
+    comment: Optional[str]
+
+
+class HomeworkResult(BaseModel):
+    id: int
+    topic_id: int
+    difficulty: str
+    correct_count: int
+    total_count: int
+    percentage: Optional[float]
+    created_at: datetime.datetime
+
+
+class JournalEntry(BaseModel):
+    id: int
+    student: int | Student
+    created_at: datetime.datetime
+    good_results: str
+    bad_results: str
+    covered_topics: str
+    working_on: str
+    recommended_lessons: int
+    recommendation_reason: str
+
+
+class Page(BaseModel, Generic[T]):
+    next: Optional[str]
+    previous: Optional[str]
+    results: list[T]
+
+
+class Error(BaseModel):
+    detail: str
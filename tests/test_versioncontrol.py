@@ -1,7 +1,16 @@
-import requests
+import asyncio
 import json
+import random
+import string
 import time
 
+import pytest
+import requests
+
+from version_control.main import create_app
+from version_control.storage import DELTA, SNAPSHOT, RevisionNotFound, RevisionStore, apply_delta, make_delta
+
+
 def test_versioncontrol_service():
     base_url = "http://versioncontrol:8001"
     
@@ -27,5 +36,126 @@ def test_versioncontrol_service():
     except Exception as e:
         print(f"❌ Error testing version control: {e}")
 
+
+# Хранилище и API сервиса - без запущенного контейнера
+
+@pytest.fixture
+def store(tmp_path):
+    store = RevisionStore(tmp_path / 'revisions.sqlite3', snapshot_interval=4)
+    yield store
+    store.close()
+
+
+def test_delta_roundtrip():
+    rng = random.Random(0)
+    text = ''.join(rng.choice(string.ascii_letters + ' \n') for _ in range(5000))
+    for _ in range(50):
+        start = rng.randrange(len(text))
+        edited = text[:start] + ''.join(rng.choice('xyz') for _ in range(rng.randrange(20))) + text[start + rng.randrange(30):]
+        assert apply_delta(text, make_delta(text, edited)) == edited
+        text = edited
+
+
+def test_small_edit_stores_small_delta(store):
+    text = 'Ученик уверенно решает уравнения. ' * 500
+    first = store.commit('journal:1', text)
+    second = store.commit('journal:1', text.replace('уравнения', 'неравенства', 1))
+    assert (first['kind'], second['kind']) == (SNAPSHOT, DELTA)
+    assert second['size'] < 100 < first['size']
+
+
+def test_versions_and_snapshot_interval(store):
+    contents = [{'working_on': f'Дроби, попытка {i}', 'recommended_lessons': i} for i in range(10)]
+    for content in contents:
+        store.commit('journal:7', content)
+    kinds = [revision['kind'] for revision in store.history('journal:7')]
+    # Не больше snapshot_interval - 1 дельт подряд
+    assert kinds == [SNAPSHOT, DELTA, DELTA, DELTA] * 2 + [SNAPSHOT, DELTA]
+    for version, content in enumerate(contents, start=1):
+        assert '"recommended_lessons": %d' % (version - 1) in store.get('journal:7', version)
+
+
+def test_unchanged_content_is_not_a_revision(store):
+    assert store.commit('lesson-comment:1', 'Урок')['created']
+    assert store.commit('lesson-comment:1', 'Урок') == {'version': 1, 'kind': None, 'size': 0, 'created': False}
+    with pytest.raises(RevisionNotFound):
+        store.get('lesson-comment:1', 2)
+
+
+def test_head_is_rebuilt_from_revisions(tmp_path):
+    path = tmp_path / 'revisions.sqlite3'
+    writer = RevisionStore(path, snapshot_interval=4)
+    for i in range(6):
+        writer.commit('journal:2', f'Дроби, попытка {i}')
+    # Другой процесс (или перезапуск): текста последней версии в памяти нет
+    reader = RevisionStore(path, snapshot_interval=4, head_cache_size=1)
+    assert reader.head('journal:2') == {'version': 6, 'content': 'Дроби, попытка 5'}
+    assert reader.commit('journal:2', 'Дроби, попытка 6')['version'] == 7
+    assert writer.commit('journal:2', 'Дроби, попытка 7')['version'] == 8
+    assert reader.head('journal:2')['content'] == 'Дроби, попытка 7'
+    writer.close()
+    reader.close()
+
+
+def test_commit_many(store):
+    results = store.commit_many([('lesson-comment:1', 'Дроби', None), ('lesson-comment:1', 'Дроби', None),
+                                 ('lesson-comment:2', 'Проценты', 'api')])
+    assert [(r['version'], r['created']) for r in results] == [(1, True), (1, False), (1, True)]
+    assert store.history('lesson-comment:2')[0]['author'] == 'api'
+
+
+def test_diff(store):
+    store.commit('lesson-comment:3', 'Дроби\nПроценты\n')
+    store.commit('lesson-comment:3', 'Дроби\nСтепени\n')
+    assert store.diff('lesson-comment:3', 1, 2)[2:] == ['@@ -1,2 +1,2 @@', ' Дроби', '-Проценты', '+Степени']
+
+
+def call(app, method, path, body=None):
+    """Запрос к ASGI-приложению без HTTP-клиента: (status, json)."""
+    path, _, query = path.partition('?')
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json')],
+        'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            await app(scope, receive, send)
+
+    asyncio.run(run())
+    return messages[0]['status'], json.loads(b''.join(m.get('body', b'') for m in messages[1:]))
+
+
+def test_api(tmp_path):
+    app = create_app(tmp_path / 'revisions.sqlite3', snapshot_interval=4)
+    for comment in ('Дроби', 'Дроби и проценты'):
+        status, data = call(app, 'POST', '/documents/lesson-comment/5/revisions', {'content': comment})
+        assert status == 201
+    assert data['version'] == 2
+    assert call(app, 'GET', '/documents/lesson-comment/5/revisions/1') == (200, {'version': 1, 'content': 'Дроби'})
+    status, data = call(app, 'GET', '/documents/lesson-comment/5/diff?from=1&to=2')
+    assert data['diff'][-2:] == ['-Дроби', '+Дроби и проценты']
+    assert call(app, 'GET', '/documents/lesson-comment/5/revisions/3')[0] == 404
+    assert call(app, 'GET', '/documents/unknown/5/revisions')[0] == 404
+
+    status, data = call(app, 'POST', '/revisions', [
+        {'kind': 'lesson-comment', 'doc_id': 5, 'content': 'Проценты'},
+        {'kind': 'journal', 'doc_id': 1, 'content': {'working_on': 'Дроби'}},
+    ])
+    assert status == 201
+    assert [revision['version'] for revision in data] == [3, 1]
+    assert call(app, 'POST', '/revisions', [{'kind': 'unknown', 'doc_id': 1, 'content': '-'}])[0] == 404
+
+
 if __name__ == "__main__":
-    test_versioncontrol_service()
\ No newline at end of file
+    test_versioncontrol_service()
@@ -0,0 +1,81 @@
+"""
+Аналитические отчеты. Все группировки выполняются в БД (values + annotate),
+поэтому размер ответа и время зависят от числа групп, а не от числа строк.
+"""
+import datetime
+
+from django.db.models import Avg, Count, F, Max
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import HomeworkResult, Lesson
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def scope(queryset, student_path, time_field, filters):
+    """
+    Применяет общие фильтры отчетов: teacher_id, category_id, student_id и
+    диапазон дат date_from..date_to (включительно) по полю time_field.
+    student_path - путь от модели queryset'а до ученика.
+    """
+    if filters.get('teacher_id') is not None:
+        queryset = queryset.filter(**{f'{student_path}__teacher_id': filters['teacher_id']})
+    if filters.get('category_id') is not None:
+        queryset = queryset.filter(**{f'{student_path}__learning_category_id': filters['category_id']})
+    if filters.get('student_id') is not None:
+        queryset = queryset.filter(**{f'{student_path}_id': filters['student_id']})
+    # Границы - моменты времени, а не __date, чтобы работал индекс по полю
+    if filters.get('date_from') is not None:
+        queryset = queryset.filter(**{f'{time_field}__gte': _day_start(filters['date_from'])})
+    if filters.get('date_to') is not None:
+        queryset = queryset.filter(**{f'{time_field}__lt': _day_start(filters['date_to'] + datetime.timedelta(days=1))})
+    return queryset
+
+
+def topic_performance(filters):
+    """Средний процент, число попыток и последняя попытка по каждой паре (тема, сложность)."""
+    results = scope(HomeworkResult.objects.all(), 'homework__lesson__student', 'created_at', filters)
+    return list(
+        results
+        .values('topic_id', 'difficulty', topic_name=F('topic__name'))
+        .annotate(average_percentage=Avg('percentage'), attempts=Count('id'), last_attempt_at=Max('created_at'))
+        .order_by('topic_name', 'topic_id', 'difficulty')
+    )
+
+
+def lessons_per_week(filters):
+    """Число уроков каждого типа по неделям (неделя начинается с понедельника)."""
+    lessons = scope(Lesson.objects.all(), 'student', 'date', filters)
+    return list(
+        lessons
+        .annotate(week=TruncWeek('date'))
+        .values('week', 'lesson_type_id', lesson_type_name=F('lesson_type__name'))
+        .annotate(lessons=Count('id'))
+        .order_by('week', 'lesson_type_id')
+    )
+
+
+def weakest_topics(filters):
+    """Темы с самым низким средним процентом (не меньше min_attempts попыток), limit штук."""
+    results = scope(HomeworkResult.objects.all(), 'homework__lesson__student', 'created_at', filters)
+    return list(
+        results
+        .values('topic_id', topic_name=F('topic__name'))
+        .annotate(
+            average_percentage=Avg('percentage'),
+            attempts=Count('id'),
+            students=Count('homework__lesson__student_id', distinct=True),
+        )
+        .filter(attempts__gte=filters.get('min_attempts', 1))
+        .order_by('average_percentage', 'topic_id')[:filters.get('limit', 10)]
+    )
+
+
+REPORTS = {
+    'topic-performance': topic_performance,
+    'lessons-per-week': lessons_per_week,
+    'weakest-topics': weakest_topics,
+}
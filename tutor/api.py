@@ -32,20 +32,20 @@ class LearningCategoriesViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin
 
     def list(self, request, *args, **kwargs):
         slug = request.query_params.get('slug')
-        logger.info(f"Запрос категории с slug: {slug}")
+        logger.info("Запрос категории с slug: %s", slug)
         if slug:
             try:
                 category = self.queryset.get(slug=slug)
                 serializer = self.get_serializer(category)
-                logger.info(f"Найдена категория: {serializer.data}")
+                logger.info("Найдена категория: %s", serializer.data)
                 return Response(serializer.data)
             except LearningCategory.DoesNotExist:
-                logger.warning(f"Категория с slug {slug} не найдена")
+                logger.warning("Категория с slug %s не найдена", slug)
                 return Response({"detail": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
         # Применяем фильтры из django-filter
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
-        logger.info(f"Возвращено {len(serializer.data)} категорий")
+        logger.info("Возвращено %s категорий", len(serializer.data))
         return Response(serializer.data)
 
 
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TutorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tutor'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from . import metrics, querylog, signals  # noqa: F401
+
+        connection_created.connect(metrics.install, dispatch_uid='tutor.metrics')
+        if settings.TUTOR_QUERY_LOG:
+            connection_created.connect(querylog.install, dispatch_uid='tutor.querylog')
@@ -0,0 +1,196 @@
+"""
+Асинхронные (ASGI) версии самых тяжелых эндпоинтов чтения: уроки ученика,
+ДЗ с результатами, журнал и генерация записи журнала.
+
+Включаются настройкой TUTOR_ASYNC_VIEWS и подключаются в app/urls.py перед
+маршрутами роутера по тем же адресам. Ответы совпадают с синхронными
+ViewSet'ами (формат, фильтры, курсоры, ETag при общем кэше), но рендерятся только в JSON.
+Запросы, кроме GET, передаются синхронному ViewSet'у в отдельном потоке.
+Доступ проверяется так же, как у ViewSet'а: его initial() выполняет
+аутентификацию, проверку прав и ограничения частоты запросов.
+
+Асинхронный ORM Django выполняет SQL через sync_to_async в одном общем
+потоке, поэтому выигрыш - в том, что ожидающие запросы не занимают поток
+воркера, а не в скорости отдельного запроса. Связанные объекты загружаются
+заранее планом из tutor.eager: сериализация в цикле событий к БД не ходит.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from .cache import amodel_version, shared_versions
+from .conditional import make_validators, serializer_models, set_validators, validator_aggregates
+from .eager import plan_for
+from .journal import build_entry, latest_results
+from .models import Homework, JournalEntry, Lesson, Student
+from .pagination import CreatedAtPagination, LessonPagination
+from .serializers import ALL, HomeworkSerializer, JournalEntrySerializer, LessonSerializer, StudentSerializer
+from .views import HomeworkViewSet, JournalViewSet, LessonViewSet
+
+logger = logging.getLogger(__name__)
+
+INVALID_CHOICE = 'Select a valid choice. That choice is not one of the available choices.'
+
+
+def json_response(data, code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=code, content_type='application/json')
+
+
+async def check_access(viewset_class, action, request):
+    """
+    Политика доступа синхронного ViewSet'а для действия action. Возвращает
+    (Request DRF, None) или (None, ответ с ошибкой).
+    """
+    viewset = viewset_class(action=action, action_map={request.method.lower(): action}, args=(), kwargs={},
+                            format_kwarg=None, headers={})
+    drf_request = viewset.request = viewset.initialize_request(request)
+    try:
+        # Аутентификация и ограничения частоты могут обращаться к БД и кэшу
+        await sync_to_async(viewset.initial)(drf_request)
+    except APIException as exc:
+        error = viewset.handle_exception(exc)  # 401 без схемы аутентификации -> 403, как в DRF
+        response = json_response(error.data, error.status_code)
+        for header in ('WWW-Authenticate', 'Retry-After'):
+            if header in error:
+                response[header] = error[header]
+        return None, response
+    return drf_request, None
+
+
+async def validated_filters(params, filters):
+    """
+    Значения фильтров ?<поле>=<id>, проверенные так же, как DjangoFilterBackend:
+    id должен существовать. filters - {параметр: модель}. Возвращает
+    (lookups, errors).
+    """
+    lookups, errors = {}, {}
+    for name, model in filters.items():
+        value = params.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            pk = model._meta.pk.to_python(value)
+        except ValidationError:
+            pk = None
+        if pk is None or not await model.objects.filter(pk=pk).aexists():
+            errors[name] = [INVALID_CHOICE]
+        else:
+            lookups[name] = pk
+    return lookups, errors
+
+
+def list_view(queryset, serializer_class, pagination_class, fallback, filters=None, lookups=None,
+              conditional_field=None, log_message=None):
+    """
+    Асинхронный list для queryset'а. filters - проверяемые фильтры {параметр: модель},
+    lookups - фильтры без проверки {параметр: lookup ORM}, как в get_queryset() ViewSet'ов.
+    fallback - синхронный ViewSet для остальных методов.
+    """
+    dependencies = serializer_models(serializer_class)
+    viewset_class, fallback = fallback, sync_to_async(fallback.as_view({'get': 'list', 'post': 'create'}))
+
+    async def view(request):
+        if request.method != 'GET':
+            response = await fallback(request)
+            return await sync_to_async(response.render)()
+        drf_request, denied = await check_access(viewset_class, 'list', request)
+        if denied:
+            return denied
+        if log_message:
+            logger.info(log_message, request.GET)
+
+        filtered, errors = await validated_filters(request.GET, filters or {})
+        if errors:
+            return json_response(errors, status.HTTP_400_BAD_REQUEST)
+        for name, lookup in (lookups or {}).items():
+            if request.GET.get(name):
+                filtered[lookup] = request.GET[name]
+        rows = queryset.filter(**filtered)
+
+        # Как в ConditionalGetMixin: валидаторы только при общем кэше версий
+        etag = response = None
+        if shared_versions():
+            versions = [await amodel_version(model) for model in dependencies]
+            values = await rows.order_by().aaggregate(**validator_aggregates(conditional_field))
+            etag, last_modified = make_validators(JSONRenderer.media_type, versions, values)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            fields, expand = request.GET.get('fields'), request.GET.get('expand')
+            plan = plan_for(serializer_class, fields, expand)
+            paginator = pagination_class()
+            try:
+                page = await paginator.apaginate_queryset(plan.apply(rows), drf_request)
+            except APIException as exc:
+                return json_response({'detail': exc.detail}, exc.status_code)
+            data = serializer_class(page, many=True, fields=fields, expand=expand).data
+            response = json_response(paginator.get_paginated_data(data))
+        if etag:
+            set_validators(response, etag, last_modified)
+        return response
+
+    return csrf_exempt(view)
+
+
+lessons_list = list_view(
+    Lesson.objects.all(), LessonSerializer, LessonPagination, LessonViewSet,
+    filters={'student': Student}, conditional_field='date', log_message="Запрос уроков: %s",
+)
+
+homework_list = list_view(
+    Homework.objects.all(), HomeworkSerializer, CreatedAtPagination, HomeworkViewSet,
+    filters={'lesson': Lesson, 'lesson__student': Student}, conditional_field='created_at',
+)
+
+journal_list = list_view(
+    JournalEntry.objects.all(), JournalEntrySerializer, CreatedAtPagination, JournalViewSet,
+    lookups={'student': 'student_id'}, conditional_field='created_at',
+)
+
+
+@csrf_exempt
+async def journal_generate(request):
+    """Асинхронный аналог JournalViewSet.generate."""
+    if request.method != 'POST':
+        return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    drf_request, denied = await check_access(JournalViewSet, 'generate', request)
+    if denied:
+        return denied
+    try:
+        data = drf_request.data
+    except APIException as exc:
+        return json_response({'detail': exc.detail}, exc.status_code)
+    student_id = data.get('student_id')
+    lessons_count = int(data.get('lessons_count', 5))
+
+    # Ученик загружается со всеми связями: ленивые запросы в async-коде недоступны,
+    # а ?expand= может раскрыть любую из них
+    students = plan_for(StudentSerializer, expand=ALL).apply(Student.objects.all())
+    try:
+        student = await students.aget(id=student_id)
+    except Student.DoesNotExist:
+        return json_response({"detail": "Student not found"}, status.HTTP_404_NOT_FOUND)
+
+    if lessons_count < 1 or not await Lesson.objects.filter(student=student).aexists():
+        return json_response({"detail": "No lessons found for this student"}, status.HTTP_400_BAD_REQUEST)
+
+    results = [row async for row in latest_results(student, lessons_count)]
+    journal_entry = build_entry(results, student=student)
+    await journal_entry.asave()
+    serializer = JournalEntrySerializer(journal_entry, fields=request.GET.get('fields'), expand=request.GET.get('expand'))
+    return json_response(serializer.data, status.HTTP_201_CREATED)
+
+
+urlpatterns = [
+    path('lessons/', lessons_list),
+    path('homework/', homework_list),
+    path('journal/', journal_list),
+    path('journal/generate/', journal_generate),
+]
@@ -0,0 +1,179 @@
+"""
+Пакетные операции записи для ViewSet'ов: создание, частичное обновление и
+удаление списка объектов одним запросом.
+
+Весь пакет проверяется целиком (связанные объекты подгружаются по одному
+запросу на таблицу через PreloadingListSerializer) и пишется одной транзакцией
+через bulk_create / bulk_update. Если хотя бы один элемент некорректен, ничего
+не записывается, а в ответе перечисляются ошибки по каждому элементу.
+Ревизии в сервис истории версий (tutor.versioning) и перенос уроков между
+учениками для таблицы освоения (tutor.mastery) обрабатываются явно: сигналов
+при массовой записи нет.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .cache import bump_version
+from .mastery import mark_moved
+from .versioning import record_objects
+
+
+def _split_m2m(model, data):
+    m2m = {field.name for field in model._meta.many_to_many}
+    fields = {name: value for name, value in data.items() if name not in m2m}
+    relations = {name: value for name, value in data.items() if name in m2m}
+    return fields, relations
+
+
+def _coerce_pk(model, value):
+    """id элемента пакета в тип первичного ключа ("5" -> 5); None - id некорректен."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return model._meta.pk.to_python(value)
+    except ValidationError:
+        return None
+
+
+def _replace_m2m(model, name, objects, related, clear=True):
+    """
+    Заменяет связи M2M name у objects: одно удаление и один INSERT на поле.
+    clear=False - objects только что вставлены, старых связей нет и DELETE не нужен.
+    """
+    field = model._meta.get_field(name)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    if clear:
+        through.objects.filter(**{f'{source}__in': [obj.pk for obj in objects]}).delete()
+    through.objects.bulk_create(
+        through(**{f'{source}_id': obj.pk, f'{target}_id': item.pk})
+        for obj, items in zip(objects, related)
+        for item in items
+    )
+    return field.related_model
+
+
+class BatchWriteMixin:
+    """
+    POST   .../batch/  - список объектов для создания;
+    PATCH  .../batch/  - список {"id": ..., <поля>} для частичного обновления;
+    DELETE .../batch/  - {"ids": [...]} (или ?ids=1,2,3) для удаления.
+    """
+    batch_serializer_class = None
+    max_batch_size = 1000
+
+    def get_batch_serializer(self, *args, **kwargs):
+        serializer_class = self.batch_serializer_class or self.get_serializer_class()
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, many=True, **kwargs)
+
+    def get_batch_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise serializers.ValidationError({'detail': 'Expected a non-empty list of objects'})
+        if len(items) > self.max_batch_size:
+            raise serializers.ValidationError({'detail': f'At most {self.max_batch_size} objects per batch'})
+        return items
+
+    def batch_response(self, pks, code):
+        serializer = self.get_batch_serializer(self.get_queryset().filter(pk__in=pks).order_by('pk'))
+        return Response(serializer.data, status=code)
+
+    def invalidate(self, model, related_models=()):
+        # bulk_create / bulk_update не отправляют сигналы
+        bump_version(model, *related_models)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch_create(self, request):
+        serializer = self.get_batch_serializer(data=self.get_batch_items(request))
+        if not serializer.is_valid():
+            errors = [{'index': index, 'errors': item} for index, item in enumerate(serializer.errors) if item]
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        objects, relations = [], []
+        for data in serializer.validated_data:
+            fields, m2m = _split_m2m(model, data)
+            objects.append(model(**fields))
+            relations.append(m2m)
+        related_models = []
+        with transaction.atomic():
+            model.objects.bulk_create(objects)
+            for name in {name for m2m in relations for name in m2m}:
+                changed = [(obj, m2m[name]) for obj, m2m in zip(objects, relations) if name in m2m]
+                related_models.append(_replace_m2m(model, name, *zip(*changed), clear=False))
+            record_objects(model, objects, created=True)
+        self.invalidate(model, related_models)
+        return self.batch_response([obj.pk for obj in objects], status.HTTP_201_CREATED)
+
+    @batch_create.mapping.patch
+    def batch_update(self, request):
+        items = self.get_batch_items(request)
+        model = self.get_queryset().model
+        pks = [_coerce_pk(model, item.get('id')) if isinstance(item, dict) else None for item in items]
+        instances = model.objects.in_bulk([pk for pk in pks if pk is not None])
+
+        list_serializer = self.get_batch_serializer(partial=True)
+        child = list_serializer.child
+        errors, updates = [], []
+        with list_serializer.preload(items):
+            for index, (item, pk) in enumerate(zip(items, pks)):
+                instance = instances.get(pk)
+                if instance is None:
+                    errors.append({'index': index, 'errors': {'id': ['Object not found']}})
+                    continue
+                child.instance = instance
+                try:
+                    updates.append((instance, child.run_validation(item)))
+                except serializers.ValidationError as exc:
+                    errors.append({'index': index, 'id': instance.pk, 'errors': exc.detail})
+        child.instance = None
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        changed_fields, relations = set(), {}
+        for instance, data in updates:
+            fields, m2m = _split_m2m(model, data)
+            for name, value in fields.items():
+                setattr(instance, name, value)
+            changed_fields.update(fields)
+            for name, value in m2m.items():
+                relations.setdefault(name, []).append((instance, value))
+        objects = [instance for instance, _ in updates]
+        related_models = []
+        with transaction.atomic():
+            if changed_fields:
+                model.objects.bulk_update(objects, sorted(changed_fields))
+                mark_moved(model, objects)
+            for name, changed in relations.items():
+                related_models.append(_replace_m2m(model, name, *zip(*changed)))
+            record_objects(model, objects)
+        self.invalidate(model, related_models)
+        return self.batch_response([obj.pk for obj in objects], status.HTTP_200_OK)
+
+    @batch_create.mapping.delete
+    def batch_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if ids is None and request.query_params.get('ids'):
+            ids = request.query_params['ids'].split(',')
+        try:
+            ids = [int(pk) for pk in ids or []]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'ids': ['Expected a list of integer ids']})
+        if not ids:
+            raise serializers.ValidationError({'ids': ['This field is required.']})
+
+        queryset = self.get_queryset().model.objects.filter(pk__in=ids)
+        found = set(queryset.values_list('pk', flat=True))
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            errors = [{'id': pk, 'errors': {'id': ['Object not found']}} for pk in missing]
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # QuerySet.delete() удаляет каскадом пачками и отправляет post_delete (инвалидация кэша)
+        with transaction.atomic():
+            queryset.delete()
+        return Response({'deleted': len(found)}, status=status.HTTP_200_OK)
@@ -0,0 +1,120 @@
+"""
+Кэш ответов API с инвалидацией по версиям моделей.
+
+Для каждой модели приложения в кэше хранится "версия" - время последнего
+изменения. Сигналы post_save/post_delete/m2m_changed (tutor/signals.py)
+обновляют версию, а ключ закэшированного ответа включает версии всех моделей,
+от которых зависит представление. Поэтому явно удалять ключи не нужно: после
+изменения старые ответы просто перестают находиться и вытесняются по таймауту.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+
+VERSION_KEY = 'tutor:version:{}'
+RESPONSE_KEY = 'tutor:response:{}'
+
+
+def model_version(model):
+    """Текущая версия модели; если ее нет в кэше, она создается."""
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+async def amodel_version(model):
+    """model_version() для асинхронных представлений: кэш не блокирует цикл событий."""
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def shared_versions():
+    """
+    Версии видны всем процессам (file, redis). В locmem каждый воркер и каждая
+    команда manage.py хранят свои версии, и чужих изменений они не видят.
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def bump_version(*models):
+    """Помечает модели измененными."""
+    now = time.time()
+    cache.set_many({VERSION_KEY.format(model._meta.label_lower): now for model in models}, None)
+
+
+class CacheStats:
+    """Счетчики попаданий и промахов по ресурсам (внутри процесса)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, resource, hit):
+        with self._lock:
+            self._counters[resource]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            resources = {name: dict(counters) for name, counters in self._counters.items()}
+        return {
+            'hits': sum(c['hits'] for c in resources.values()),
+            'misses': sum(c['misses'] for c in resources.values()),
+            'resources': resources,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+
+class ResponseCacheMixin:
+    """
+    cached_response() кэширует ответ произвольного действия ViewSet'а. Ключ
+    учитывает хост, путь, параметры запроса (?category=, ?slug=, курсор
+    пагинации) и версии моделей из cache_dependencies (по умолчанию - модель
+    queryset'а).
+    """
+    cache_dependencies = ()
+
+    def get_cache_dependencies(self):
+        return self.cache_dependencies or (self.queryset.model,)
+
+    def get_response_cache_key(self, request, validator=None):
+        params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+        versions = [model_version(model) for model in self.get_cache_dependencies()]
+        raw = repr((request.get_host(), request.path, params, versions, validator))
+        return RESPONSE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+    def cached_response(self, request, view, *args, validator=None, **kwargs):
+        """validator - дополнительная часть ключа, например ETag ответа."""
+        key = self.get_response_cache_key(request, validator)
+        data = cache.get(key)
+        if data is not None:
+            stats.record(self.basename, hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        stats.record(self.basename, hit=False)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.TUTOR_RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
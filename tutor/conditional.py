@@ -0,0 +1,151 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для ViewSet'ов.
+
+Валидаторы не вычисляются по телу ответа: вместо сериализации берется один
+агрегирующий запрос COUNT/MAX(pk)/MAX(<поле времени>) по отфильтрованному
+queryset'у и версии моделей из tutor.cache, которые меняются сигналами при
+любом сохранении, удалении или изменении M2M. Агрегат ловит массовые операции
+без сигналов (bulk_create), версии - правки существующих строк.
+
+Валидаторы выдаются только при общем для процессов кэше (shared_versions()).
+Версии в locmem не видят записей других воркеров и команд manage.py, а агрегат
+не замечает UPDATE существующих строк: такой ETag отдавал бы 304 со старыми
+данными, поэтому с locmem ответы отдаются без ETag / Last-Modified.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import serializers
+
+from .cache import ResponseCacheMixin, model_version, shared_versions
+from .serializers import ALL, ExpandableFieldsMixin
+
+_models = {}
+
+
+def _collect_models(serializer, found):
+    found.append(serializer.Meta.model)
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.ModelSerializer):
+            _collect_models(field, found)
+        elif isinstance(field, serializers.ManyRelatedField):
+            found.append(field.child_relation.get_queryset().model)
+
+
+def serializer_models(serializer_class):
+    """Модели, данные которых попадают в ответ сериализатора (включая вложенные)."""
+    models = _models.get(serializer_class)
+    if models is None:
+        found = []
+        # Все вложенные связи, какие бы ?expand= ни запросил клиент
+        expandable = issubclass(serializer_class, ExpandableFieldsMixin)
+        _collect_models(serializer_class(expand=ALL) if expandable else serializer_class(), found)
+        models = _models[serializer_class] = tuple(dict.fromkeys(found))
+    return models
+
+
+def validator_aggregates(field=None):
+    """Агрегаты для валидаторов: число строк, MAX(pk) и MAX(field)."""
+    aggregates = {'count': Count('pk'), 'max_pk': Max('pk')}
+    if field:
+        aggregates['latest'] = Max(field)
+    return aggregates
+
+
+def make_validators(media_type, versions, values=None):
+    """(etag, last_modified) по версиям моделей и, если есть, результату агрегата."""
+    state = [media_type, versions]
+    modified = [max(versions)]
+    if values is not None:
+        state.append(sorted(values.items()))
+        if values.get('latest') is not None:
+            modified.append(values['latest'].timestamp())
+    etag = 'W/"%s"' % hashlib.md5(repr(state).encode()).hexdigest()
+    return etag, int(max(modified))
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Браузер хранит ответ, но перед использованием всегда перепроверяет его
+    patch_cache_control(response, no_cache=True)
+
+
+class ConditionalGetMixin:
+    """
+    Отдает 304 Not Modified на If-None-Match / If-Modified-Since для list и retrieve.
+
+    conditional_field - поле времени создания для Last-Modified ('created_at', 'date');
+    conditional_dependencies - модели, изменения которых меняют ответ (по умолчанию
+    выводятся из сериализатора); conditional_aggregate = False отключает запрос к БД,
+    если версий моделей достаточно. Без общего для процессов кэша (shared_versions())
+    запросы обрабатываются как обычные.
+    """
+    conditional_field = None
+    conditional_dependencies = ()
+    conditional_aggregate = True
+
+    def get_conditional_dependencies(self):
+        return self.conditional_dependencies or serializer_models(self.get_serializer_class())
+
+    def get_validators(self, queryset):
+        versions = [model_version(model) for model in self.get_conditional_dependencies()]
+        values = None
+        if self.conditional_aggregate:
+            values = queryset.order_by().aggregate(**validator_aggregates(self.conditional_field))
+        etag, last_modified = make_validators(self.request.accepted_media_type, versions, values)
+        return etag, last_modified, values['count'] if values else None
+
+    def make_response(self, request, view, etag, *args, **kwargs):
+        """Полный ответ, если клиентская копия устарела; etag - None без валидаторов."""
+        return view(request, *args, **kwargs)
+
+    def conditional_response(self, request, view, *args, **kwargs):
+        if not shared_versions():
+            return self.make_response(request, view, None, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        detail = lookup_url_kwarg in kwargs
+        if detail:
+            try:
+                queryset = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, ValidationError):
+                # Некорректный ключ - 404 из get_object()
+                return self.make_response(request, view, None, *args, **kwargs)
+
+        etag, last_modified, count = self.get_validators(queryset)
+        response = None
+        if not (detail and count == 0):  # несуществующий объект - обычный 404
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.make_response(request, view, etag, *args, **kwargs)
+        if response.status_code in (200, 304):
+            set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+
+class ReferenceDataMixin(ConditionalGetMixin, ResponseCacheMixin):
+    """
+    Справочники (учителя, цели, категории, виды уроков, темы): list и retrieve
+    кэшируются, а ETag строится по одним версиям моделей, без запроса к БД.
+    Справочники меняются через API с сигналами, а массовая запись (импорт,
+    пакетные операции) сама обновляет версии, поэтому агрегат не нужен.
+    ETag входит в ключ кэша ответа.
+    """
+    conditional_aggregate = False
+
+    def make_response(self, request, view, etag, *args, **kwargs):
+        return self.cached_response(request, view, *args, validator=etag, **kwargs)
@@ -0,0 +1,115 @@
+"""
+План жадной загрузки (select_related / prefetch_related) для ViewSet'ов.
+
+План выводится из дерева сериализатора: вложенный сериализатор по прямому FK
+превращается в select_related, вложенный список или M2M - в prefetch_related.
+Поля, которые отдают только первичные ключи, берутся из уже загруженных
+колонок (*_id), а для M2M подгружаются через Prefetch с .only('pk').
+"""
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .serializers import ExpandableFieldsMixin
+
+_plans = {}
+# Планы для произвольных ?fields= / ?expand= кэшируются до этого предела
+MAX_PLANS = 256
+
+
+class EagerLoadingPlan:
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def __repr__(self):
+        lookups = [p.prefetch_to if isinstance(p, Prefetch) else p for p in self.prefetch_related]
+        return f"EagerLoadingPlan(select_related={self.select_related}, prefetch_related={tuple(lookups)})"
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except Exception:
+        return None
+
+
+def _walk(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*' or '.' in field.source:
+            continue
+        model_field = _model_field(model, field.source)
+        if model_field is None or not model_field.is_relation:
+            continue
+        path = prefix + field.source
+        related_model = model_field.related_model
+        many = model_field.many_to_many or model_field.one_to_many
+
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.append(path)
+            _walk(field.child, related_model, path + '__', True, select, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            if in_prefetch:
+                prefetch.append(path)
+            else:
+                select.append(path)
+            _walk(field, related_model, path + '__', in_prefetch, select, prefetch)
+        elif isinstance(field, serializers.ManyRelatedField) and many:
+            # Нужны только ключи связанных объектов
+            prefetch.append(Prefetch(path, queryset=related_model.objects.only('pk')))
+        elif isinstance(field, serializers.RelatedField) and not field.use_pk_only_optimization():
+            if in_prefetch:
+                prefetch.append(path)
+            else:
+                select.append(path)
+
+
+def build_plan(serializer):
+    """Строит план загрузки для экземпляра сериализатора (или его child для many=True)."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    select, prefetch = [], []
+    _walk(serializer, serializer.Meta.model, '', False, select, prefetch)
+    return EagerLoadingPlan(select, prefetch)
+
+
+def plan_for(serializer_class, fields=None, expand=None):
+    """
+    План для класса сериализатора и выборки полей (см. ExpandableFieldsMixin),
+    кэшируется на время жизни процесса.
+    """
+    if not issubclass(serializer_class, ExpandableFieldsMixin):
+        fields = expand = None
+    key = (serializer_class, fields, expand)
+    plan = _plans.get(key)
+    if plan is None:
+        kwargs = {} if fields is None and expand is None else {'fields': fields, 'expand': expand}
+        plan = build_plan(serializer_class(**kwargs))
+        if len(_plans) < MAX_PLANS:
+            _plans[key] = plan
+    return plan
+
+
+class EagerLoadingMixin:
+    """
+    Применяет план жадной загрузки к queryset'у ViewSet'а.
+
+    По умолчанию план выводится из serializer_class; ViewSet может задать
+    eager_loading = EagerLoadingPlan(...) явно.
+    """
+    eager_loading = None
+
+    def get_eager_loading_plan(self):
+        if self.eager_loading is not None:
+            return self.eager_loading
+        params = getattr(self.request, 'query_params', {})
+        return plan_for(self.get_serializer_class(), params.get('fields'), params.get('expand'))
+
+    def get_queryset(self):
+        return self.get_eager_loading_plan().apply(super().get_queryset())
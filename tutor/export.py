@@ -0,0 +1,112 @@
+"""
+Потоковая выгрузка уроков, результатов ДЗ и записей журнала.
+
+Строки читаются через values() и iterator(chunk_size=...), поэтому объем
+памяти не зависит от размера выгрузки, а первые строки уходят клиенту сразу.
+"""
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from .models import HomeworkResult, JournalEntry, Lesson
+from .renderers import CSVRenderer, NDJSONRenderer
+
+
+class Export:
+    """
+    Описание выгрузки: columns - имена колонок или пары (колонка, путь поля),
+    filters - допустимые параметры фильтрации и соответствующие им lookup'ы.
+    """
+
+    def __init__(self, model, columns, filters, ordering=('id',)):
+        self.model = model
+        self.columns = [column if isinstance(column, tuple) else (column, column) for column in columns]
+        self.filters = filters
+        self.ordering = ordering
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+    def clean_filters(self, params):
+        """Возвращает lookup'ы для известных параметров; ValueError при нечисловом id."""
+        lookups = {}
+        for name, lookup in self.filters.items():
+            value = params.get(name)
+            if value not in (None, ''):
+                try:
+                    lookups[lookup] = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f'{name} must be an integer, got {value!r}')
+        return lookups
+
+    def rows(self, lookups, chunk_size=2000):
+        plain = [name for name, path in self.columns if name == path]
+        related = {name: F(path) for name, path in self.columns if name != path}
+        return (
+            self.model.objects
+            .filter(**lookups)
+            .order_by(*self.ordering)
+            .values(*plain, **related)
+            .iterator(chunk_size=chunk_size)
+        )
+
+
+EXPORTS = {
+    'lessons': Export(
+        Lesson,
+        [
+            'id', 'student_id', ('student_name', 'student__full_name'),
+            'lesson_type_id', ('lesson_type_name', 'lesson_type__name'),
+            'topic_id', ('topic_name', 'topic__name'),
+            'date', 'comment',
+        ],
+        filters={'student': 'student_id'},
+    ),
+    'homework-results': Export(
+        HomeworkResult,
+        [
+            'id', 'homework_id', ('lesson_id', 'homework__lesson_id'),
+            ('student_id', 'homework__lesson__student_id'),
+            'topic_id', ('topic_name', 'topic__name'),
+            'difficulty', 'correct_count', 'total_count', 'percentage', 'created_at',
+        ],
+        filters={'homework__lesson': 'homework__lesson_id', 'lesson__student': 'homework__lesson__student_id'},
+    ),
+    'journal': Export(
+        JournalEntry,
+        [
+            'id', 'student_id', ('student_name', 'student__full_name'), 'created_at',
+            'good_results', 'bad_results', 'covered_topics', 'working_on',
+            'recommended_lessons', 'recommendation_reason',
+        ],
+        filters={'student': 'student_id'},
+    ),
+}
+
+
+class ExportMixin:
+    """
+    Действие GET .../export/ для ViewSet'а: CSV по умолчанию, NDJSON при
+    ?format=ndjson или Accept: application/x-ndjson.
+    """
+    export_name = None
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        export = EXPORTS[self.export_name]
+        try:
+            lookups = export.clean_filters(request.query_params)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        rows = export.rows(lookups, chunk_size=self.export_chunk_size)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows, export.column_names),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{renderer.format}"'
+        return response
@@ -0,0 +1,196 @@
+"""
+Быстрый путь list для больших списков: строки читаются через values_list()
+и превращаются в словари заранее скомпилированной функцией, без создания
+моделей и обхода полей сериализатора на каждой строке.
+
+Функция строится по полям сериализатора (с учетом ?fields= / ?expand=), поэтому
+ответ совпадает с сериализатором байт в байт. Поддерживаются обычные поля,
+первичные ключи связей и вложенные сериализаторы по обязательным FK; если в
+выборке есть что-то другое (M2M, вложенные списки, SerializerMethodField),
+ViewSet отвечает обычным путем.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import ORJSONRenderer
+from .serializers import ExpandableFieldsMixin
+
+# Значение из БД уже совпадает с to_representation()
+PLAIN_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.FloatField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.ReadOnlyField,
+)
+# Значение из БД проходит через to_representation() поля
+CONVERTED_FIELDS = (
+    serializers.DateTimeField, serializers.DateField, serializers.TimeField, serializers.DecimalField,
+    serializers.DurationField, serializers.UUIDField,
+)
+MAX_MAPPERS = 256
+
+_mappers = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class ValuesMapper:
+    """lookups - колонки для values_list(); вызов превращает строки в список словарей."""
+
+    def __init__(self, lookups, build):
+        self.lookups = lookups
+        self.build = build
+
+    def __call__(self, rows):
+        # Часовой пояс как в DateTimeField.enforce_timezone(), один раз на список
+        return self.build(rows, timezone.get_current_timezone() if settings.USE_TZ else None)
+
+
+def iso_datetime(value, tz, field):
+    """DateTimeField.to_representation() для ISO 8601 без поиска часового пояса на каждой строке."""
+    if tz is None:
+        return field.to_representation(value)
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _is_iso_datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return (
+        type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+        and isinstance(output_format, str) and output_format.lower() == ISO_8601
+    )
+
+
+def _lookup(model, source_attrs):
+    """Путь ORM для source поля; промежуточные связи - только обязательные FK."""
+    for attr in source_attrs[:-1]:
+        model_field = _get_field(model, attr)
+        if not (model_field.many_to_one or model_field.one_to_one) or model_field.null or model_field.auto_created:
+            raise Unsupported(attr)
+        model = model_field.related_model
+    model_field = _get_field(model, source_attrs[-1])
+    if model_field.many_to_many or model_field.one_to_many or (model_field.auto_created and not model_field.concrete):
+        raise Unsupported(source_attrs[-1])
+    return '__'.join(source_attrs), model_field
+
+
+def _get_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        raise Unsupported(name)
+
+
+def _compile(serializer, model, prefix, lookups, namespace):
+    """Выражение Python, собирающее словарь сериализатора из кортежа r."""
+    items = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' or isinstance(field, serializers.ListSerializer):
+            raise Unsupported(name)
+        if isinstance(field, serializers.ModelSerializer):
+            path, model_field = _lookup(model, field.source_attrs)
+            if not model_field.is_relation or model_field.null:
+                raise Unsupported(name)
+            expression = _compile(field, model_field.related_model, prefix + path + '__', lookups, namespace)
+        else:
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                if field.pk_field is not None:
+                    raise Unsupported(name)
+                converter = None
+            elif isinstance(field, serializers.JSONField) and not field.binary:
+                converter = None
+            elif isinstance(field, PLAIN_FIELDS):
+                converter = None
+            elif isinstance(field, CONVERTED_FIELDS):
+                converter = field.to_representation
+            else:
+                raise Unsupported(name)
+            path, model_field = _lookup(model, field.source_attrs)
+            # Связь отдается ключом: поле первичного ключа или колонка *_id
+            if model_field.is_relation and not (
+                isinstance(field, serializers.PrimaryKeyRelatedField) or field.source_attrs[-1] == model_field.attname
+            ):
+                raise Unsupported(name)
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and not model_field.is_relation:
+                raise Unsupported(name)
+            lookup = prefix + path
+            if lookup not in lookups:
+                lookups.append(lookup)
+            value = f'r[{lookups.index(lookup)}]'
+            expression = value
+            if converter is not None:
+                converter_name = f'c{len(namespace)}'
+                if _is_iso_datetime(field):
+                    namespace[converter_name] = field
+                    expression = f'(iso_datetime({value}, tz, {converter_name}) if {value} is not None else None)'
+                else:
+                    namespace[converter_name] = converter
+                    expression = f'({converter_name}({value}) if {value} is not None else None)'
+        items.append(f'{name!r}: {expression}')
+    return '{' + ', '.join(items) + '}'
+
+
+def compile_mapper(serializer, extra_lookups=()):
+    """ValuesMapper для экземпляра сериализатора или None, если поля не поддерживаются."""
+    lookups, namespace = [], {}
+    try:
+        expression = _compile(serializer, serializer.Meta.model, '', lookups, namespace)
+    except Unsupported:
+        return None
+    for lookup in extra_lookups:
+        if lookup not in lookups:
+            lookups.append(lookup)
+    code = f'def build(rows, tz):\n    return [{expression} for r in rows]\n'
+    namespace['iso_datetime'] = iso_datetime
+    exec(compile(code, f'<values mapper {type(serializer).__name__}>', 'exec'), namespace)
+    return ValuesMapper(lookups, namespace['build'])
+
+
+def mapper_for(serializer_class, fields=None, expand=None, extra_lookups=()):
+    """ValuesMapper для класса сериализатора и выборки полей, кэшируется как tutor.eager.plan_for."""
+    if not issubclass(serializer_class, ExpandableFieldsMixin):
+        fields = expand = None
+    key = (serializer_class, fields, expand, tuple(extra_lookups))
+    if key in _mappers:
+        return _mappers[key]
+    kwargs = {} if fields is None and expand is None else {'fields': fields, 'expand': expand}
+    mapper = compile_mapper(serializer_class(**kwargs), extra_lookups)
+    if len(_mappers) < MAX_MAPPERS:
+        _mappers[key] = mapper
+    return mapper
+
+
+class ValuesListMixin:
+    """
+    Быстрый list для ViewSet'а: values_list() + скомпилированный ValuesMapper
+    и ORJSONRenderer. Поля сортировки пагинации добавляются в выборку, чтобы
+    строить курсор по кортежам (values_list(named=True)).
+    """
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def get_values_mapper(self):
+        ordering = getattr(self.paginator, 'ordering', ())
+        params = self.request.query_params
+        return mapper_for(
+            self.get_serializer_class(), params.get('fields'), params.get('expand'),
+            [field.lstrip('-') for field in ordering],
+        )
+
+    def list(self, request, *args, **kwargs):
+        mapper = self.get_values_mapper()
+        if mapper is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        queryset = queryset.values_list(*mapper.lookups, named=True)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(mapper(page))
+        return Response(mapper(queryset))
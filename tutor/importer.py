@@ -0,0 +1,241 @@
+"""
+Массовый импорт учеников, тем и уроков из CSV / JSON / NDJSON.
+
+Строки обрабатываются порциями: на порцию приходится по одному запросу на
+каждую связанную таблицу (PreloadingListSerializer), затем все корректные
+строки записываются bulk_create в одной транзакции. Ошибочные строки не
+прерывают импорт - они попадают в отчет с номером строки: и не прошедшие
+валидацию, и неразобранные строки NDJSON, и строки, которые отвергла БД: если
+порция не записалась, ее строки записываются по одной, чтобы найти виновные.
+Кэш ответов сбрасывается после фиксации каждой записанной порции.
+"""
+import csv
+import io
+import json
+import re
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .cache import bump_version
+from .models import Lesson, Student, Topic
+from .serializers import LessonImportSerializer, StudentImportSerializer, TopicImportSerializer
+from .utils import chunked
+from .versioning import record_objects
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+class InvalidRow:
+    """Строка файла, которую не удалось разобрать."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+class Importer:
+    serializer_class = None
+    model = None
+    list_fields = ()  # колонки CSV со списком id через запятую
+
+    def build(self, data):
+        return self.model(**data)
+
+    def save(self, objects, validated):
+        self.model.objects.bulk_create(objects)
+
+    def changed_models(self):
+        return (self.model,)
+
+
+class StudentImporter(Importer):
+    serializer_class = StudentImportSerializer
+    model = Student
+
+
+class TopicImporter(Importer):
+    serializer_class = TopicImportSerializer
+    model = Topic
+    list_fields = ('student_ids',)
+
+    def build(self, data):
+        return Topic(name=data['name'])
+
+    def save(self, objects, validated):
+        # bulk_create возвращает pk (SQLite 3.35+, PostgreSQL), по ним пишем связи M2M
+        Topic.objects.bulk_create(objects)
+        Through = Topic.students.through
+        Through.objects.bulk_create(
+            Through(topic_id=topic.pk, student_id=student.pk)
+            for topic, data in zip(objects, validated)
+            for student in data.get('students', [])
+        )
+
+    def changed_models(self):
+        return (Topic, Student)
+
+
+class LessonImporter(Importer):
+    serializer_class = LessonImportSerializer
+    model = Lesson
+
+    def save(self, objects, validated):
+        # Дата из файла (или текущая по умолчанию) записывается тем же INSERT'ом
+        Lesson.objects.bulk_create(objects)
+        record_objects(Lesson, objects, created=True)
+
+
+IMPORTERS = {
+    'students': StudentImporter(),
+    'topics': TopicImporter(),
+    'lessons': LessonImporter(),
+}
+
+
+def read_rows(stream, fmt, list_fields=()):
+    """Читает строки из текстового потока; пустые ячейки CSV считаются отсутствующими."""
+    if fmt == 'json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError('JSON import expects an array of objects')
+        return rows
+    if fmt == 'ndjson':
+        return _ndjson_rows(stream)
+    if fmt == 'csv':
+        return (_csv_row(row, list_fields) for row in csv.DictReader(stream))
+    raise ValueError(f'Unknown format {fmt!r}, expected one of {", ".join(FORMATS)}')
+
+
+def _ndjson_rows(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield InvalidRow(f'Invalid JSON: {exc}')
+
+
+def _csv_row(row, list_fields):
+    cleaned = {}
+    for key, value in row.items():
+        if key is None or value in (None, ''):
+            continue
+        if key in list_fields:
+            value = [item for item in re.split(r'[\s,;]+', value) if item]
+        cleaned[key] = value
+    return cleaned
+
+
+def detect_format(name, default='json'):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return extension if extension in FORMATS else default
+
+
+def import_rows(resource, rows, batch_size=1000, dry_run=False):
+    """
+    Импортирует строки rows (итерируемое словарей) в ресурс resource.
+    Возвращает отчет {'total', 'created', 'failed', 'errors': [{'row', 'errors'}]},
+    row - номер строки данных, начиная с 1. При dry_run строки только проверяются.
+    """
+    importer = IMPORTERS[resource]
+    list_serializer = importer.serializer_class(many=True)
+    child = list_serializer.child
+    total, created, errors = 0, 0, []
+
+    for chunk in chunked(rows, batch_size):
+        validated, objects, numbers = [], [], []
+        with list_serializer.preload(chunk):
+            for offset, row in enumerate(chunk, start=total + 1):
+                if isinstance(row, InvalidRow):
+                    errors.append({'row': offset, 'errors': {'non_field_errors': [row.message]}})
+                    continue
+                if not isinstance(row, dict):
+                    errors.append({'row': offset, 'errors': {'non_field_errors': ['Expected an object']}})
+                    continue
+                try:
+                    data = child.run_validation(row)
+                except serializers.ValidationError as exc:
+                    errors.append({'row': offset, 'errors': exc.detail})
+                    continue
+                validated.append(data)
+                objects.append(importer.build(data))
+                numbers.append(offset)
+        total += len(chunk)
+
+        if objects and not dry_run:
+            saved = len(objects)
+            try:
+                with transaction.atomic():
+                    importer.save(objects, validated)
+            except IntegrityError:
+                # Порция откачена целиком: повторяем строки по одной, ошибка - у своей строки
+                saved = 0
+                for number, obj, data in zip(numbers, objects, validated):
+                    obj.pk = None  # pk, полученный в откаченной транзакции
+                    try:
+                        with transaction.atomic():
+                            importer.save([obj], [data])
+                    except IntegrityError as exc:
+                        errors.append({'row': number, 'errors': {'non_field_errors': [str(exc)]}})
+                    else:
+                        saved += 1
+                errors.sort(key=lambda error: error['row'])
+            if saved:
+                # bulk_create не отправляет сигналы - сбрасываем кэш ответов сами
+                transaction.on_commit(partial(bump_version, *importer.changed_models()))
+            created += saved
+
+    return {'total': total, 'created': created, 'failed': len(errors), 'errors': errors}
+
+
+def import_file(resource, content, fmt, **options):
+    """Импорт из содержимого файла (str или bytes)."""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    stream = io.StringIO(content)
+    return import_rows(resource, read_rows(stream, fmt, IMPORTERS[resource].list_fields), **options)
+
+
+class ImportMixin:
+    """
+    Действие POST .../import/ для ViewSet'а. Тело - JSON-массив строк либо
+    multipart с файлом file (.csv, .json, .ndjson). ?dry_run=1 только проверяет
+    строки, ?batch_size= задает размер порции.
+    """
+    import_name = None
+    max_import_batch_size = 5000
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        try:
+            batch_size = min(int(request.query_params.get('batch_size', 1000)), self.max_import_batch_size)
+        except ValueError:
+            raise serializers.ValidationError({'batch_size': ['A valid integer is required.']})
+        options = {
+            'batch_size': max(batch_size, 1),
+            'dry_run': request.query_params.get('dry_run') in ('1', 'true'),
+        }
+
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                fmt = request.data.get('format') or detect_format(upload.name)
+                report = import_file(self.import_name, upload.read(), fmt, **options)
+            elif isinstance(request.data, list):
+                report = import_rows(self.import_name, request.data, **options)
+            else:
+                raise ValueError('Send a JSON array of rows or a file upload')
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise serializers.ValidationError({'detail': str(exc)})
+
+        if report['total'] and report['failed'] == report['total']:
+            code = status.HTTP_400_BAD_REQUEST
+        elif options['dry_run']:
+            code = status.HTTP_200_OK
+        else:
+            code = status.HTTP_201_CREATED
+        return Response(report, status=code)
@@ -0,0 +1,195 @@
+"""
+Формирование записей журнала по результатам домашних заданий.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import HomeworkResult, JournalEntry, Lesson, Student
+from .utils import chunked
+from .versioning import record_objects
+
+
+def _latest_per_topic(results, *partition):
+    return (
+        results
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[*partition, F('topic_id'), F('difficulty')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .filter(rank=1)
+    )
+
+
+def latest_results(student, lessons_count):
+    """
+    Последний результат по каждой паре (тема, сложность) за последние
+    lessons_count уроков ученика. Выборка делается одним запросом: уроки
+    подставляются подзапросом, "последний" выбирается оконной функцией,
+    название темы подтягивается JOIN'ом.
+    """
+    lesson_ids = Lesson.objects.filter(student=student).order_by('-date').values('id')[:lessons_count]
+    return (
+        _latest_per_topic(HomeworkResult.objects.filter(homework__lesson__in=lesson_ids))
+        .order_by('topic_id', 'difficulty')
+        .values('topic_id', 'difficulty', 'percentage', topic_name=F('topic__name'))
+    )
+
+
+def recent_lesson_ids(student_ids, lessons_count):
+    """Подзапрос: id последних lessons_count уроков каждого из учеников."""
+    return (
+        Lesson.objects
+        .filter(student_id__in=student_ids)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('student_id')],
+            order_by=[F('date').desc(), F('id').desc()],
+        ))
+        .filter(rank__lte=lessons_count)
+        .values('id')
+    )
+
+
+def latest_results_by_student(student_ids, lessons_count):
+    """
+    То же, что latest_results(), но сразу для группы учеников и тоже одним
+    запросом: последние уроки каждого ученика отбираются ROW_NUMBER() по student_id.
+    Возвращает словарь {student_id: [строки]}.
+    """
+    rows = (
+        _latest_per_topic(
+            HomeworkResult.objects.filter(homework__lesson__in=recent_lesson_ids(student_ids, lessons_count)),
+            F('homework__lesson__student_id'),
+        )
+        .order_by('homework__lesson__student_id', 'topic_id', 'difficulty')
+        .values(
+            'topic_id', 'difficulty', 'percentage',
+            topic_name=F('topic__name'), student_id=F('homework__lesson__student_id'),
+        )
+    )
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row['student_id']].append(row)
+    return grouped
+
+
+def select_students(teacher_id=None, category_id=None, student_ids=None):
+    """id учеников для пакетной генерации; фильтры объединяются через И."""
+    queryset = Student.objects.order_by('id')
+    if teacher_id is not None:
+        queryset = queryset.filter(teacher_id=teacher_id)
+    if category_id is not None:
+        queryset = queryset.filter(learning_category_id=category_id)
+    if student_ids is not None:
+        queryset = queryset.filter(id__in=student_ids)
+    return queryset.values_list('id', flat=True)
+
+
+def generate_entries(student_ids, lessons_count=5, chunk_size=200, progress=None):
+    """
+    Пакетно создает записи журнала для учеников из student_ids (итерируемое id).
+
+    Ученики обрабатываются порциями по chunk_size: на порцию уходит фиксированное
+    число запросов (ученики с уроками, результаты, bulk_create), поэтому память
+    и число обращений к БД не зависят от общего размера выборки.
+    progress(processed, created) вызывается после каждой порции.
+    """
+    processed, created, skipped = 0, 0, []
+    for chunk in chunked(student_ids, chunk_size):
+        with_lessons = set(
+            Lesson.objects.filter(student_id__in=chunk).values_list('student_id', flat=True).distinct()
+        )
+        results = latest_results_by_student(with_lessons, lessons_count) if with_lessons else {}
+
+        entries = []
+        for student_id in chunk:
+            if student_id in with_lessons:
+                entries.append(build_entry(results.get(student_id, []), student_id=student_id))
+            else:
+                skipped.append(student_id)
+        JournalEntry.objects.bulk_create(entries)
+        # bulk_create не отправляет post_save - ревизии записей отправляем сами
+        record_objects(JournalEntry, entries, created=True)
+
+        processed += len(chunk)
+        created += len(entries)
+        if progress is not None:
+            progress(processed, created)
+    return {'students': processed, 'created': created, 'skipped': skipped}
+
+
+def build_entry(results, **fields):
+    """
+    Собирает (не сохраняя) запись журнала из строк latest_results().
+    fields - поля, идентифицирующие ученика: student=... или student_id=...
+    """
+    good_results_list = []
+    bad_results_list = []
+    covered_topics = []
+    bad_topics = []
+
+    for result in results:
+        topic_entry = f"{result['topic_name']} {result['difficulty'].lower()} уровня"
+        topic_data = {
+            "topic_id": result['topic_id'],
+            "topic_name": result['topic_name'],
+            "difficulty": result['difficulty'],
+            "percentage": result['percentage']
+        }
+        covered_topics.append(topic_data)
+        if result['percentage'] == 100:
+            good_results_list.append(topic_entry)
+        else:
+            bad_results_list.append(topic_entry)
+            bad_topics.append(topic_entry)
+
+    # Формируем первый блок: Хорошие и плохие результаты
+    if good_results_list and bad_results_list:
+        good_results = (
+            f"У ученика такая оценка, т.к. в ходе обучения он хорошо освоил следующие темы: "
+            f"{', '.join(good_results_list)}. "
+            f"Но при этом ещё плохо понимает следующие темы: {', '.join(bad_results_list)}."
+        )
+    elif good_results_list:
+        good_results = (
+            f"У ученика такая оценка, т.к. в ходе обучения он хорошо освоил следующие темы: "
+            f"{', '.join(good_results_list)}."
+        )
+    elif bad_results_list:
+        good_results = (
+            f"У ученика такая оценка, т.к. в ходе обучения он плохо освоил следующие темы: "
+            f"{', '.join(bad_results_list)}."
+        )
+    else:
+        good_results = "У ученика нет результатов по домашним заданиям."
+
+    # Формируем второй блок: Пройденные темы
+    covered_topics_names = [f"{t['topic_name']} {t['difficulty'].lower()} уровня" for t in covered_topics]
+    covered_topics_text = (
+        f"В ходе занятий были пройдены следующие темы: {', '.join(covered_topics_names)}."
+        if covered_topics_names else "В ходе занятий темы не были пройдены."
+    )
+
+    # Формируем третий блок: Работаем над и рекомендации
+    working_on = (
+        f"Мы продолжаем работать над: {', '.join(bad_topics)}." if bad_topics
+        else "Все темы освоены на 100%."
+    )
+    recommended_lessons = max(1, len(bad_topics))  # Минимум 1 урок, больше при проблемах
+    recommendation_reason = (
+        f"Я советую такой объем занятий, т.к. ученик ещё не освоил {', '.join(bad_topics)}."
+        if bad_topics else "Я советую такой объем занятий для поддержания текущего уровня знаний."
+    )
+
+    return JournalEntry(
+        **fields,
+        good_results=good_results,
+        bad_results=covered_topics_text,  # Храним список всех тем
+        covered_topics=covered_topics_text,
+        working_on=working_on,
+        recommended_lessons=recommended_lessons,
+        recommendation_reason=recommendation_reason
+    )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tutor.export import EXPORTS
+from tutor.renderers import CSVRenderer, NDJSONRenderer
+
+RENDERERS = {'csv': CSVRenderer, 'ndjson': NDJSONRenderer}
+
+
+class Command(BaseCommand):
+    help = 'Stream lessons, homework results or journal entries as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(RENDERERS), default='csv')
+        parser.add_argument('--output', help='File path (stdout by default)')
+        parser.add_argument('--student', help='Filter lessons / journal by student id')
+        parser.add_argument('--homework-lesson', dest='homework__lesson', help='Filter homework results by lesson id')
+        parser.add_argument('--lesson-student', dest='lesson__student', help='Filter homework results by student id')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['resource']]
+        unsupported = [name for name in ('student', 'homework__lesson', 'lesson__student')
+                       if options[name] is not None and name not in export.filters]
+        if unsupported:
+            raise CommandError(f"{options['resource']} cannot be filtered by {', '.join(unsupported)}")
+        try:
+            lookups = export.clean_filters(options)
+        except ValueError as exc:
+            raise CommandError(exc)
+        rows = export.rows(lookups, chunk_size=options['chunk_size'])
+
+        chunks = RENDERERS[options['format']]().stream(rows, export.column_names)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f"✅ Exported {options['resource']} to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
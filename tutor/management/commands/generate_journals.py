@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tutor.journal import generate_entries, select_students
+
+
+class Command(BaseCommand):
+    help = 'Generate journal entries for a teacher, a learning category or a list of students'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teacher', type=int, help='Teacher id')
+        parser.add_argument('--category', type=int, help='Learning category id')
+        parser.add_argument('--students', type=lambda value: [int(v) for v in value.split(',')],
+                            help='Comma-separated student ids')
+        parser.add_argument('--lessons-count', type=int, default=5)
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['teacher'] is None and options['category'] is None and options['students'] is None:
+            raise CommandError('Specify --teacher, --category or --students')
+
+        student_ids = select_students(
+            teacher_id=options['teacher'],
+            category_id=options['category'],
+            student_ids=options['students'],
+        )
+        total = student_ids.count()
+        self.stdout.write(f'📝 Generating journal entries for {total} students...')
+
+        def progress(processed, created):
+            self.stdout.write(f'   {processed}/{total} students processed, {created} entries created')
+
+        summary = generate_entries(
+            student_ids.iterator(chunk_size=options['chunk_size']),
+            lessons_count=options['lessons_count'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+        if summary['skipped']:
+            self.stdout.write(f"ℹ️ Skipped {len(summary['skipped'])} students without lessons")
+        self.stdout.write(self.style.SUCCESS(f"✅ Created {summary['created']} journal entries"))
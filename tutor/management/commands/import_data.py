@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tutor.importer import FORMATS, IMPORTERS, detect_format, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import students, topics or lessons from a CSV, JSON or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Detected from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing them')
+        parser.add_argument('--report', help='Write the per-row error report to this JSON file')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'], default=None)
+        if fmt is None:
+            raise CommandError('Cannot detect the file format, pass --format')
+
+        self.stdout.write(f"📥 Importing {options['resource']} from {options['path']}...")
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as source:
+                rows = read_rows(source, fmt, IMPORTERS[options['resource']].list_fields)
+                report = import_rows(
+                    options['resource'], rows,
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+        for error in report['errors'][:20]:
+            self.stdout.write(self.style.WARNING(f"   row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}"))
+        if report['failed'] > 20:
+            self.stdout.write(f"   ... and {report['failed'] - 20} more")
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        count = report['total'] - report['failed'] if options['dry_run'] else report['created']
+        self.stdout.write(self.style.SUCCESS(f"✅ {verb} {count} of {report['total']} rows, {report['failed']} failed"))
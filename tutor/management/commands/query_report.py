@@ -0,0 +1,101 @@
+import json
+import os
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from tutor.querylog import execute_wrapper, log_files, merge_snapshots, query_log, read_entries
+
+SORTS = {
+    'total': ('total_ms', 'Slowest by total time'),
+    'count': ('count', 'Most frequent'),
+    'max': ('max_ms', 'Slowest single execution'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the top SQL fingerprints from the query log (TUTOR_QUERY_LOG_FILE), or run requests '
+        'in-process with --request and report their queries'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None,
+                            help='Query log path (TUTOR_QUERY_LOG_FILE by default); per-process files '
+                                 'next to it (queries.<pid>.log) are read too')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--sort', choices=sorted(SORTS), action='append',
+                            help='Tables to print (all by default)')
+        parser.add_argument('--request', action='append', default=[], metavar='"METHOD PATH [JSON]"',
+                            help='Run a request against the current database, e.g. '
+                                 '--request \'POST /api/journal/generate/ {"student_id": 1}\'')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['request']:
+            stats, slow = self.run_requests(options['request']), []
+        else:
+            path = options['file'] or settings.TUTOR_QUERY_LOG_FILE
+            if not path:
+                raise CommandError('TUTOR_QUERY_LOG_FILE is empty; pass --file')
+            if not any(os.path.exists(name) for name in log_files(path)):
+                raise CommandError(f'No query log at {path}; the log is written only with TUTOR_QUERY_LOG=1')
+            stats, slow = merge_snapshots(read_entries(path))
+
+        limit = options['limit']
+        report = {
+            name: sorted(stats, key=lambda item: item[SORTS[name][0]], reverse=True)[:limit]
+            for name in options['sort'] or SORTS
+        }
+        report['slow'] = sorted(slow, key=lambda item: item['ms'], reverse=True)[:limit]
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for name, items in report.items():
+            if name == 'slow':
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{SORTS[name][1]}:'))
+            for item in items:
+                self.stdout.write(f"  {item['count']:>7} x  total {item['total_ms']:>10.1f} ms  "
+                                  f"max {item['max_ms']:>8.1f} ms  {item['fingerprint'][:160]}")
+                for location, count in sorted(item['callers'].items(), key=lambda pair: -pair[1])[:3]:
+                    self.stdout.write(f'             {count:>5} sampled at {location}')
+        if report['slow']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Slow queries:'))
+            for entry in report['slow']:
+                self.stdout.write(f"  {entry['ms']:>8.1f} ms  {entry['caller']}  {entry['sql'][:160]}")
+
+    def run_requests(self, requests):
+        """Выполняет запросы тестовым клиентом и возвращает статистику только по ним."""
+        parsed = []
+        for value in requests:
+            parts = value.split(None, 2)
+            if len(parts) not in (2, 3):
+                raise CommandError(f'Expected "METHOD PATH [JSON]", got {value!r}')
+            try:
+                data = json.loads(parts[2]) if len(parts) == 3 else None
+            except ValueError as exc:
+                raise CommandError(f'Invalid JSON body in {value!r}: {exc}')
+            parsed.append((parts[0].lower(), parts[1], data))
+
+        client = Client()
+        query_log.reset()
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=['testserver'], TUTOR_QUERY_STACK_EVERY=1, TUTOR_QUERY_LOG_INTERVAL=float('inf'),
+            ))
+            for connection in connections.all():
+                if execute_wrapper not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(execute_wrapper))
+            for method, path, data in parsed:
+                kwargs = {'data': json.dumps(data), 'content_type': 'application/json'} if data is not None else {}
+                response = getattr(client, method)(path, **kwargs)
+                self.stderr.write(f'{method.upper()} {path} -> {response.status_code}')
+        stats = query_log.top(limit=None)
+        query_log.reset()
+        return stats
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tutor.mastery import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student topic mastery table from homework results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=lambda value: [int(v) for v in value.split(',')],
+                            help='Comma-separated student ids (all students by default)')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        scope = f"{len(options['students'])} students" if options['students'] else 'all students'
+        self.stdout.write(f'🔄 Rebuilding topic mastery for {scope}...')
+
+        def progress(created):
+            self.stdout.write(f'   {created} rows')
+
+        created = rebuild(student_ids=options['students'], chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {created} mastery rows'))
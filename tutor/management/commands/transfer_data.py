@@ -0,0 +1,97 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.utils import load_backend
+
+from tutor.models import (
+    Homework, HomeworkResult, JournalEntry, LearningCategory, LearningGoal, Lesson, LessonType, Student,
+    StudentTopicMastery, Teacher, Topic,
+)
+from tutor.cache import bump_version
+from tutor.utils import chunked, keep_timestamps
+
+SOURCE_ALIAS = 'transfer_source'
+
+# Порядок важен: сначала таблицы, на которые ссылаются внешние ключи
+MODELS = [
+    Teacher,
+    LearningCategory,
+    LearningGoal,
+    LearningGoal.categories.through,
+    Student,
+    LessonType,
+    Topic,
+    Topic.students.through,
+    Lesson,
+    Homework,
+    Homework.topics.through,
+    HomeworkResult,
+    JournalEntry,
+    StudentTopicMastery,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream the tutor tables from an SQLite file into another database (e.g. PostgreSQL) in batches. '
+        'The source must be migrated to the same schema version; the target must be migrated and empty.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', required=True, help='Path to the source SQLite file (opened read-only)')
+        parser.add_argument('--target', default=DEFAULT_DB_ALIAS, help='Target database alias')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"Source database {options['source']} does not exist")
+
+        target = options['target']
+        # Источник подключается только на время команды и не попадает в settings.DATABASES
+        source_settings = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': f"file:{os.path.abspath(options['source'])}?mode=ro",
+            },
+        })[DEFAULT_DB_ALIAS]
+        connections[SOURCE_ALIAS] = load_backend(source_settings['ENGINE']).DatabaseWrapper(source_settings, SOURCE_ALIAS)
+        try:
+            self.check_target_empty(target)
+            with transaction.atomic(using=target), keep_timestamps(*MODELS):
+                for model in MODELS:
+                    self.copy_table(model, target, options['batch_size'])
+                self.reset_sequences(target)
+            # bulk_create не отправляет сигналы, сбрасываем кэш ответов явно
+            bump_version(*MODELS)
+        finally:
+            connections[SOURCE_ALIAS].close()
+            del connections[SOURCE_ALIAS]
+
+        self.stdout.write(self.style.SUCCESS('✅ Transfer completed'))
+
+    def check_target_empty(self, target):
+        for model in MODELS:
+            if model._base_manager.using(target).exists():
+                raise CommandError(f'Target table {model._meta.db_table} is not empty')
+
+    def copy_table(self, model, target, batch_size):
+        total = model._base_manager.using(SOURCE_ALIAS).count()
+        self.stdout.write(f'📦 {model._meta.db_table}: {total} rows')
+        rows = model._base_manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=batch_size)
+        copied = 0
+        for batch in chunked(rows, batch_size):
+            for obj in batch:
+                obj._state.db = target
+            model._base_manager.using(target).bulk_create(batch)
+            copied += len(batch)
+            self.stdout.write(f'   {copied}/{total}')
+
+    def reset_sequences(self, target):
+        connection = connections[target]
+        statements = connection.ops.sequence_reset_sql(no_style(), MODELS)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
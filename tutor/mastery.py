@@ -0,0 +1,342 @@
+"""
+Поддержка таблицы освоения тем (StudentTopicMastery).
+
+Каждая строка - сводка по ключу (ученик, тема, сложность): последний процент,
+число попыток, проценты и среднее последних ROLLING_WINDOW попыток и время
+последней попытки. Изменения HomeworkResult (сигналы для save/delete, явный
+вызов из bulk_create/bulk_update) помечают затронутые ключи, а после
+фиксации транзакции строки обновляются:
+
+- новая попытка, которая позже последней учтенной, дописывается к строке:
+  attempts + 1 и сдвиг окна последних процентов, без чтения результатов;
+- правка, удаление, попытка "задним числом", перенос урока к другому ученику
+  или ДЗ к другому уроку - ключ пересчитывается из исходных результатов
+  (compute). Пересчет идемпотентен, поэтому лишний ключ ничего не портит.
+  Так же пересчитываются строки, созданные до появления recent_percentages.
+
+При каскадном удалении (урок, ученик, ДЗ) post_delete приходит на каждый
+результат: их ДЗ запоминаются в pre_delete, и ученики всех удаляемых
+результатов определяются одним запросом на первом post_delete. Состояние
+относится к одному удалению (origin сигнала): прерванное или откаченное
+удаление не влияет на следующие.
+"""
+import threading
+import weakref
+from collections import defaultdict
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .cache import bump_version
+from .models import Homework, HomeworkResult, Lesson, StudentTopicMastery
+from .utils import chunked
+
+ROLLING_WINDOW = 5
+SUMMARY_FIELDS = ['latest_percentage', 'average_percentage', 'recent_percentages', 'attempts', 'last_attempt_at']
+
+_pending = threading.local()
+_deleting = threading.local()
+
+
+def _pending_keys(using):
+    """Ключи для пересчета из результатов."""
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = defaultdict(set)
+    return _pending.keys[using]
+
+
+def _pending_attempts(using):
+    """Новые попытки по ключам: [(created_at, id, процент)]."""
+    if not hasattr(_pending, 'attempts'):
+        _pending.attempts = defaultdict(lambda: defaultdict(list))
+    return _pending.attempts[using]
+
+
+class _Deletion:
+    """ДЗ результатов, удаляемых одним delete() (origin), и уже найденные по ним ученики."""
+
+    def __init__(self, origin):
+        self.origin = weakref.ref(origin)
+        self.homework = defaultdict(int)
+        self.students = {}
+
+
+def _deletion(using, origin):
+    """Состояние удаления, начатого origin, или None."""
+    deletion = getattr(_deleting, 'by_alias', {}).get(using)
+    return deletion if deletion is not None and deletion.origin() is origin else None
+
+
+def expect_delete(result, origin, using=DEFAULT_DB_ALIAS):
+    """pre_delete: результат будет удален (Collector шлет pre_delete всем объектам до удаления)."""
+    deletion = _deletion(using, origin)
+    if deletion is None:
+        # Новое удаление: остатки прерванного не переносятся
+        if not hasattr(_deleting, 'by_alias'):
+            _deleting.by_alias = {}
+        deletion = _deleting.by_alias[using] = _Deletion(origin)
+    deletion.homework[result.homework_id] += 1
+
+
+def deleted(result, origin, using=DEFAULT_DB_ALIAS):
+    """post_delete: после последнего удаляемого результата состояние удаления забывается."""
+    deletion = _deletion(using, origin)
+    if deletion is None:
+        return
+    if deletion.homework[result.homework_id] > 1:
+        deletion.homework[result.homework_id] -= 1
+    else:
+        deletion.homework.pop(result.homework_id, None)
+    if not deletion.homework:
+        del _deleting.by_alias[using]
+
+
+def _student_ids(homework_ids, results, using, deletion=None):
+    """homework_id -> student_id: из уже загруженных связей или одним запросом."""
+    students = {}
+    homework_field = HomeworkResult._meta.get_field('homework')
+    lesson_field = Homework._meta.get_field('lesson')
+    for result in results:
+        if homework_field.is_cached(result) and lesson_field.is_cached(result.homework):
+            students[result.homework_id] = result.homework.lesson.student_id
+    missing = set(homework_ids) - students.keys()
+    if deletion is not None:
+        students.update((pk, deletion.students[pk]) for pk in missing & deletion.students.keys())
+        missing -= students.keys()
+    if missing:
+        # Заодно ДЗ остальных удаляемых результатов - их post_delete придет следом
+        lookup = missing | (deletion.homework.keys() if deletion is not None else set())
+        found = dict(Homework.objects.using(using).filter(pk__in=lookup).values_list('pk', 'lesson__student_id'))
+        if deletion is not None:
+            deletion.students.update((pk, found[pk]) for pk in deletion.homework.keys() & found.keys())
+        students.update((pk, found[pk]) for pk in missing & found.keys())
+    return students
+
+
+def mark_changed(results, using=DEFAULT_DB_ALIAS, created=False, origin=None):
+    """
+    Помечает ключи освоения для результатов results (включая ключ на момент
+    загрузки из БД) и планирует обновление после фиксации транзакции. created -
+    results только что вставлены: они дописываются к строкам как новые попытки.
+    origin - удаление, в котором пришел post_delete. Ученик определяется сразу:
+    к моменту фиксации ДЗ может быть уже удалено.
+    """
+    keys, attempts = set(), []
+    for result in results:
+        key = (result.homework_id, result.topic_id, result.difficulty)
+        if created and result.pk is not None:
+            attempts.append((key, (result.created_at, result.pk, result.percentage or 0)))
+            continue
+        keys.add(key)
+        loaded = getattr(result, '_loaded_key', None)
+        if loaded is not None and None not in loaded:
+            keys.add(loaded)
+    if not keys and not attempts:
+        return
+    homework_ids = {key[0] for key in keys} | {key[0] for key, _ in attempts}
+    deletion = _deletion(using, origin) if origin is not None else None
+    students = _student_ids(homework_ids, results, using, deletion)
+    pending, pending_attempts = _pending_keys(using), _pending_attempts(using)
+    for homework_id, topic_id, difficulty in keys:
+        student_id = students.get(homework_id)
+        if student_id is not None:
+            pending.add((student_id, topic_id, difficulty))
+    for (homework_id, topic_id, difficulty), attempt in attempts:
+        student_id = students.get(homework_id)
+        if student_id is not None:
+            pending_attempts[(student_id, topic_id, difficulty)].append(attempt)
+    transaction.on_commit(partial(flush, using), using=using)
+
+
+def mark_moved(model, objects, using=DEFAULT_DB_ALIAS):
+    """
+    Уроки, перенесенные к другому ученику, и ДЗ, перенесенные к другому уроку:
+    их результаты переходят к новому ученику, поэтому ключи пересчитываются и
+    для прежнего, и для нового.
+    """
+    if model is Lesson:
+        lookup = 'homework__lesson_id'
+        moved = {
+            lesson.pk: {lesson._loaded_student_id, lesson.student_id} for lesson in objects
+            if getattr(lesson, '_loaded_student_id', None) not in (None, lesson.student_id)
+        }
+        for lesson in objects:
+            lesson._loaded_student_id = lesson.student_id
+    elif model is Homework:
+        lookup = 'homework_id'
+        lessons = {
+            homework.pk: (homework._loaded_lesson_id, homework.lesson_id) for homework in objects
+            if getattr(homework, '_loaded_lesson_id', None) not in (None, homework.lesson_id)
+        }
+        for homework in objects:
+            homework._loaded_lesson_id = homework.lesson_id
+        moved = {}
+        if lessons:
+            students = dict(Lesson.objects.using(using).filter(
+                pk__in={pk for pair in lessons.values() for pk in pair}
+            ).values_list('pk', 'student_id'))
+            moved = {
+                pk: {students.get(old), students.get(new)} - {None} for pk, (old, new) in lessons.items()
+                if students.get(old) != students.get(new)
+            }
+    else:
+        return
+    if not moved:
+        return
+    rows = (
+        HomeworkResult.objects.using(using)
+        .filter(**{f'{lookup}__in': moved})
+        .values_list(lookup, 'topic_id', 'difficulty')
+        .distinct()
+    )
+    pending = _pending_keys(using)
+    for pk, topic_id, difficulty in rows:
+        pending.update((student_id, topic_id, difficulty) for student_id in moved[pk])
+    transaction.on_commit(partial(flush, using), using=using)
+
+
+def flush(using=DEFAULT_DB_ALIAS):
+    """Обновляет накопленные ключи (первый вызов после фиксации забирает все)."""
+    pending, pending_attempts = _pending_keys(using), _pending_attempts(using)
+    keys = set(pending)
+    attempts = {key: value for key, value in pending_attempts.items() if key not in keys}
+    pending.clear()
+    pending_attempts.clear()
+    if attempts:
+        keys |= append(attempts, using=using)
+    if keys:
+        refresh(keys, using=using)
+
+
+def _key_filter(keys):
+    condition = Q()
+    for student_id, topic_id, difficulty in keys:
+        condition |= Q(student_id=student_id, topic_id=topic_id, difficulty=difficulty)
+    return condition
+
+
+def append(attempts, using=DEFAULT_DB_ALIAS, chunk_size=500):
+    """
+    Дописывает новые попытки {ключ: [(created_at, id, процент)]} к строкам
+    освоения: один запрос на чтение строк и один upsert на порцию ключей.
+    Возвращает ключи, которые нужно пересчитать из результатов: без строки,
+    без сохраненных процентов или с попыткой не позже последней учтенной.
+    """
+    recompute = set()
+    for chunk in chunked(attempts, chunk_size):
+        rows = {
+            (row.student_id, row.topic_id, row.difficulty): row
+            for row in StudentTopicMastery.objects.using(using).filter(_key_filter(chunk))
+        }
+        updated = []
+        for key in chunk:
+            new, row = sorted(attempts[key]), rows.get(key)
+            if (row is None or len(row.recent_percentages) != min(row.attempts, ROLLING_WINDOW)
+                    or new[0][0] <= row.last_attempt_at):
+                recompute.add(key)
+                continue
+            row.recent_percentages = [percentage for _, _, percentage in reversed(new)] + row.recent_percentages
+            del row.recent_percentages[ROLLING_WINDOW:]
+            row.average_percentage = sum(row.recent_percentages) / len(row.recent_percentages)
+            row.attempts += len(new)
+            row.last_attempt_at, _, row.latest_percentage = new[-1]
+            updated.append(row)
+        if updated:
+            StudentTopicMastery.objects.using(using).bulk_update(updated, SUMMARY_FIELDS)
+    if len(recompute) < len(attempts):
+        bump_version(StudentTopicMastery)
+    return recompute
+
+
+def compute(keys, using=DEFAULT_DB_ALIAS):
+    """
+    Сводки для ключей (student_id, topic_id, difficulty) одним запросом: оконные
+    функции нумеруют попытки от новых к старым и считают их общее число.
+    """
+    keys = set(keys)
+    partition = [F('homework__lesson__student_id'), F('topic_id'), F('difficulty')]
+    rows = (
+        HomeworkResult.objects.using(using)
+        .filter(
+            homework__lesson__student_id__in={key[0] for key in keys},
+            topic_id__in={key[1] for key in keys},
+        )
+        .annotate(
+            rank=Window(RowNumber(), partition_by=partition, order_by=[F('created_at').desc(), F('id').desc()]),
+            total=Window(Count('id'), partition_by=partition),
+        )
+        .filter(rank__lte=ROLLING_WINDOW)
+        .values('topic_id', 'difficulty', 'percentage', 'created_at', 'rank', 'total',
+                student_id=F('homework__lesson__student_id'))
+    )
+    summaries = {}
+    for row in rows:
+        key = (row['student_id'], row['topic_id'], row['difficulty'])
+        if key not in keys:
+            continue
+        summary = summaries.setdefault(key, {'attempts': row['total'], 'recent': []})
+        summary['recent'].append((row['rank'], row['percentage'] or 0))
+        if row['rank'] == 1:
+            summary['latest_percentage'] = row['percentage'] or 0
+            summary['last_attempt_at'] = row['created_at']
+    for summary in summaries.values():
+        summary['recent'] = [percentage for _, percentage in sorted(summary['recent'])]
+    return {
+        key: StudentTopicMastery(
+            student_id=key[0], topic_id=key[1], difficulty=key[2],
+            latest_percentage=summary['latest_percentage'],
+            average_percentage=sum(summary['recent']) / len(summary['recent']),
+            recent_percentages=summary['recent'],
+            attempts=summary['attempts'],
+            last_attempt_at=summary['last_attempt_at'],
+        )
+        for key, summary in summaries.items()
+    }
+
+
+def refresh(keys, using=DEFAULT_DB_ALIAS, chunk_size=500):
+    """Пересчитывает строки освоения для ключей; ключи без попыток удаляются."""
+    for chunk in chunked(set(keys), chunk_size):
+        rows = compute(chunk, using=using)
+        with transaction.atomic(using=using):
+            StudentTopicMastery.objects.using(using).bulk_create(
+                rows.values(),
+                update_conflicts=True,
+                unique_fields=['student', 'topic', 'difficulty'],
+                update_fields=SUMMARY_FIELDS,
+            )
+            stale = [key for key in chunk if key not in rows]
+            if stale:
+                StudentTopicMastery.objects.using(using).filter(_key_filter(stale)).delete()
+    bump_version(StudentTopicMastery)
+
+
+def rebuild(student_ids=None, using=DEFAULT_DB_ALIAS, chunk_size=500, progress=None):
+    """
+    Полный пересчет таблицы (или только для student_ids): строки удаляются и
+    собираются заново порциями по chunk_size ключей. Возвращает число строк.
+    """
+    results = HomeworkResult.objects.using(using)
+    existing = StudentTopicMastery.objects.using(using)
+    if student_ids is not None:
+        results = results.filter(homework__lesson__student_id__in=student_ids)
+        existing = existing.filter(student_id__in=student_ids)
+    keys = (
+        results
+        .values_list('homework__lesson__student_id', 'topic_id', 'difficulty')
+        .distinct()
+        .order_by('homework__lesson__student_id', 'topic_id', 'difficulty')
+    )
+    created = 0
+    with transaction.atomic(using=using):
+        existing.delete()
+        for chunk in chunked(keys.iterator(chunk_size=chunk_size), chunk_size):
+            rows = compute(chunk, using=using)
+            StudentTopicMastery.objects.using(using).bulk_create(rows.values())
+            created += len(rows)
+            if progress is not None:
+                progress(created)
+    bump_version(StudentTopicMastery)
+    return created
@@ -0,0 +1,240 @@
+"""
+Метрики запросов: время ответа, число и время SQL-запросов, повторы запросов
+и размер ответа по каждому view и action, в формате Prometheus (GET /metrics).
+
+Гистограммы живут в памяти процесса: при нескольких воркерах gunicorn/uvicorn
+каждый отдает свои, суммирует их Prometheus. Запросы к БД считаются без DEBUG
+и без хранения текста запросов дольше одного HTTP-запроса: на каждое новое
+соединение (сигнал connection_created) ставится execute_wrapper, который
+передает запрос регистратору текущего HTTP-запроса из contextvar. Под ASGI
+sync_to_async копирует контекст в поток исполнителя, поэтому запросы
+синхронных view из чужого потока тоже учитываются.
+
+TUTOR_NPLUSONE_THRESHOLD > 0 - предупреждение в лог, если один и тот же SQL
+(с разными параметрами) выполнился за запрос столько раз или больше.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    def __init__(self, name, help, buckets=None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = Histogram(self.buckets)
+        series.observe(value)
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, lines):
+        kind = 'histogram' if self.buckets else 'counter'
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {kind}')
+        for labels, series in sorted(self.series.items()):
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+            if not self.buckets:
+                lines.append(f'{self.name}{{{label_text}}} {series}')
+                continue
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series.sum}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series.count}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.duration = Metric('tutor_request_duration_seconds', 'Wall time of a request.', TIME_BUCKETS)
+            self.queries = Metric('tutor_request_db_queries', 'SQL queries per request.', COUNT_BUCKETS)
+            self.db_time = Metric('tutor_request_db_duration_seconds', 'Time spent in SQL per request.', TIME_BUCKETS)
+            self.duplicates = Metric('tutor_request_duplicate_queries',
+                                     'Repeated identical SQL queries (same SQL and parameters) per request.',
+                                     COUNT_BUCKETS)
+            self.size = Metric('tutor_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+            self.requests = Metric('tutor_requests_total', 'Requests by view, action and status.')
+            self.nplusone = Metric('tutor_nplusone_total', 'Requests where one SQL statement repeated '
+                                                           'TUTOR_NPLUSONE_THRESHOLD times or more.')
+
+    def record(self, view, action, status, recorder, size, nplusone):
+        labels = (('view', view), ('action', action))
+        with self._lock:
+            self.duration.observe(labels, recorder.duration)
+            self.queries.observe(labels, recorder.queries)
+            self.db_time.observe(labels, recorder.db_time)
+            self.duplicates.observe(labels, recorder.duplicates)
+            if size is not None:
+                self.size.observe(labels, size)
+            self.requests.inc(labels + (('status', status),))
+            if nplusone:
+                self.nplusone.inc(labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in (self.duration, self.queries, self.db_time, self.duplicates, self.size,
+                           self.requests, self.nplusone):
+                metric.render(lines)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+_recorder = ContextVar('tutor_query_recorder', default=None)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает счетчик запросов к новому соединению."""
+    if execute_wrapper not in connection.execute_wrappers:
+        # В начало списка: connection.execute_wrapper() снимает свою обертку через pop()
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+class QueryRecorder:
+    """Считает запросы к БД в текущем контексте (и в скопированных из него) до stop()."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.duplicates = 0
+        self.statements = {}
+        self._seen = set()
+        self.started = time.perf_counter()
+        self.duration = None
+        self._token = _recorder.set(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+            key = (sql, repr(params))
+            if key in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(key)
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        _recorder.reset(self._token)
+
+    def most_repeated(self):
+        if not self.statements:
+            return None, 0
+        sql = max(self.statements, key=self.statements.get)
+        return sql, self.statements[sql]
+
+
+def view_labels(request):
+    """(view, action): класс ViewSet'а и действие или маршрут URL."""
+    match = getattr(request, 'resolver_match', None)
+    method = request.method.lower()
+    if match is None:
+        return 'unresolved', method
+    cls = getattr(match.func, 'cls', None)
+    if cls is not None:
+        actions = getattr(match.func, 'actions', None) or {}
+        return cls.__name__, actions.get(method, method)
+    return match.route or match.view_name, method
+
+
+class RequestMetricsMiddleware:
+    """Собирает метрики каждого запроса в registry; работает и под WSGI, и под ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        try:
+            response = self.get_response(request)
+        finally:
+            recorder.stop()
+        self.finish(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        try:
+            response = await self.get_response(request)
+        finally:
+            recorder.stop()
+        self.finish(request, response, recorder)
+        return response
+
+    def finish(self, request, response, recorder):
+        view, action = view_labels(request)
+        threshold = settings.TUTOR_NPLUSONE_THRESHOLD
+        nplusone = False
+        if threshold > 0:
+            sql, repeated = recorder.most_repeated()
+            if repeated >= threshold:
+                nplusone = True
+                logger.warning("Возможный N+1 в %s.%s (%s %s): запрос выполнен %d раз: %.200s",
+                               view, action, request.method, request.path, repeated, sql)
+        size = None if response.streaming else len(response.content)
+        registry.record(view, action, response.status_code, recorder, size, nplusone)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0009_learninggoal_categories'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='homework',
+            index=models.Index(fields=['lesson', '-created_at', '-id'], name='homework_lesson_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='homework',
+            index=models.Index(fields=['-created_at', '-id'], name='homework_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='homeworkresult',
+            index=models.Index(fields=['homework', 'topic', 'difficulty', '-created_at'], name='hwresult_hw_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='homeworkresult',
+            index=models.Index(fields=['-created_at', '-id'], name='hwresult_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['student', '-created_at', '-id'], name='journal_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['-created_at', '-id'], name='journal_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['student', '-date', '-id'], name='lesson_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['-date', '-id'], name='lesson_date_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ROLLING_WINDOW = 5
+
+
+def fill_mastery(apps, schema_editor):
+    # Историческая копия tutor.mastery.rebuild: результаты идут от новых к старым внутри ключа
+    HomeworkResult = apps.get_model('tutor', 'HomeworkResult')
+    StudentTopicMastery = apps.get_model('tutor', 'StudentTopicMastery')
+    db = schema_editor.connection.alias
+    rows = (
+        HomeworkResult.objects.using(db)
+        .order_by('homework__lesson__student_id', 'topic_id', 'difficulty', '-created_at', '-id')
+        .values_list('homework__lesson__student_id', 'topic_id', 'difficulty', 'percentage', 'created_at')
+        .iterator(chunk_size=2000)
+    )
+    batch, current = [], None
+    for student_id, topic_id, difficulty, percentage, created_at in rows:
+        key = (student_id, topic_id, difficulty)
+        if current is None or current.key != key:
+            current = StudentTopicMastery(
+                student_id=student_id, topic_id=topic_id, difficulty=difficulty,
+                latest_percentage=percentage or 0, average_percentage=0, attempts=0, last_attempt_at=created_at,
+            )
+            current.key, current.recent = key, []
+            batch.append(current)
+        current.attempts += 1
+        if len(current.recent) < ROLLING_WINDOW:
+            current.recent.append(percentage or 0)
+            current.average_percentage = sum(current.recent) / len(current.recent)
+        if len(batch) >= 1000:
+            StudentTopicMastery.objects.using(db).bulk_create(batch[:-1])
+            batch = batch[-1:]
+    StudentTopicMastery.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTopicMastery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.CharField(choices=[('EASY', 'Легкий'), ('MEDIUM', 'Средний'), ('HARD', 'Сложный')], max_length=20)),
+                ('latest_percentage', models.FloatField()),
+                ('average_percentage', models.FloatField()),
+                ('attempts', models.IntegerField()),
+                ('last_attempt_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery', to='tutor.student')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mastery', to='tutor.topic')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('student', 'topic', 'difficulty'), name='mastery_student_topic_difficulty')],
+            },
+        ),
+        migrations.RunPython(fill_mastery, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0011_student_topic_mastery'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lesson',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0012_lesson_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studenttopicmastery',
+            name='recent_percentages',
+            field=models.JSONField(default=list),
+        ),
+    ]
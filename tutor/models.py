@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from slugify import slugify
 
 class Teacher(models.Model):
@@ -75,17 +76,72 @@ class Lesson(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     lesson_type = models.ForeignKey(LessonType, on_delete=models.CASCADE)
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE)
-    date = models.DateTimeField(auto_now_add=True)
+    # Не auto_now_add: импорт записывает дату из файла тем же INSERT'ом
+    date = models.DateTimeField(default=timezone.now, editable=False)
     comment = models.TextField(null=True)
 
+    class Meta:
+        indexes = [
+            # Уроки ученика от новых к старым (список, пагинация, журнал)
+            models.Index(fields=['student', '-date', '-id'], name='lesson_student_date_idx'),
+            models.Index(fields=['-date', '-id'], name='lesson_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Комментарий на момент загрузки: новая ревизия в version_control только при его изменении
+        instance._loaded_comment = instance.__dict__.get('comment')
+        # Ученик на момент загрузки: при переносе урока освоение пересчитывается у обоих
+        instance._loaded_student_id = instance.__dict__.get('student_id')
+        return instance
+
 class Homework(models.Model):
     lesson = models.ForeignKey('Lesson', on_delete=models.CASCADE)
     topics = models.ManyToManyField('Topic')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['lesson', '-created_at', '-id'], name='homework_lesson_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='homework_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Урок на момент загрузки: при переносе ДЗ освоение пересчитывается у обоих учеников
+        instance._loaded_lesson_id = instance.__dict__.get('lesson_id')
+        return instance
+
     def __str__(self):
         return f"ДЗ для урока {self.lesson.id}"
 
+class HomeworkResultQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не вызывает save(), поэтому процент считаем здесь
+        objs = list(objs)
+        for obj in objs:
+            obj.percentage = obj.calculate_percentage()
+        created = super().bulk_create(objs, *args, **kwargs)
+        # ...и сигналов тоже нет, поэтому таблицу освоения обновляем явно; при конфликтах
+        # строка могла не вставиться, и попытка пересчитывается, а не дописывается
+        from .mastery import mark_changed
+        conflicts = kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts')
+        mark_changed(objs, using=self.db, created=not conflicts)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if {'correct_count', 'total_count'} & set(fields):
+            for obj in objs:
+                obj.percentage = obj.calculate_percentage()
+            fields = [*fields, 'percentage'] if 'percentage' not in fields else fields
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        from .mastery import mark_changed
+        mark_changed(objs, using=self.db)
+        return updated
+
 class HomeworkResult(models.Model):
     homework = models.ForeignKey(Homework, on_delete=models.CASCADE, related_name='results')
     topic = models.ForeignKey('Topic', on_delete=models.CASCADE)
@@ -94,16 +150,58 @@ class HomeworkResult(models.Model):
     total_count = models.IntegerField(default=0)
     percentage = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True) 
-    def save(self, *args, **kwargs):
+
+    objects = HomeworkResultQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Последний результат по (тема, сложность) внутри ДЗ
+            models.Index(fields=['homework', 'topic', 'difficulty', '-created_at'], name='hwresult_hw_topic_idx'),
+            models.Index(fields=['-created_at', '-id'], name='hwresult_created_idx'),
+        ]
+
+    def calculate_percentage(self):
         if self.total_count > 0:
-            self.percentage = (self.correct_count / self.total_count) * 100
-        else:
-            self.percentage = 0
+            return (self.correct_count / self.total_count) * 100
+        return 0
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ключ освоения на момент загрузки: при смене темы/сложности/ДЗ пересчитывается и старый
+        instance._loaded_key = tuple(instance.__dict__.get(name) for name in ('homework_id', 'topic_id', 'difficulty'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.percentage = self.calculate_percentage()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.topic.name} ({self.difficulty}): {self.percentage}%"
 
+class StudentTopicMastery(models.Model):
+    """
+    Освоение темы учеником на заданной сложности - денормализованная сводка по
+    HomeworkResult, которую поддерживает tutor.mastery. Не редактируется вручную.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='mastery')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='mastery')
+    difficulty = models.CharField(max_length=20, choices=[('EASY', 'Легкий'), ('MEDIUM', 'Средний'), ('HARD', 'Сложный')])
+    latest_percentage = models.FloatField()
+    average_percentage = models.FloatField()  # среднее по последним попыткам (tutor.mastery.ROLLING_WINDOW)
+    # Проценты этих попыток от новых к старым: новая попытка дописывается без чтения результатов
+    recent_percentages = models.JSONField(default=list)
+    attempts = models.IntegerField()
+    last_attempt_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'topic', 'difficulty'], name='mastery_student_topic_difficulty'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} / {self.topic_id} ({self.difficulty}): {self.latest_percentage}%"
+
 class JournalEntry(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -114,5 +212,11 @@ class JournalEntry(models.Model):
     recommended_lessons = models.IntegerField()
     recommendation_reason = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at', '-id'], name='journal_student_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='journal_created_idx'),
+        ]
+
     def __str__(self):
         return f"Запись для {self.student.full_name} от {self.created_at}"
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Keyset-пагинация (по курсору) для всех ресурсов API.
+
+В отличие от CursorPagination из DRF, позиция курсора хранит значения всех
+полей сортировки, поэтому страница выбирается условием
+(date < d) OR (date = d AND id < i) по индексу, без OFFSET и COUNT(*).
+"""
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param
+
+from .querystring import decode_cursor, encode_cursor
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE or 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, position, reverse = self.page_queryset(queryset, request)
+        return self.take_page(list(queryset), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же для асинхронных представлений: строки читаются через async for."""
+        queryset, position, reverse = self.page_queryset(queryset, request)
+        return self.take_page([row async for row in queryset], position, reverse)
+
+    def page_queryset(self, queryset, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(ordering, position))
+        return queryset[:self.page_size + 1], position, reverse
+
+    def take_page(self, rows, position, reverse):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def reversed_ordering(self):
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in self.ordering)
+
+    def position_filter(self, ordering, position):
+        """Условие "строго после позиции" для составного ключа сортировки."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def get_position(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        return encode_cursor(self.base_url, position, reverse, self.cursor_query_param)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            values, reverse = decode_cursor(encoded, len(self.ordering))
+            position = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, reverse
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': force_str('The pagination cursor value.'),
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': force_str('Number of results to return per page.'),
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class LessonPagination(KeysetPagination):
+    ordering = ('-date', '-id')
+
+
+class CreatedAtPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
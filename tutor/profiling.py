@@ -0,0 +1,286 @@
+"""
+Профилирование отдельного запроса по требованию.
+
+Запрос с заголовком X-Tutor-Profile: 1 или параметром ?profile=1 выполняется
+под статистическим профилировщиком: отдельный поток раз в
+TUTOR_PROFILE_INTERVAL_MS снимает стек потока запроса (sys._current_frames()).
+Снятые стеки сохраняются в TUTOR_PROFILE_DIR в формате collapsed stacks
+(<id>.folded, "кадр;кадр;кадр число") - его принимают flamegraph.pl,
+speedscope и inferno. Рядом лежит <id>.json с описанием запроса.
+
+Профилируются только запросы staff-пользователей и только при
+TUTOR_PROFILING=1; одновременно - не больше одного запроса на процесс.
+Пользователь проверяется по сессии, а при заголовке Authorization - после
+аутентификации DRF: сэмплер запускает ProfilingMixin.initial() ViewSet'а, так
+что анонимный запрос с любым Authorization профилировщик не запускает. Id профиля возвращается в заголовке
+X-Tutor-Profile, список - GET /api/profiles/.
+
+Профилировщик работает снаружи DRF dispatch, поэтому в стеках видны и
+сериализаторы, и ORM, и рендеринг ответа. Python переключает потоки не чаще
+sys.getswitchinterval() (5 мс), поэтому интервал меньше этого на загруженном
+процессе на практике не достигается.
+"""
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .metrics import view_labels
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Tutor-Profile'
+# Стек потока, в котором запрос ждет await (для асинхронных view)
+AWAIT = '[await]'
+PROFILE_ID = re.compile(r'^[\w-]+$')
+
+_busy = threading.Lock()
+
+
+@functools.lru_cache(maxsize=4096)
+def label(code):
+    """'tutor/views.py:JournalViewSet.generate' для объекта кода."""
+    filename = code.co_filename
+    root = str(settings.BASE_DIR) + os.sep
+    if 'site-packages' + os.sep in filename:
+        filename = filename.rsplit('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(root):
+        filename = os.path.relpath(filename, root)
+    else:
+        filename = os.path.basename(filename)
+    return f'{filename}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+def collapse(frame, root=None):
+    """Стек от корня к frame через ';'; кадры выше root отбрасываются, None - root нет в стеке."""
+    names = []
+    while frame is not None and frame is not root:
+        names.append(label(frame.f_code))
+        frame = frame.f_back
+    if root is not None and frame is None:
+        return None
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Снимает стек потока thread_id каждые interval секунд до stop()."""
+
+    def __init__(self, thread_id, root, interval):
+        super().__init__(name='tutor-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            # Поток запроса уже ждет в stop()
+            if frame is None or self._done.is_set():
+                continue
+            stack = collapse(frame, self.root)
+            del frame
+            self.stacks[stack or AWAIT] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.root = None
+
+
+def requested(request):
+    return settings.TUTOR_PROFILING and (request.headers.get(HEADER) == '1' or request.GET.get('profile') == '1')
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+def save(request, response, sampler, duration):
+    """Пишет <id>.folded и <id>.json в TUTOR_PROFILE_DIR и возвращает id."""
+    directory = settings.TUTOR_PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    view, action = view_labels(request)
+    meta = {
+        'id': profile_id,
+        'created': time.time(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view,
+        'action': action,
+        'status': response.status_code,
+        'user': request.user.get_username(),
+        'duration_ms': round(duration * 1000, 3),
+        'interval_ms': settings.TUTOR_PROFILE_INTERVAL_MS,
+        'samples': sampler.samples,
+    }
+    with open(os.path.join(directory, f'{profile_id}.folded'), 'w', encoding='utf-8') as file:
+        for stack, count in sampler.stacks.most_common():
+            file.write(f'{stack} {count}\n')
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    prune(directory, settings.TUTOR_PROFILE_KEEP)
+    return profile_id
+
+
+def prune(directory, keep):
+    """Удаляет профили сверх keep самых новых."""
+    for meta in list_profiles(directory)[keep:]:
+        for extension in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(directory, meta['id'] + extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(directory):
+    """Описания профилей, новые первыми."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: (meta['created'], meta['id']), reverse=True)
+
+
+class Profile:
+    """Профиль одного запроса; сэмплер запускается start() (не больше одного на процесс)."""
+
+    def __init__(self, root):
+        self.thread_id = threading.get_ident()
+        self.root = root
+        self.sampler = None
+
+    def start(self, request):
+        if not _busy.acquire(blocking=False):
+            logger.info("Профилирование %s %s пропущено: уже идет другое", request.method, request.path)
+            return False
+        thread_id = threading.get_ident()
+        # Под ASGI синхронный view выполняется в другом потоке - кадра middleware в его стеке нет
+        root = self.root if thread_id == self.thread_id else None
+        self.sampler = Sampler(thread_id, root, settings.TUTOR_PROFILE_INTERVAL_MS / 1000)
+        self.sampler.start()
+        return True
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            _busy.release()
+
+
+class ProfilingMiddleware:
+    """Профилирует запросы с X-Tutor-Profile: 1 / ?profile=1 (см. модуль)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = self.begin(request, is_staff(request), sys._getframe()) if requested(request) else None
+        if profile is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        profile = None
+        if requested(request):
+            profile = self.begin(request, await sync_to_async(is_staff)(request), sys._getframe())
+        if profile is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    def begin(self, request, staff, root):
+        profile = Profile(root)
+        if staff:
+            return profile if profile.start(request) else None
+        if 'HTTP_AUTHORIZATION' in request.META:
+            # Пользователь Basic-аутентификации DRF известен только внутри view - до
+            # этого сэмплер не запускается и _busy не занимается (ProfilingMixin)
+            request.tutor_profile = profile
+            return profile
+        return None
+
+    def finish(self, request, response, profile, duration):
+        if profile.sampler is None:
+            return response
+        try:
+            response[HEADER] = save(request, response, profile.sampler, duration)
+        except OSError:
+            logger.exception("Не удалось сохранить профиль в %s", settings.TUTOR_PROFILE_DIR)
+        return response
+
+
+class ProfilingMixin:
+    """
+    Запускает отложенный профиль запроса с Authorization (ProfilingMiddleware.begin),
+    когда DRF уже аутентифицировал пользователя и проверил права, - если это staff.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        profile = getattr(request._request, 'tutor_profile', None)
+        if profile is not None and profile.sampler is None and request.user.is_staff:
+            profile.start(request)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_list_view(request):
+    profiles = list_profiles(settings.TUTOR_PROFILE_DIR)
+    for meta in profiles:
+        meta['url'] = request.build_absolute_uri(f'/api/profiles/{meta["id"]}/')
+    return Response(profiles)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_detail_view(request, profile_id):
+    """Collapsed stacks профиля (text/plain) - вход для flamegraph.pl / speedscope."""
+    path = os.path.join(settings.TUTOR_PROFILE_DIR, f'{profile_id}.folded')
+    if not PROFILE_ID.match(profile_id) or not os.path.exists(path):
+        raise Http404
+    with open(path, encoding='utf-8') as file:
+        content = file.read()
+    response = HttpResponse(content, content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{profile_id}.folded"'
+    return response
@@ -0,0 +1,275 @@
+"""
+Журнал SQL-запросов: отпечатки (fingerprint), топ медленных и частых запросов
+и места вызова в коде проекта.
+
+Обертка ставится через connection.execute_wrapper() на каждое новое
+соединение (сигнал connection_created) и работает без DEBUG. Журнал
+выключен по умолчанию, включается TUTOR_QUERY_LOG=1. Запрос
+нормализуется в отпечаток: литералы и параметры заменяются на ?, списки IN и
+VALUES сворачиваются, поэтому одинаковые по форме запросы считаются вместе.
+
+Для каждого отпечатка процесс хранит число выполнений, суммарное и
+максимальное время, пример SQL и места вызова. Место вызова - ближайший кадр
+кода проекта и view (tutor/views.py, tutor/async_views.py), который к нему
+привел. Стек снимается только у первого выполнения отпечатка, у каждого
+TUTOR_QUERY_STACK_EVERY-го и у медленных запросов.
+
+В ротируемый файл пишутся JSON-строки двух видов:
+- slow: запросы дольше TUTOR_SLOW_QUERY_MS;
+- snapshot: топ отпечатков процесса, не чаще раза в TUTOR_QUERY_LOG_INTERVAL секунд.
+Каждый процесс пишет в свой файл: для TUTOR_QUERY_LOG_FILE=logs/queries.log
+это logs/queries.<pid>.log - ротация RotatingFileHandler'а в общем файле из
+нескольких воркеров затирала бы чужие записи. Отчет по всем файлам печатает
+manage.py query_report.
+"""
+import functools
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_FINGERPRINTS = 2000
+SAMPLE_SQL_LENGTH = 1000
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Нормализованный SQL: литералы и параметры -> ?, списки (?, ?, ...) -> (...)."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    sql = _ROWS.sub('(...), ...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class FingerprintStats:
+    __slots__ = ('fingerprint', 'sql', 'count', 'total', 'max', 'callers')
+
+    def __init__(self, fingerprint, sql):
+        self.fingerprint = fingerprint
+        self.sql = sql[:SAMPLE_SQL_LENGTH]
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.callers = {}
+
+    def as_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'sql': self.sql,
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'callers': dict(self.callers),
+        }
+
+
+def caller(frame=None):
+    """'tutor/journal.py:40 latest_results <- tutor/views.py:172 generate' для текущего стека."""
+    root = str(settings.BASE_DIR) + os.sep
+    frame = frame or sys._getframe(1)
+    code_frame = view_frame = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename != __file__:
+            if code_frame is None:
+                code_frame = frame
+            if os.path.basename(filename) in ('views.py', 'async_views.py'):
+                view_frame = frame
+                break
+        frame = frame.f_back
+    parts = [
+        f'{os.path.relpath(f.f_code.co_filename, root)}:{f.f_lineno} {f.f_code.co_name}'
+        for f in (code_frame, view_frame) if f is not None
+    ]
+    if len(parts) == 2 and code_frame is view_frame:
+        parts.pop()
+    return ' <- '.join(parts) or 'unknown'
+
+
+class QueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.dropped = 0
+            self.last_flush = time.monotonic()
+
+    def record(self, sql, duration, frame=None):
+        key = fingerprint(sql)
+        slow = duration * 1000 >= settings.TUTOR_SLOW_QUERY_MS
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= MAX_FINGERPRINTS:
+                    self.dropped += 1
+                    return
+                stats = self.stats[key] = FingerprintStats(key, sql)
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            sample = slow or (stats.count - 1) % settings.TUTOR_QUERY_STACK_EVERY == 0
+        if sample:
+            location = caller(frame)
+            with self._lock:
+                stats.callers[location] = stats.callers.get(location, 0) + 1
+            if slow:
+                write({'type': 'slow', 'ts': time.time(), 'pid': os.getpid(), 'ms': round(duration * 1000, 3),
+                       'fingerprint': key, 'sql': sql[:SAMPLE_SQL_LENGTH], 'caller': location})
+        if time.monotonic() - self.last_flush >= settings.TUTOR_QUERY_LOG_INTERVAL:
+            self.flush()
+
+    def top(self, limit=20, key='total'):
+        """Топ отпечатков по key: total, count или max."""
+        with self._lock:
+            stats = sorted(self.stats.values(), key=lambda item: getattr(item, key), reverse=True)[:limit]
+            return [item.as_dict() for item in stats]
+
+    def snapshot(self, limit=None):
+        limit = limit or settings.TUTOR_QUERY_LOG_TOP
+        entries = {}
+        for key in ('total', 'count', 'max'):
+            for item in self.top(limit, key):
+                entries[item['fingerprint']] = item
+        return {'type': 'snapshot', 'ts': time.time(), 'pid': os.getpid(), 'started': self.started,
+                'dropped': self.dropped, 'stats': list(entries.values())}
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        write(self.snapshot())
+
+
+query_log = QueryLog()
+
+_handler = None
+
+
+def process_path(path, pid=None):
+    """Файл журнала процесса: logs/queries.log -> logs/queries.<pid>.log."""
+    root, extension = os.path.splitext(path)
+    return f'{root}.{pid or os.getpid()}{extension}'
+
+
+def _file_logger():
+    """Логгер с RotatingFileHandler на файл процесса (пересоздается при смене пути и после fork)."""
+    global _handler
+    path = process_path(settings.TUTOR_QUERY_LOG_FILE)
+    file_logger = logging.getLogger('tutor.querylog.file')
+    if _handler is None or _handler.baseFilename != os.path.abspath(path):
+        if _handler is not None:
+            file_logger.removeHandler(_handler)
+            _handler.close()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        file_logger.addHandler(_handler)
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+    return file_logger
+
+
+def write(entry):
+    if not settings.TUTOR_QUERY_LOG_FILE:
+        return
+    try:
+        _file_logger().info(json.dumps(entry, ensure_ascii=False))
+    except OSError:
+        logger.exception("Не удалось записать журнал запросов в %s", settings.TUTOR_QUERY_LOG_FILE)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        query_log.record(sql, time.perf_counter() - started, sys._getframe(1))
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает журнал к новому соединению."""
+    if execute_wrapper not in connection.execute_wrappers:
+        # В начало списка: connection.execute_wrapper() снимает свою обертку через pop()
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def log_files(path):
+    """
+    Файлы журнала для TUTOR_QUERY_LOG_FILE path: сам path (если есть) и файлы
+    процессов, каждый с ротированными копиями (.1, .2, ...) от старых к новым.
+    """
+    root, extension = os.path.splitext(path)
+    pattern = glob.escape(root) + '.*' + glob.escape(extension)
+    files = [path] + sorted(
+        name for name in glob.glob(pattern)
+        if name[len(root) + 1:len(name) - len(extension)].isdigit()
+    )
+    paths = []
+    for name in files:
+        index = 1
+        while os.path.exists(f'{name}.{index}'):
+            index += 1
+        paths.extend(f'{name}.{number}' for number in range(index - 1, 0, -1))
+        paths.append(name)
+    return paths
+
+
+def read_entries(path):
+    """JSON-строки всех файлов журнала (log_files), в пределах файла процесса от старых к новым."""
+    for name in log_files(path):
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def merge_snapshots(entries):
+    """
+    Сводка по журналу: последние снимки каждого процесса складываются по
+    отпечаткам; возвращает (stats, slow), slow - отдельные медленные запросы.
+    """
+    latest, slow = {}, []
+    for entry in entries:
+        if entry.get('type') == 'snapshot':
+            latest[(entry['pid'], entry['started'])] = entry
+        elif entry.get('type') == 'slow':
+            slow.append(entry)
+    merged = {}
+    for snapshot in latest.values():
+        for item in snapshot['stats']:
+            current = merged.get(item['fingerprint'])
+            if current is None:
+                merged[item['fingerprint']] = {**item, 'callers': dict(item['callers'])}
+                continue
+            current['count'] += item['count']
+            current['total_ms'] = round(current['total_ms'] + item['total_ms'], 3)
+            current['max_ms'] = max(current['max_ms'], item['max_ms'])
+            for location, count in item['callers'].items():
+                current['callers'][location] = current['callers'].get(location, 0) + count
+    return list(merged.values()), slow
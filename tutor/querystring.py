@@ -0,0 +1,48 @@
+"""
+Разбор параметров запроса, общий для DRF (tutor/serializers.py,
+tutor/pagination.py) и реплики (replica/queries.py): ?fields= / ?expand= и
+курсоры keyset-пагинации. Модуль не зависит от настроек Django, чтобы реплика
+могла импортировать его без django.setup().
+"""
+import base64
+import json
+
+from rest_framework.utils.urls import replace_query_param
+
+ALL = '*'
+
+
+def parse_selection(value):
+    """'id,student.teacher' -> {'id': {}, 'student': {'teacher': {}}}; '*' остается ALL."""
+    if value == ALL:
+        return ALL
+    tree = {}
+    for item in (value or '').split(','):
+        node = tree
+        for part in item.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def encode_cursor(base_url, position, reverse, param='cursor'):
+    """Ссылка на страницу после позиции position (значения полей сортировки)."""
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+    payload = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'))
+    cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+    return replace_query_param(base_url, param, cursor)
+
+
+def decode_cursor(encoded, size):
+    """
+    (значения позиции, reverse) из курсора; значения не приведены к типам полей.
+    Поврежденный курсор или курсор другой сортировки - ValueError.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        values = payload['p']
+    except (TypeError, KeyError, UnicodeError, ValueError) as exc:
+        raise ValueError(encoded) from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(encoded)
+    return values, bool(payload.get('r'))
@@ -0,0 +1,122 @@
+"""
+Построчные форматы выгрузки: CSV и NDJSON, и быстрый JSON для больших списков.
+
+Рендереры выгрузки умеют как обычный render() (для ответов DRF, например
+ошибок), так и stream() - генератор, который кодирует строки порциями и
+отдается в StreamingHttpResponse без накопления всего ответа в памяти.
+"""
+import csv
+import datetime
+import json
+import re
+
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+from .utils import chunked
+
+
+class _Line:
+    """Файлоподобный объект для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def _as_rows(data):
+    if isinstance(data, dict):
+        return [data]
+    return list(data or [])
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    @staticmethod
+    def cell(value):
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, cls=DjangoJSONEncoder)
+        return value
+
+    def stream(self, rows, columns, chunk_size=500):
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns)
+        for chunk in chunked(rows, chunk_size):
+            yield ''.join(writer.writerow([self.cell(row.get(column)) for column in columns]) for row in chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = _as_rows(data)
+        columns = list(rows[0]) if rows else []
+        return ''.join(self.stream(rows, columns)).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def stream(self, rows, columns, chunk_size=500):
+        for chunk in chunked(rows, chunk_size):
+            yield ''.join(
+                json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+                for row in chunk
+            )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = _as_rows(data)
+        columns = list(rows[0]) if rows else []
+        return ''.join(self.stream(rows, columns)).encode(self.charset)
+
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+# Так orjson пишет float вне [1e-4, 1e16): 1e16 и 0.00005 против 1e+16 и 5e-05 у json;
+# совпадение внутри строки только запускает проверку данных
+ORJSON_EXPONENT = re.compile(rb'\de|0\.0000')
+
+
+def has_special_floats(data):
+    """Есть ли в data float, который orjson пишет не так, как json: NaN, Infinity или с экспонентой."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, float) and value and not 1e-4 <= abs(value) < 1e16:
+            return True
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: те же байты для ответов сериализаторов (компактный
+    JSON без экранирования юникода, U+2028/U+2029 экранируются). Даты и прочие
+    нестандартные типы кодируются JSONEncoder'ом DRF; запрос с отступами
+    (Accept: application/json; indent=4, browsable API) рендерится как раньше.
+    orjson пишет NaN/Infinity как null и экспоненту иначе (1e16 вместо 1e+16) -
+    ответ с такими float рендерится JSONRenderer'ом. Данные проверяются только
+    если в выводе orjson есть null или похожая на экспоненту запись.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.default, option=self.options)
+        if (b'null' in ret or ORJSON_EXPONENT.search(ret)) and has_special_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
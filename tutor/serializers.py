@@ -1,19 +1,142 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
 from rest_framework import serializers
+from .cache import bump_version
 from .models import *
+from .querystring import ALL, parse_selection
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при валидации списка берет объекты из словаря,
+    заранее загруженного PreloadingListSerializer, а не делает запрос на каждую строку.
+    """
+    preloaded = None
+
+    def to_internal_value(self, data):
+        if self.preloaded is None or self.pk_field is not None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.preloaded[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class PreloadingListSerializer(serializers.ListSerializer):
+    """
+    Перед валидацией элементов загружает объекты для всех
+    PreloadedPrimaryKeyRelatedField дочернего сериализатора (в том числе
+    many=True) - по одному запросу на таблицу для всего списка.
+    """
+    def preloaded_fields(self):
+        fields = []
+        for field in self.child.fields.values():
+            if field.read_only:
+                continue
+            if isinstance(field, PreloadedPrimaryKeyRelatedField):
+                fields.append((field.field_name, field))
+            elif isinstance(field, serializers.ManyRelatedField) and isinstance(field.child_relation, PreloadedPrimaryKeyRelatedField):
+                fields.append((field.field_name, field.child_relation))
+        return fields
+
+    @staticmethod
+    def collect_pks(data, name):
+        pks = set()
+        for item in data:
+            value = item.get(name) if isinstance(item, dict) else None
+            for pk in value if isinstance(value, list) else [value]:
+                if isinstance(pk, (int, str)) and not isinstance(pk, bool):
+                    try:
+                        pks.add(int(pk))
+                    except ValueError:
+                        pass
+        return pks
+
+    @contextmanager
+    def preload(self, data):
+        """Загружает связанные объекты для строк data на время валидации."""
+        fields = self.preloaded_fields() if isinstance(data, list) else []
+        for name, field in fields:
+            field.preloaded = field.get_queryset().in_bulk(self.collect_pks(data, name))
+        try:
+            yield
+        finally:
+            for _, field in fields:
+                field.preloaded = None
+
+    def to_internal_value(self, data):
+        with self.preload(data):
+            return super().to_internal_value(data)
+
+
+class ExpandableFieldsMixin:
+    """
+    Облегченное представление. Вложенные read-only сериализаторы (связи FK и
+    M2M) по умолчанию отдаются id связанных записей, ?expand=student,student.teacher
+    раскрывает их; ?fields=id,date,student.full_name оставляет только перечисленные
+    поля. Параметры берутся из запроса в context или из аргументов fields= / expand=
+    (expand='*' раскрывает все). План жадной загрузки (tutor.eager) строится по
+    итоговым полям, поэтому нераскрытые связи не подгружаются.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selection = None
+        if fields is not None or expand is not None:
+            self.selection = (parse_selection(fields), parse_selection(expand))
+
+    def get_selection(self):
+        if self.selection is not None:
+            return self.selection
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = getattr(parent, 'parent', None)
+        request = self.context.get('request') if parent is None else None
+        params = getattr(request, 'query_params', {})
+        return parse_selection(params.get('fields')), parse_selection(params.get('expand'))
 
-class TeacherSerializer(serializers.ModelSerializer):
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self.get_selection()
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if only and name not in only:
+                del fields[name]
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, ExpandableFieldsMixin):
+                continue
+            if expand == ALL or name in expand:
+                nested.selection = (only.get(name, {}), ALL if expand == ALL else expand[name])
+            elif field.read_only:
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, source=field.source)
+            else:
+                # Записываемые вложенные списки (результаты ДЗ) - не связь по ключу, отдаются как есть
+                nested.selection = (only.get(name, {}), {})
+        return fields
+
+
+class TeacherSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Teacher
         fields = ['id', 'full_name', 'subject']
 
 
 
-class LearningCategorySerializer(serializers.ModelSerializer):
+class LearningCategorySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LearningCategory
         fields = ['id', 'name', 'slug']
 
-class LearningGoalSerializer(serializers.ModelSerializer):
+class LearningGoalSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     categories = LearningCategorySerializer(many=True, read_only=True)
     category_ids = serializers.PrimaryKeyRelatedField(
         queryset=LearningCategory.objects.all(), many=True, write_only=True, source='categories'
@@ -23,14 +146,14 @@ class LearningGoalSerializer(serializers.ModelSerializer):
         model = LearningGoal
         fields = ['id', 'name', 'categories', 'category_ids']
 
-class StudentSerializer(serializers.ModelSerializer):
-    learning_goal_id = serializers.PrimaryKeyRelatedField(
+class StudentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    learning_goal_id = PreloadedPrimaryKeyRelatedField(
         queryset=LearningGoal.objects.all(), source='learning_goal', write_only=True
     )
-    learning_category_id = serializers.PrimaryKeyRelatedField(
+    learning_category_id = PreloadedPrimaryKeyRelatedField(
         queryset=LearningCategory.objects.all(), source='learning_category', write_only=True
     )
-    teacher_id = serializers.PrimaryKeyRelatedField(
+    teacher_id = PreloadedPrimaryKeyRelatedField(
         queryset=Teacher.objects.all(), source='teacher', write_only=True
     )
     learning_goal = LearningGoalSerializer(read_only=True)
@@ -46,59 +169,128 @@ class StudentSerializer(serializers.ModelSerializer):
             'learning_category', 'learning_category_id',
             'teacher', 'teacher_id'
         ]
+        list_serializer_class = PreloadingListSerializer
 
-class LessonTypeSerializer(serializers.ModelSerializer):
+class LessonTypeSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LessonType
         fields = ['id', 'name']
 
-class TopicSerializer(serializers.ModelSerializer):
-    students = serializers.PrimaryKeyRelatedField(
+class TopicSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    students = PreloadedPrimaryKeyRelatedField(
         queryset=Student.objects.all(), many=True, required=False
     )
 
     class Meta:
         model = Topic
         fields = ['id', 'name', 'students']
+        list_serializer_class = PreloadingListSerializer
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     lesson_type = LessonTypeSerializer(read_only=True)
     topic = TopicSerializer(read_only=True)
     
-    student_id = serializers.PrimaryKeyRelatedField(
+    student_id = PreloadedPrimaryKeyRelatedField(
         queryset=Student.objects.all(), source='student', write_only=True
     )
-    lesson_type_id = serializers.PrimaryKeyRelatedField(
+    lesson_type_id = PreloadedPrimaryKeyRelatedField(
         queryset=LessonType.objects.all(), source='lesson_type', write_only=True
     )
-    topic_id = serializers.PrimaryKeyRelatedField(
+    topic_id = PreloadedPrimaryKeyRelatedField(
         queryset=Topic.objects.all(), source='topic', write_only=True
     )
 
     class Meta:
         model = Lesson
         fields = ['id', 'student', 'student_id', 'lesson_type', 'lesson_type_id', 'topic', 'topic_id', 'date', 'comment']
+        list_serializer_class = PreloadingListSerializer
         
-class HomeworkResultSerializer(serializers.ModelSerializer):
-    topic_id = serializers.PrimaryKeyRelatedField(queryset=Topic.objects.all(), source='topic')
+class HomeworkResultSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    topic_id = PreloadedPrimaryKeyRelatedField(queryset=Topic.objects.all(), source='topic')
 
     class Meta:
         model = HomeworkResult
         fields = ['id', 'topic_id', 'difficulty', 'correct_count', 'total_count', 'percentage','created_at']
+        read_only_fields = ['percentage']
+        list_serializer_class = PreloadingListSerializer
 
-class HomeworkSerializer(serializers.ModelSerializer):
+class HomeworkResultBatchSerializer(HomeworkResultSerializer):
+    """Результаты вне вложенного ДЗ (пакетные операции): ДЗ указывается явно."""
+    homework_id = PreloadedPrimaryKeyRelatedField(queryset=Homework.objects.all(), source='homework')
+
+    class Meta(HomeworkResultSerializer.Meta):
+        fields = ['id', 'homework_id', 'topic_id', 'difficulty', 'correct_count', 'total_count', 'percentage', 'created_at']
+
+class HomeworkSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     lesson_id = serializers.PrimaryKeyRelatedField(queryset=Lesson.objects.all(), source='lesson')
     topic_ids = serializers.PrimaryKeyRelatedField(queryset=Topic.objects.all(), many=True, source='topics')
-    results = HomeworkResultSerializer(many=True, read_only=True)
+    results = HomeworkResultSerializer(many=True, required=False)
 
     class Meta:
         model = Homework
         fields = ['id', 'lesson_id', 'topic_ids', 'created_at', 'results']
-        
 
+    def create(self, validated_data):
+        results = validated_data.pop('results', [])
+        # ДЗ, его темы и все результаты пишутся одной транзакцией, результаты - одним INSERT
+        with transaction.atomic():
+            homework = super().create(validated_data)
+            HomeworkResult.objects.bulk_create(
+                HomeworkResult(homework=homework, **result) for result in results
+            )
+            if results:
+                # bulk_create не отправляет post_save, версию результатов поднимаем сами
+                transaction.on_commit(partial(bump_version, HomeworkResult))
+        return homework
 
-class JournalEntrySerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        results = validated_data.pop('results', None)
+        with transaction.atomic():
+            homework = super().update(instance, validated_data)
+            if results is not None:
+                self.update_results(homework, results)
+        return homework
+
+    def update_results(self, homework, results):
+        """
+        Результаты сопоставляются с текущими по (тема, сложность) и обновляются на
+        месте - id и created_at сохраняются. Лишние удаляются, новые вставляются
+        одним INSERT, измененные пишутся одним UPDATE.
+        """
+        existing = defaultdict(list)
+        for result in homework.results.order_by('created_at', 'id'):
+            existing[(result.topic_id, result.difficulty)].append(result)
+        created, changed, fields = [], [], set()
+        for data in results:
+            topic = data.get('topic')
+            matches = existing.get((topic.pk if topic else None, data.get('difficulty')))
+            if not matches:
+                created.append(HomeworkResult(homework=homework, **data))
+                continue
+            result = matches.pop(0)
+            values = {
+                name: value for name, value in data.items()
+                if name not in ('topic', 'difficulty') and getattr(result, name) != value
+            }
+            if values:
+                for name, value in values.items():
+                    setattr(result, name, value)
+                changed.append(result)
+                fields.update(values)
+        stale = [result.pk for matches in existing.values() for result in matches]
+        if stale:
+            HomeworkResult.objects.filter(pk__in=stale).delete()
+        if changed:
+            HomeworkResult.objects.bulk_update(changed, sorted(fields))
+        if created:
+            HomeworkResult.objects.bulk_create(created)
+        if changed or created:
+            transaction.on_commit(partial(bump_version, HomeworkResult))
+
+
+
+class JournalEntrySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     student_id = serializers.PrimaryKeyRelatedField(
         queryset=Student.objects.all(), source='student', write_only=True
@@ -106,4 +298,72 @@ class JournalEntrySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = JournalEntry
-        fields = ['id', 'student', 'student_id', 'created_at', 'good_results', 'bad_results', 'covered_topics', 'working_on', 'recommended_lessons', 'recommendation_reason']
\ No newline at end of file
+        fields = ['id', 'student', 'student_id', 'created_at', 'good_results', 'bad_results', 'covered_topics', 'working_on', 'recommended_lessons', 'recommendation_reason']
+
+
+class StudentTopicMasterySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    topic_name = serializers.CharField(source='topic.name', read_only=True)
+
+    class Meta:
+        model = StudentTopicMastery
+        fields = ['student_id', 'topic_id', 'topic_name', 'difficulty', 'latest_percentage',
+                  'average_percentage', 'attempts', 'last_attempt_at']
+
+
+class JournalBatchSerializer(serializers.Serializer):
+    teacher_id = serializers.IntegerField(required=False)
+    category_id = serializers.IntegerField(required=False)
+    student_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    lessons_count = serializers.IntegerField(default=5, min_value=1)
+    chunk_size = serializers.IntegerField(default=200, min_value=1, max_value=1000)
+
+    def validate(self, attrs):
+        if not {'teacher_id', 'category_id', 'student_ids'} & attrs.keys():
+            raise serializers.ValidationError("Укажите teacher_id, category_id или student_ids")
+        return attrs
+
+class StudentImportSerializer(serializers.Serializer):
+    full_name = serializers.CharField(max_length=100)
+    grade = serializers.IntegerField(default=1)
+    learning_goal_id = PreloadedPrimaryKeyRelatedField(queryset=LearningGoal.objects.all(), source='learning_goal')
+    learning_category_id = PreloadedPrimaryKeyRelatedField(queryset=LearningCategory.objects.all(), source='learning_category')
+    teacher_id = PreloadedPrimaryKeyRelatedField(queryset=Teacher.objects.all(), source='teacher')
+
+    class Meta:
+        list_serializer_class = PreloadingListSerializer
+
+
+class TopicImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    student_ids = PreloadedPrimaryKeyRelatedField(
+        queryset=Student.objects.all(), source='students', many=True, required=False
+    )
+
+    class Meta:
+        list_serializer_class = PreloadingListSerializer
+
+
+class LessonImportSerializer(serializers.Serializer):
+    student_id = PreloadedPrimaryKeyRelatedField(queryset=Student.objects.all(), source='student')
+    lesson_type_id = PreloadedPrimaryKeyRelatedField(queryset=LessonType.objects.all(), source='lesson_type')
+    topic_id = PreloadedPrimaryKeyRelatedField(queryset=Topic.objects.all(), source='topic')
+    date = serializers.DateTimeField(required=False)
+    comment = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    class Meta:
+        list_serializer_class = PreloadingListSerializer
+
+
+class AnalyticsFilterSerializer(serializers.Serializer):
+    teacher_id = serializers.IntegerField(required=False)
+    category_id = serializers.IntegerField(required=False)
+    student_id = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=100)
+    min_attempts = serializers.IntegerField(default=1, min_value=1)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from должна быть не позже date_to")
+        return attrs
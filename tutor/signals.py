@@ -0,0 +1,63 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .mastery import deleted, expect_delete, mark_changed, mark_moved
+from .models import Homework, HomeworkResult, JournalEntry, Lesson
+from .versioning import record_objects
+
+
+def is_tutor_model(model):
+    return model._meta.app_label == 'tutor'
+
+
+def bump_on_commit(using, *models):
+    # До фиксации параллельный GET прочитал бы старые данные и закэшировал их под новой версией
+    transaction.on_commit(partial(bump_version, *models), using=using)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, using, **kwargs):
+    if is_tutor_model(sender):
+        bump_on_commit(using, sender)
+
+
+@receiver(m2m_changed)
+def bump_m2m_versions(sender, instance, action, model, using, **kwargs):
+    # Меняется состав связи: обновляем обе стороны, т.к. связь видна из обеих моделей
+    if action in ('post_add', 'post_remove', 'post_clear') and is_tutor_model(sender):
+        bump_on_commit(using, type(instance), model)
+
+
+@receiver(post_save, sender=HomeworkResult)
+def mark_mastery_changed(sender, instance, created, using, **kwargs):
+    mark_changed([instance], using=using, created=created)
+    instance._loaded_key = (instance.homework_id, instance.topic_id, instance.difficulty)
+
+
+@receiver(pre_delete, sender=HomeworkResult)
+def expect_mastery_delete(sender, instance, using, origin, **kwargs):
+    expect_delete(instance, origin, using=using)
+
+
+@receiver(post_delete, sender=HomeworkResult)
+def mark_mastery_deleted(sender, instance, using, origin, **kwargs):
+    mark_changed([instance], using=using, origin=origin)
+    deleted(instance, origin, using=using)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Homework)
+def mark_mastery_moved(sender, instance, created, using, **kwargs):
+    if not created:
+        mark_moved(sender, [instance], using=using)
+
+
+@receiver(post_save, sender=JournalEntry)
+@receiver(post_save, sender=Lesson)
+def record_revision(sender, instance, created, using, **kwargs):
+    record_objects(sender, [instance], created, using)
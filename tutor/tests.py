@@ -1,8 +1,31 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest import skipUnless
+import re
+import json
+import os
+import tempfile
 from django.contrib.auth.models import User
 import datetime
 from .models import *
 from django.urls import reverse
+from django.http import HttpResponse
+from django.core.management import call_command, CommandError
+from io import StringIO
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.utils import load_backend
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.utils import timezone
+from .utils import keep_timestamps
+from .cache import bump_version, model_version
+from rest_framework.test import APIClient
+from asgiref.sync import sync_to_async
+
+# Общий для процессов кэш (как file/redis): без него условные GET отключены
+shared_cache = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'tutor-tests-cache'),
+}})
 
 class TeacherModelTests(TestCase):
     def test_teacher_creation(self):
@@ -244,3 +267,2038 @@ class JournalEntryModelTests(TestCase):
         self.assertEqual(entry.recommended_lessons, 3)
         self.assertEqual(entry.recommendation_reason, "Для закрепления материала")
         self.assertTrue(entry.created_at)
+
+
+class EagerLoadingQueryCountTests(TestCase):
+    """
+    Число запросов на списочных эндпоинтах не должно зависеть от количества строк.
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.counter = 0
+
+    def create_rows(self, count):
+        for _ in range(count):
+            self.counter += 1
+            teacher = Teacher.objects.create(full_name=f"Учитель {self.counter}", subject="Математика")
+            category = LearningCategory.objects.create(name=f"Категория {self.counter}")
+            goal = LearningGoal.objects.create(name=f"Цель {self.counter}")
+            goal.categories.add(category)
+            student = Student.objects.create(
+                full_name=f"Ученик {self.counter}",
+                grade=5,
+                learning_goal=goal,
+                learning_category=category,
+                teacher=teacher
+            )
+            topic = Topic.objects.create(name=f"Тема {self.counter}")
+            topic.students.add(student)
+            lesson = Lesson.objects.create(student=student, lesson_type=self.lesson_type, topic=topic)
+            homework = Homework.objects.create(lesson=lesson)
+            homework.topics.add(topic)
+            HomeworkResult.objects.create(homework=homework, topic=topic, difficulty="EASY", correct_count=1, total_count=2)
+            JournalEntry.objects.create(
+                student=student,
+                good_results="",
+                bad_results="",
+                working_on="",
+                recommended_lessons=1,
+                recommendation_reason=""
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_constant_queries(self, url_name, query=''):
+        url = reverse(url_name) + query
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_rows(2)
+        small = self.count_queries(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_rows(8)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url}: {small} запросов для 2 строк, {large} для 10")
+
+    def test_lessons_list(self):
+        self.assert_constant_queries('lesson-list')
+
+    def test_expanded_lists(self):
+        self.assert_constant_queries('lesson-list', '?expand=*')
+        self.assert_constant_queries('student-list', '?expand=learning_goal.categories,teacher')
+        self.assert_constant_queries('journalentry-list', '?expand=student.learning_goal&fields=id,student')
+
+    def test_students_list(self):
+        self.assert_constant_queries('student-list')
+
+    def test_journal_list(self):
+        self.assert_constant_queries('journalentry-list')
+
+    def test_homework_list(self):
+        self.assert_constant_queries('homework-list')
+
+    def test_learning_goals_list(self):
+        self.assert_constant_queries('learninggoal-list')
+
+    def test_topics_list(self):
+        self.assert_constant_queries('topic-list')
+
+    def test_lesson_plan_derived_from_serializer(self):
+        """
+        План для раскрытого LessonSerializer подтягивает всю цепочку ученика одним
+        JOIN'ом; в облегченном виде связи не загружаются вовсе.
+        """
+        from .eager import plan_for
+        from .serializers import LessonSerializer
+        plan = plan_for(LessonSerializer, expand='*')
+        self.assertIn('student__teacher', plan.select_related)
+        self.assertIn('student__learning_goal__categories', plan.prefetch_related)
+        plan = plan_for(LessonSerializer)
+        self.assertEqual((plan.select_related, plan.prefetch_related), ((), ()))
+        plan = plan_for(LessonSerializer, expand='student.teacher')
+        self.assertEqual((plan.select_related, plan.prefetch_related), (('student', 'student__teacher'), ()))
+
+
+class LeanRepresentationTests(TestCase):
+    """?fields= и ?expand=: связи по умолчанию отдаются id и не загружаются."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        goal.categories.add(category)
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        for i in range(20):
+            student = Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                             learning_category=category, teacher=teacher)
+            topic = Topic.objects.create(name=f"Тема {i}")
+            topic.students.add(student)
+            Lesson.objects.create(student=student, lesson_type=lesson_type, topic=topic, comment="Урок")
+        self.lesson = Lesson.objects.order_by('id').first()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx)
+
+    def test_relations_are_ids_by_default(self):
+        data = self.client.get(f'/api/lessons/{self.lesson.id}/').data
+        self.assertEqual(data['student'], self.lesson.student_id)
+        self.assertEqual(data['topic'], self.lesson.topic_id)
+        data = self.client.get(f'/api/learning-goals/{self.lesson.student.learning_goal_id}/').data
+        self.assertEqual(data['categories'], [self.lesson.student.learning_category_id])
+
+    def test_expand_nested(self):
+        data = self.client.get(f'/api/lessons/{self.lesson.id}/?expand=student.learning_goal,topic').data
+        self.assertEqual(data['topic']['name'], "Тема 0")
+        self.assertEqual(data['student']['full_name'], "Ученик 0")
+        self.assertEqual(data['student']['learning_goal']['categories'], [self.lesson.student.learning_category_id])
+        self.assertEqual(data['student']['teacher'], self.lesson.student.teacher_id)
+        self.assertIsInstance(data['lesson_type'], int)
+
+    def test_fields_selection(self):
+        data = self.client.get('/api/lessons/?fields=id,student.full_name&expand=student').data['results']
+        self.assertEqual(data[0], {'id': data[0]['id'], 'student': {'full_name': data[0]['student']['full_name']}})
+        data = self.client.get(f'/api/lessons/{self.lesson.id}/?fields=date,unknown').data
+        self.assertEqual(list(data), ['date'])
+
+    def test_lean_list_is_smaller_and_cheaper(self):
+        lean, lean_queries = self.get('/api/lessons/')
+        full, full_queries = self.get('/api/lessons/?expand=*')
+        self.assertLess(len(lean.content) * 3, len(full.content))
+        self.assertLess(lean_queries, full_queries)
+        # M2M категорий цели запрашиваются, только если цель раскрыта
+        _, lean_queries = self.get('/api/students/')
+        _, full_queries = self.get('/api/students/?expand=learning_goal')
+        self.assertLess(lean_queries, full_queries)
+
+    def test_writes_accept_ids(self):
+        response = self.client.post('/api/lessons/', {
+            'student_id': self.lesson.student_id, 'lesson_type_id': self.lesson.lesson_type_id,
+            'topic_id': self.lesson.topic_id, 'comment': 'Новый',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['student'], self.lesson.student_id)
+
+
+class ValuesListTests(TestCase):
+    """Быстрый list через values_list() и ORJSONRenderer отдает те же байты, что сериализаторы."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        topic = Topic.objects.create(name="Дроби")
+        self.student = Student.objects.create(full_name="Петров \u2028 Петр", grade=9, learning_goal=goal,
+                                              learning_category=category, teacher=teacher)
+        base = timezone.make_aware(datetime.datetime(2025, 3, 3, 10))
+        with keep_timestamps(Lesson, HomeworkResult):
+            for i in range(7):
+                date = base + datetime.timedelta(hours=i // 2, microseconds=i * 7)
+                lesson = Lesson.objects.create(student=self.student, lesson_type=lesson_type, topic=topic,
+                                               date=date, comment=None if i % 3 else f"Урок \"{i}\"")
+                homework = Homework.objects.create(lesson=lesson)
+                HomeworkResult.objects.create(homework=homework, topic=topic, difficulty="MEDIUM",
+                                              correct_count=i, total_count=3 if i else 0, created_at=date)
+        JournalEntry.objects.create(student=self.student, good_results="-", bad_results="-", working_on="-",
+                                    covered_topics={"Дроби": {"EASY": 33.333333333333336}},
+                                    recommended_lessons=2, recommendation_reason="-")
+
+    def assert_same_bytes(self, url):
+        from unittest import mock
+        from rest_framework.renderers import JSONRenderer
+        from .fastpath import ValuesListMixin
+        fast = self.client.get(url)
+        with mock.patch.object(ValuesListMixin, 'get_values_mapper', return_value=None):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, JSONRenderer().render(slow.data))
+        return json.loads(fast.content)
+
+    def test_output_matches_serializers(self):
+        lesson = Lesson.objects.order_by('id').first()
+        for url in (
+            '/api/lessons/', f'/api/lessons/?student={self.student.id}', '/api/lessons/?expand=student,topic',
+            '/api/lessons/?fields=id,student.full_name,date&expand=student', '/api/lessons/?expand=*',
+            '/api/homework-results/', f'/api/homework-results/?homework__lesson={lesson.id}',
+            f'/api/homework-results/?homework__lesson__student={self.student.id}',
+            '/api/journal/', '/api/journal/?expand=student.teacher',
+        ):
+            with self.subTest(url=url):
+                self.assert_same_bytes(url)
+
+    def test_output_matches_in_local_timezone(self):
+        with timezone.override('Europe/Moscow'):
+            data = self.assert_same_bytes('/api/homework-results/')
+        self.assertTrue(data['results'][0]['created_at'].endswith('+03:00'))
+
+    def test_cursor_pages(self):
+        url, pages = '/api/lessons/?page_size=2&fields=comment', []
+        while url:
+            page = self.assert_same_bytes(url)
+            pages.append(page)
+            url = page['next']
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(self.assert_same_bytes(pages[-1]['previous'])['results'], pages[-2]['results'])
+
+    def test_models_are_not_instantiated(self):
+        from unittest import mock
+        with mock.patch.object(Lesson, 'from_db', side_effect=AssertionError("Lesson.from_db")):
+            self.assertEqual(len(self.client.get('/api/lessons/?expand=student').data['results']), 7)
+
+    def test_mapper_selection(self):
+        from .fastpath import mapper_for
+        from .serializers import HomeworkSerializer, LessonSerializer
+        self.assertEqual(mapper_for(LessonSerializer).lookups, ['id', 'student', 'lesson_type', 'topic', 'date', 'comment'])
+        self.assertIn('student__teacher__full_name', mapper_for(LessonSerializer, expand='student.teacher').lookups)
+        # M2M и вложенные списки - обычным путем
+        self.assertIsNone(mapper_for(LessonSerializer, expand='topic'))
+        self.assertIsNone(mapper_for(HomeworkSerializer))
+
+    def test_renderer_matches_json_renderer(self):
+        from decimal import Decimal
+        from rest_framework.exceptions import ErrorDetail
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        data = {
+            'text': 'Дроби \u2028 \u2029 "кавычки"', 'none': None, 'float': 66.66666666666667, 'int': 10 ** 12,
+            'when': timezone.make_aware(datetime.datetime(2025, 3, 3, 10, 0, 0, 5)), 'day': datetime.date(2025, 3, 3),
+            'decimal': Decimal('1.50'), 'error': [ErrorDetail('Ошибка', code='invalid')], 'nested': {'1': [True, False]},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = 'application/json; indent=2'
+        self.assertEqual(ORJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+    def test_renderer_matches_json_renderer_for_special_floats(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        data = {'big': 1e16, 'small': 5e-5, 'tiny': -1.5e-300, 'zero': 0.0, 'plain': 0.0001, 'text': '1e16 0.00001'}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render({'text': 'v2e 0.00001', 'none': None}),
+                         JSONRenderer().render({'text': 'v2e 0.00001', 'none': None}))
+        # Строгий JSON DRF не пропускает NaN и Infinity - и orjson не подменяет их на null
+        for value in (float('nan'), float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                ORJSONRenderer().render({'percentage': value})
+
+
+class RequestMetricsTests(TestCase):
+    """Middleware метрик: гистограммы по view/action в /metrics и предупреждение об N+1."""
+
+    def setUp(self):
+        from .metrics import registry
+        registry.reset()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.students = [
+            Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                   learning_category=category, teacher=teacher)
+            for i in range(5)
+        ]
+
+    def metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def sample(self, text, name):
+        match = re.search(r'^%s (\S+)$' % re.escape(name), text, re.M)
+        self.assertIsNotNone(match, name)
+        return float(match.group(1))
+
+    def test_histograms_per_view_and_action(self):
+        self.client.get('/api/students/')
+        self.client.get('/api/students/')
+        self.client.get(f'/api/students/{self.students[0].id}/')
+        self.client.get('/api/no-such-endpoint/')
+        text = self.metrics()
+        labels = '{view="StudentViewSet",action="list"}'
+        self.assertEqual(self.sample(text, f'tutor_request_duration_seconds_count{labels}'), 2)
+        self.assertGreater(self.sample(text, f'tutor_request_db_queries_sum{labels}'), 0)
+        self.assertGreater(self.sample(text, f'tutor_response_size_bytes_sum{labels}'), 0)
+        self.assertEqual(self.sample(text, 'tutor_request_duration_seconds_count{view="StudentViewSet",action="retrieve"}'), 1)
+        self.assertEqual(self.sample(text, 'tutor_requests_total{view="StudentViewSet",action="list",status="200"}'), 2)
+        self.assertEqual(self.sample(text, 'tutor_requests_total{view="unresolved",action="get",status="404"}'), 1)
+        self.assertIn('tutor_request_duration_seconds_bucket{view="StudentViewSet",action="list",le="+Inf"} 2', text)
+
+    async def test_asgi_counts_queries_of_sync_view(self):
+        # Синхронный view под ASGI выполняется в потоке sync_to_async, а не в потоке middleware
+        response = await self.async_client.get('/api/students/')
+        self.assertEqual(response.status_code, 200)
+        text = await sync_to_async(self.metrics)()
+        self.assertGreater(self.sample(text, 'tutor_request_db_queries_sum{view="StudentViewSet",action="list"}'), 0)
+
+    def test_duplicates_and_nplusone_warning(self):
+        from django.test import RequestFactory
+        from .metrics import RequestMetricsMiddleware, registry
+
+        def view(request):
+            for student in Student.objects.all():
+                Teacher.objects.get(pk=student.teacher_id)
+            return HttpResponse(b'ok')
+
+        middleware = RequestMetricsMiddleware(view)
+        with override_settings(TUTOR_NPLUSONE_THRESHOLD=5), self.assertLogs('tutor.metrics', 'WARNING') as logs:
+            middleware(RequestFactory().get('/n-plus-one/'))
+        self.assertIn('выполнен 5 раз', logs.output[0])
+        text = registry.render()
+        labels = '{view="unresolved",action="get"}'
+        # 5 запросов учителя с одинаковым pk: 4 повтора
+        self.assertEqual(self.sample(text, f'tutor_request_duplicate_queries_sum{labels}'), 4)
+        self.assertEqual(self.sample(text, f'tutor_request_db_queries_sum{labels}'), 6)
+        self.assertEqual(self.sample(text, f'tutor_nplusone_total{labels}'), 1)
+
+
+class QueryLogTests(TestCase):
+    """Отпечатки SQL, места вызова и отчет manage.py query_report."""
+
+    def setUp(self):
+        from .querylog import execute_wrapper, install, query_log
+        query_log.reset()
+        # Журнал выключен по умолчанию (TUTOR_QUERY_LOG) - подключаем его к соединению теста сами
+        if execute_wrapper not in connection.execute_wrappers:
+            install(None, connection)
+            self.addCleanup(connection.execute_wrappers.remove, execute_wrapper)
+        self.client = APIClient()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.student = Student.objects.create(full_name="Петров", grade=9, learning_goal=goal,
+                                              learning_category=category, teacher=teacher)
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        topic = Topic.objects.create(name="Дроби")
+        lesson = Lesson.objects.create(student=self.student, lesson_type=lesson_type, topic=topic)
+        homework = Homework.objects.create(lesson=lesson)
+        HomeworkResult.objects.create(homework=homework, topic=topic, difficulty="EASY", correct_count=5, total_count=10)
+
+    def test_fingerprint(self):
+        from .querylog import fingerprint
+        self.assertEqual(
+            fingerprint('SELECT "t"."id" FROM "t" WHERE "t"."id" IN (%s, %s, %s) AND "t"."name" = \'a\'\'b\' LIMIT 21'),
+            'SELECT "t"."id" FROM "t" WHERE "t"."id" IN (...) AND "t"."name" = ? LIMIT ?',
+        )
+        self.assertEqual(fingerprint('INSERT INTO "t2" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+                         'INSERT INTO "t2" ("a", "b") VALUES (...), ...')
+
+    def test_stats_point_to_the_view(self):
+        from .querylog import query_log
+        for _ in range(3):
+            self.client.get(f'/api/students/{self.student.id}/')
+        top = {item['fingerprint']: item for item in query_log.top(limit=None, key='count')}
+        student = next(item for fp, item in top.items() if fp.startswith('SELECT "tutor_student"."id"'))
+        self.assertGreaterEqual(student['count'], 3)
+        self.assertTrue(any('tutor/' in location for location in student['callers']), student['callers'])
+
+    def test_report_from_rotating_file(self):
+        from .querylog import query_log
+        path = os.path.join(self.tmp.name, 'logs', 'queries.log')
+        with override_settings(TUTOR_QUERY_LOG_FILE=path, TUTOR_SLOW_QUERY_MS=0):
+            self.client.post('/api/journal/generate/', {'student_id': self.student.id}, format='json')
+            query_log.flush()
+            out = StringIO()
+            call_command('query_report', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertTrue(report['total'])
+        callers = [entry['caller'] for entry in report['slow']]
+        self.assertTrue(any('tutor/views.py' in caller and 'generate' in caller for caller in callers), callers)
+
+    def test_report_merges_process_files(self):
+        from .querylog import log_files, process_path
+        path = os.path.join(self.tmp.name, 'queries.log')
+
+        def snapshot(pid, count):
+            return json.dumps({'type': 'snapshot', 'pid': pid, 'started': 1, 'dropped': 0, 'stats': [{
+                'fingerprint': 'SELECT ?', 'sql': 'SELECT 1', 'count': count, 'total_ms': 1.0, 'max_ms': 1.0,
+                'callers': {},
+            }]}) + '\n'
+
+        for name, content in ((process_path(path, 101) + '.1', snapshot(101, 1)),
+                              (process_path(path, 101), snapshot(101, 5)),
+                              (process_path(path, 202), snapshot(202, 7))):
+            with open(name, 'w', encoding='utf-8') as file:
+                file.write(content)
+        self.assertEqual([os.path.basename(name) for name in log_files(path)],
+                         ['queries.log', 'queries.101.log.1', 'queries.101.log', 'queries.202.log'])
+        out = StringIO()
+        call_command('query_report', '--json', '--file', path, stdout=out)
+        # Последний снимок каждого процесса: 5 + 7
+        self.assertEqual(json.loads(out.getvalue())['count'][0]['count'], 12)
+
+    def test_report_for_requests(self):
+        out = StringIO()
+        call_command('query_report', '--request', f'POST /api/journal/generate/ {{"student_id": {self.student.id}}}',
+                     '--request', 'GET /api/lessons/?expand=*', '--sort', 'count', stdout=out, stderr=StringIO())
+        text = out.getvalue()
+        self.assertIn('Most frequent:', text)
+        self.assertIn('tutor_homeworkresult', text)
+        self.assertRegex(text, r'sampled at tutor/\S+:\d+ \w+ <- tutor/views.py:\d+ generate')
+
+
+class ProfilingTests(TestCase):
+    """Профилирование запроса по X-Tutor-Profile и эндпоинт /api/profiles/."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.settings_override = override_settings(
+            TUTOR_PROFILING=True, TUTOR_PROFILE_DIR=self.tmp.name,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.admin = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.user = User.objects.create_user('user', password='secret')
+        Teacher.objects.create(full_name="Иванова", subject="Математика")
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/lessons/', HTTP_X_TUTOR_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Tutor-Profile']
+        with open(os.path.join(self.tmp.name, f'{profile_id}.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        self.assertEqual((meta['view'], meta['action'], meta['status'], meta['user']),
+                         ('LessonViewSet', 'list', 200, 'admin'))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, f'{profile_id}.folded')))
+
+        response = self.client.get('/api/profiles/')
+        self.assertEqual([item['id'] for item in response.json()], [profile_id])
+        response = self.client.get(f'/api/profiles/{profile_id}/')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(self.client.get('/api/profiles/missing/').status_code, 404)
+
+    def test_basic_auth_request_is_profiled(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Basic YWRtaW46c2VjcmV0')  # admin:secret
+        response = self.client.get('/api/teachers/?profile=1')
+        self.assertIn('X-Tutor-Profile', response)
+
+    def test_non_staff_authorization_does_not_start_sampler(self):
+        from unittest import mock
+        from .profiling import _busy
+        for credentials in ('Basic dXNlcjpzZWNyZXQ=', 'Bearer garbage'):  # user:secret
+            self.client.credentials(HTTP_AUTHORIZATION=credentials)
+            with self.subTest(credentials=credentials), mock.patch('tutor.profiling.Sampler') as sampler:
+                response = self.client.get('/api/teachers/?profile=1')
+                self.assertNotIn('X-Tutor-Profile', response)
+                sampler.assert_not_called()
+        self.assertTrue(_busy.acquire(blocking=False))
+        _busy.release()
+
+    def test_only_staff_and_only_when_enabled(self):
+        self.client.get('/api/teachers/', HTTP_X_TUTOR_PROFILE='1')
+        self.client.force_login(self.user)
+        response = self.client.get('/api/teachers/', HTTP_X_TUTOR_PROFILE='1')
+        self.assertNotIn('X-Tutor-Profile', response)
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+        self.client.force_login(self.admin)
+        with override_settings(TUTOR_PROFILING=False):
+            response = self.client.get('/api/teachers/', HTTP_X_TUTOR_PROFILE='1')
+        self.assertNotIn('X-Tutor-Profile', response)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_sampler_collapses_stacks_below_root(self):
+        import sys
+        import threading
+        import time
+        from .profiling import Sampler
+
+        def busy():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = Sampler(threading.get_ident(), sys._getframe(), 0.001)
+        sampler.start()
+        busy()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertEqual(list(sampler.stacks),
+                         ['tutor/tests.py:ProfilingTests.test_sampler_collapses_stacks_below_root.<locals>.busy'])
+
+    @override_settings(ROOT_URLCONF='tutor.tests')
+    async def test_async_view_is_profiled(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/api/lessons/', headers={'X-Tutor-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, f"{response['X-Tutor-Profile']}.folded")))
+
+    def test_keeps_latest_profiles(self):
+        self.client.force_login(self.admin)
+        with override_settings(TUTOR_PROFILE_KEEP=2):
+            ids = [self.client.get('/api/teachers/?profile=1')['X-Tutor-Profile'] for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         sorted(f'{profile_id}{ext}' for profile_id in ids[1:] for ext in ('.json', '.folded')))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванов Иван Иванович", subject="Математика")
+        category = LearningCategory.objects.create(name="Математика")
+        goal = LearningGoal.objects.create(name="Изучить алгебру")
+        self.student = Student.objects.create(
+            full_name="Петров Петр Петрович",
+            grade=5,
+            learning_goal=goal,
+            learning_category=category,
+            teacher=teacher
+        )
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        topic = Topic.objects.create(name="Квадратные уравнения")
+        self.lessons = [
+            Lesson.objects.create(student=self.student, lesson_type=lesson_type, topic=topic)
+            for _ in range(7)
+        ]
+        # Несколько уроков с одинаковой датой: порядок должен держаться на id
+        same_date = self.lessons[0].date
+        Lesson.objects.filter(id__in=[l.id for l in self.lessons[:4]]).update(date=same_date)
+
+    def expected_order(self):
+        return list(Lesson.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        url = reverse('lesson-list') + '?page_size=3'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+
+        ids = [row['id'] for page in pages for row in page['results']]
+        self.assertEqual(ids, self.expected_order())
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([row['id'] for row in response.data['results']],
+                         [row['id'] for row in pages[1]['results']])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('lesson-list') + '?page_size=100000')
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('lesson-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_journal_ordered_by_created_at(self):
+        for _ in range(3):
+            JournalEntry.objects.create(
+                student=self.student,
+                good_results="",
+                bad_results="",
+                working_on="",
+                recommended_lessons=1,
+                recommendation_reason=""
+            )
+        response = self.client.get(reverse('journalentry-list') + f'?student={self.student.id}&page_size=2')
+        expected = list(JournalEntry.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in response.data['results']], expected[:2])
+        self.assertIsNotNone(response.data['next'])
+
+
+class JournalGenerateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванов Иван Иванович", subject="Математика")
+        category = LearningCategory.objects.create(name="Математика")
+        goal = LearningGoal.objects.create(name="Изучить алгебру")
+        self.student = Student.objects.create(
+            full_name="Петров Петр Петрович",
+            grade=5,
+            learning_goal=goal,
+            learning_category=category,
+            teacher=teacher
+        )
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.equations = Topic.objects.create(name="Уравнения")
+        self.fractions = Topic.objects.create(name="Дроби")
+
+    def add_lesson(self, results):
+        lesson = Lesson.objects.create(student=self.student, lesson_type=self.lesson_type, topic=self.equations)
+        homework = Homework.objects.create(lesson=lesson)
+        for topic, difficulty, correct in results:
+            HomeworkResult.objects.create(
+                homework=homework, topic=topic, difficulty=difficulty, correct_count=correct, total_count=10
+            )
+        return lesson
+
+    def generate(self, **data):
+        return self.client.post(reverse('journalentry-generate'), {'student_id': self.student.id, **data}, format='json')
+
+    def test_latest_result_per_topic_and_difficulty(self):
+        self.add_lesson([(self.equations, "EASY", 5), (self.fractions, "HARD", 10)])
+        self.add_lesson([(self.equations, "EASY", 10)])
+
+        response = self.generate()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data['good_results'],
+            "У ученика такая оценка, т.к. в ходе обучения он хорошо освоил следующие темы: "
+            "Уравнения easy уровня, Дроби hard уровня."
+        )
+        self.assertEqual(response.data['working_on'], "Все темы освоены на 100%.")
+        self.assertEqual(response.data['recommended_lessons'], 1)
+
+    def test_only_last_lessons_are_used(self):
+        self.add_lesson([(self.fractions, "MEDIUM", 3)])
+        self.add_lesson([(self.equations, "EASY", 4)])
+
+        response = self.generate(lessons_count=1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['working_on'], "Мы продолжаем работать над: Уравнения easy уровня.")
+
+    def test_no_lessons(self):
+        response = self.generate()
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_student(self):
+        response = self.client.post(reverse('journalentry-generate'), {'student_id': 0}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_does_not_depend_on_results(self):
+        self.add_lesson([(self.equations, "EASY", 5)])
+        with CaptureQueriesContext(connection) as small:
+            self.generate()
+        for _ in range(4):
+            self.add_lesson([(self.equations, "EASY", 5), (self.fractions, "HARD", 7), (self.fractions, "EASY", 2)])
+        with CaptureQueriesContext(connection) as large:
+            self.generate()
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class JournalBatchGenerateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.teacher = Teacher.objects.create(full_name="Иванов Иван Иванович", subject="Математика")
+        self.category = LearningCategory.objects.create(name="Математика")
+        self.goal = LearningGoal.objects.create(name="Изучить алгебру")
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Уравнения")
+
+    def add_student(self, correct_counts):
+        student = Student.objects.create(
+            full_name="Ученик",
+            grade=5,
+            learning_goal=self.goal,
+            learning_category=self.category,
+            teacher=self.teacher
+        )
+        for correct in correct_counts:
+            lesson = Lesson.objects.create(student=student, lesson_type=self.lesson_type, topic=self.topic)
+            homework = Homework.objects.create(lesson=lesson)
+            HomeworkResult.objects.create(
+                homework=homework, topic=self.topic, difficulty="EASY", correct_count=correct, total_count=10
+            )
+        return student
+
+    def test_matches_single_generate(self):
+        students = [self.add_student([3, 10]), self.add_student([10, 4])]
+        without_lessons = self.add_student([])
+
+        response = self.client.post(
+            reverse('journalentry-generate-batch'), {'teacher_id': self.teacher.id, 'lessons_count': 1}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'students': 3, 'created': 2, 'skipped': [without_lessons.id]})
+
+        for student in students:
+            batch_entry = JournalEntry.objects.get(student=student)
+            single = self.client.post(
+                reverse('journalentry-generate'), {'student_id': student.id, 'lessons_count': 1}, format='json'
+            )
+            self.assertEqual(batch_entry.good_results, single.data['good_results'])
+            self.assertEqual(batch_entry.working_on, single.data['working_on'])
+            self.assertEqual(batch_entry.recommended_lessons, single.data['recommended_lessons'])
+
+    def test_queries_are_fixed_per_chunk(self):
+        self.add_student([5])
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(reverse('journalentry-generate-batch'), {'category_id': self.category.id}, format='json')
+        for _ in range(5):
+            self.add_student([5, 7, 10])
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(reverse('journalentry-generate-batch'), {'category_id': self.category.id}, format='json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_requires_selector(self):
+        response = self.client.post(reverse('journalentry-generate-batch'), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_management_command(self):
+        student = self.add_student([5])
+        out = StringIO()
+        call_command('generate_journals', f'--students={student.id}', '--chunk-size=1', stdout=out)
+        self.assertEqual(JournalEntry.objects.filter(student=student).count(), 1)
+        self.assertIn('1/1 students processed', out.getvalue())
+
+
+class HomeworkBulkCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванов Иван Иванович", subject="Математика")
+        category = LearningCategory.objects.create(name="Математика")
+        goal = LearningGoal.objects.create(name="Изучить алгебру")
+        student = Student.objects.create(
+            full_name="Петров Петр Петрович",
+            grade=5,
+            learning_goal=goal,
+            learning_category=category,
+            teacher=teacher
+        )
+        self.topics = [Topic.objects.create(name=f"Тема {i}") for i in range(5)]
+        self.lesson = Lesson.objects.create(
+            student=student, lesson_type=LessonType.objects.create(name="Индивидуальный"), topic=self.topics[0]
+        )
+
+    def payload(self, results_count):
+        return {
+            'lesson_id': self.lesson.id,
+            'topic_ids': [topic.id for topic in self.topics],
+            'results': [
+                {
+                    'topic_id': self.topics[i % 5].id,
+                    'difficulty': "MEDIUM",
+                    'correct_count': i % 10,
+                    'total_count': 10,
+                }
+                for i in range(results_count)
+            ],
+        }
+
+    def post(self, data):
+        return self.client.post(reverse('homework-list'), data, format='json')
+
+    def test_results_created_with_percentage(self):
+        response = self.post(self.payload(50))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['results']), 50)
+        homework = Homework.objects.get(id=response.data['id'])
+        self.assertEqual(homework.results.count(), 50)
+        self.assertEqual(set(homework.results.filter(correct_count=8).values_list('percentage', flat=True)), {80.0})
+
+    def test_query_count_does_not_depend_on_results(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.payload(2))
+        with CaptureQueriesContext(connection) as large:
+            self.post(self.payload(60))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_invalid_result_rejects_whole_homework(self):
+        data = self.payload(3)
+        data['results'][1]['topic_id'] = 0
+        response = self.post(data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('topic_id', response.data['results'][1])
+        self.assertFalse(Homework.objects.exists())
+        self.assertFalse(HomeworkResult.objects.exists())
+
+    def test_bulk_create_computes_percentage(self):
+        homework = Homework.objects.create(lesson=self.lesson)
+        HomeworkResult.objects.bulk_create([
+            HomeworkResult(homework=homework, topic=self.topics[0], difficulty="EASY", correct_count=3, total_count=4),
+            HomeworkResult(homework=homework, topic=self.topics[1], difficulty="EASY", correct_count=0, total_count=0),
+        ])
+        self.assertEqual(sorted(homework.results.values_list('percentage', flat=True)), [0.0, 75.0])
+
+    def test_update_keeps_matching_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            homework_id = self.post(self.payload(3)).data['id']
+        self.assertTrue(StudentTopicMastery.objects.filter(topic=self.topics[2]).exists())
+        before = {r.topic_id: r for r in HomeworkResult.objects.filter(homework_id=homework_id)}
+        data = self.payload(2)
+        data['results'][0]['correct_count'] = 7
+        data['results'].append({'topic_id': self.topics[4].id, 'difficulty': "HARD",
+                                'correct_count': 1, 'total_count': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('homework-detail', args=[homework_id]), data, format='json')
+        self.assertEqual(response.status_code, 200)
+        after = {r.topic_id: r for r in HomeworkResult.objects.filter(homework_id=homework_id)}
+        self.assertEqual(set(after), {self.topics[0].id, self.topics[1].id, self.topics[4].id})
+        for topic in self.topics[:2]:
+            self.assertEqual(after[topic.id].pk, before[topic.id].pk)
+            self.assertEqual(after[topic.id].created_at, before[topic.id].created_at)
+        self.assertEqual(after[self.topics[0].id].percentage, 70.0)
+        self.assertEqual(after[self.topics[4].id].percentage, 50.0)
+        self.assertEqual(StudentTopicMastery.objects.get(topic=self.topics[0], difficulty="MEDIUM").latest_percentage, 70.0)
+        self.assertFalse(StudentTopicMastery.objects.filter(topic=self.topics[2]).exists())
+
+
+def query_plan(queryset):
+    """Строки EXPLAIN QUERY PLAN (SQLite) для queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN есть только в SQLite")
+class QueryPlanTests(TestCase):
+    """
+    Горячие запросы ORM должны идти по индексам. Тест падает, если план
+    откатился к полному сканированию таблицы (SCAN без USING INDEX) или,
+    для пагинируемых списков, к сортировке во временном B-дереве.
+    """
+    FULL_SCAN = re.compile(r'^SCAN (tutor_\w+|U\d+)$')
+
+    def hot_queries(self):
+        from .journal import latest_results, recent_lesson_ids
+        page = 101
+        return {
+            'lessons by student': (Lesson.objects.filter(student_id=1).order_by('-date', '-id')[:page], True),
+            'lessons page': (Lesson.objects.order_by('-date', '-id')[:page], True),
+            'results by homework': (HomeworkResult.objects.filter(homework_id=1), False),
+            'results by lesson': (HomeworkResult.objects.filter(homework__lesson_id=1), False),
+            'results page': (HomeworkResult.objects.order_by('-created_at', '-id')[:page], True),
+            'homework by student': (Homework.objects.filter(lesson__student_id=1), False),
+            'homework by lesson': (Homework.objects.filter(lesson_id=1).order_by('-created_at', '-id')[:page], True),
+            'homework page': (Homework.objects.order_by('-created_at', '-id')[:page], True),
+            'journal by student': (JournalEntry.objects.filter(student_id=1).order_by('-created_at', '-id')[:page], True),
+            'journal page': (JournalEntry.objects.order_by('-created_at', '-id')[:page], True),
+            'students by category': (Student.objects.filter(learning_category_id=1).order_by('id')[:page], True),
+            'latest results': (latest_results(1, 5), False),
+            'recent lessons by student': (recent_lesson_ids([1, 2], 5), False),
+        }
+
+    def test_no_full_table_scans(self):
+        for name, (queryset, index_ordered) in self.hot_queries().items():
+            with self.subTest(name):
+                plan = query_plan(queryset)
+                scans = [line for line in plan if self.FULL_SCAN.match(line)]
+                self.assertEqual(scans, [], f"{name}: {plan}")
+                if index_ordered:
+                    self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan, f"{name}: {plan}")
+
+
+class SQLiteOptionsTests(TestCase):
+    def test_env_overrides(self):
+        from app.db import sqlite_options
+        options = sqlite_options({'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '2000'})
+        self.assertIn('PRAGMA synchronous=FULL;', options['init_command'])
+        self.assertIn('PRAGMA journal_mode=WAL;', options['init_command'])
+        self.assertEqual(options['timeout'], 2.0)
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+
+    def test_tuning_can_be_disabled(self):
+        from app.db import sqlite_options
+        self.assertEqual(sqlite_options({'SQLITE_TUNING': '0'}), {})
+
+    @skipUnless(connection.vendor == 'sqlite', "PRAGMA есть только в SQLite")
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class TransferDataCommandTests(TestCase):
+    """
+    Перенос из SQLite-файла в базу default. Источник создается отдельным
+    соединением, поэтому целевой базой может быть и PostgreSQL
+    (DB_ENGINE=postgres python manage.py test tutor).
+    """
+    def setUp(self):
+        fd, self.source = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        source_settings = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.source},
+        })[DEFAULT_DB_ALIAS]
+        connections['source'] = load_backend(source_settings['ENGINE']).DatabaseWrapper(source_settings, 'source')
+        with connections['source'].schema_editor() as editor:
+            for model in (Teacher, LearningCategory, LearningGoal, Student, LessonType, Topic,
+                          Lesson, Homework, HomeworkResult, JournalEntry, StudentTopicMastery):
+                editor.create_model(model)
+
+        objects = lambda model: model.objects.using('source')
+        teacher = objects(Teacher).create(full_name="Иванов Иван Иванович", subject="Математика")
+        category = objects(LearningCategory).create(name="Математика")
+        goal = objects(LearningGoal).create(name="Изучить алгебру")
+        goal.categories.add(category)
+        student = objects(Student).create(
+            full_name="Петров Петр Петрович",
+            grade=5,
+            learning_goal=goal,
+            learning_category=category,
+            teacher=teacher
+        )
+        topic = objects(Topic).create(name="Квадратные уравнения")
+        topic.students.add(student)
+        lesson_type = objects(LessonType).create(name="Индивидуальный")
+        for _ in range(3):
+            lesson = objects(Lesson).create(student=student, lesson_type=lesson_type, topic=topic)
+            homework = objects(Homework).create(lesson=lesson)
+            homework.topics.add(topic)
+            objects(HomeworkResult).create(
+                homework=homework, topic=topic, difficulty="HARD", correct_count=1, total_count=4
+            )
+        objects(JournalEntry).create(
+            student=student,
+            good_results="Хорошо",
+            bad_results="Плохо",
+            covered_topics={"Квадратные уравнения": "25%"},
+            working_on="Уравнения",
+            recommended_lessons=2,
+            recommendation_reason="Закрепление"
+        )
+        self.expected = self.snapshot('source')
+        self.last_lesson = lesson
+
+    def tearDown(self):
+        connections['source'].close()
+        del connections['source']
+        os.remove(self.source)
+
+    def snapshot(self, using='default'):
+        objects = lambda model: model._base_manager.using(using).order_by('pk')
+        return {
+            'lessons': list(objects(Lesson).values('id', 'student_id', 'date', 'comment')),
+            'results': list(objects(HomeworkResult).values('id', 'percentage', 'created_at')),
+            'journal': list(objects(JournalEntry).values('id', 'covered_topics', 'created_at')),
+            'goal_categories': list(objects(LearningGoal.categories.through).values_list('learninggoal_id', 'learningcategory_id')),
+            'topic_students': list(objects(Topic.students.through).values_list('topic_id', 'student_id')),
+            'homework_topics': list(objects(Homework.topics.through).values_list('homework_id', 'topic_id')),
+            'mastery': list(objects(StudentTopicMastery).values('student_id', 'topic_id', 'attempts', 'last_attempt_at')),
+        }
+
+    def test_copies_all_tables(self):
+        out = StringIO()
+        call_command('transfer_data', f'--source={self.source}', '--batch-size=2', stdout=out)
+        self.assertEqual(self.snapshot(), self.expected)
+        self.assertIn('Transfer completed', out.getvalue())
+
+        # Последовательности сдвинуты: новые строки не конфликтуют с перенесенными
+        lesson = Lesson.objects.create(
+            student_id=self.last_lesson.student_id,
+            lesson_type_id=self.last_lesson.lesson_type_id,
+            topic_id=self.last_lesson.topic_id,
+        )
+        self.assertGreater(lesson.id, self.last_lesson.id)
+
+    def test_refuses_non_empty_target(self):
+        Teacher.objects.create(full_name="Уже есть", subject="Физика")
+        with self.assertRaises(CommandError):
+            call_command('transfer_data', f'--source={self.source}', stdout=StringIO())
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_by_default(self):
+        from app.db import database_config
+        config = database_config('/tmp/db.sqlite3', {})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], '/tmp/db.sqlite3')
+
+    def test_postgres_from_url(self):
+        from app.db import database_config
+        config = database_config('/tmp/db.sqlite3', {'DATABASE_URL': 'postgres://tutor:s%40cret@db:6543/tutor_prod'})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            (config['NAME'], config['USER'], config['PASSWORD'], config['HOST'], config['PORT']),
+            ('tutor_prod', 'tutor', 's@cret', 'db', '6543'),
+        )
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_pooled_mode_disables_persistent_connections(self):
+        from app.db import database_config
+        config = database_config('/tmp/db.sqlite3', {'DB_ENGINE': 'postgres', 'POSTGRES_POOL': '1'})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 10)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        from .cache import stats
+        cache.clear()
+        stats.reset()
+        self.client = APIClient()
+        self.category = LearningCategory.objects.create(name="ОГЭ")
+        self.goal = LearningGoal.objects.create(name="Сдать экзамен")
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx)
+
+    def test_second_request_is_served_from_cache(self):
+        first, _ = self.get('/api/teachers/')
+        second, queries = self.get('/api/teachers/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(first.data, second.data)
+
+    def test_save_invalidates_list_and_detail(self):
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        self.get(f'/api/teachers/{teacher.id}/')
+        self.get('/api/teachers/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/teachers/{teacher.id}/', {'subject': 'Физика'}, format='json')
+        detail, _ = self.get(f'/api/teachers/{teacher.id}/')
+        listing, _ = self.get('/api/teachers/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['subject'], 'Физика')
+        self.assertEqual(listing.data['results'][0]['subject'], 'Физика')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher.delete()
+        listing, _ = self.get('/api/teachers/')
+        self.assertEqual(listing.data['results'], [])
+
+    def test_version_changes_only_on_commit(self):
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        with self.captureOnCommitCallbacks() as callbacks:
+            before = model_version(Teacher)
+            teacher.subject = "Физика"
+            teacher.save()
+            # До фиксации параллельный запрос не должен кэшировать старые данные под новой версией
+            self.assertEqual(model_version(Teacher), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(model_version(Teacher), before)
+
+    def test_query_params_are_part_of_key(self):
+        other = LearningCategory.objects.create(name="ЕГЭ")
+        self.goal.categories.add(self.category)
+        by_category, _ = self.get('/api/learning-goals/', category=self.category.id)
+        by_other, _ = self.get('/api/learning-goals/', category=other.id)
+        self.assertEqual(by_other['X-Cache'], 'MISS')
+        self.assertEqual(len(by_category.data['results']), 1)
+        self.assertEqual(by_other.data['results'], [])
+
+        by_slug, _ = self.get('/api/learning-categories/', slug=other.slug)
+        self.assertEqual([c['id'] for c in by_slug.data['results']], [other.id])
+
+    def test_m2m_change_invalidates(self):
+        empty, _ = self.get('/api/learning-goals/', category=self.category.id)
+        self.assertEqual(empty.data['results'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.goal.categories.add(self.category)
+        filled, _ = self.get('/api/learning-goals/', category=self.category.id)
+        self.assertEqual(filled['X-Cache'], 'MISS')
+        self.assertEqual(len(filled.data['results']), 1)
+
+    def test_stats_endpoint(self):
+        self.get('/api/lesson-types/')
+        self.get('/api/lesson-types/')
+        self.get('/api/topics/')
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get('/api/cache-stats/')
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 2)
+        self.assertEqual(response.data['resources']['lessontype'], {'hits': 1, 'misses': 1})
+
+
+@shared_cache
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.student = Student.objects.create(
+            full_name="Петров", grade=9, learning_goal=goal, learning_category=category, teacher=teacher
+        )
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+        self.lesson = Lesson.objects.create(student=self.student, lesson_type=self.lesson_type, topic=self.topic)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_returns_304(self):
+        url = f'/api/lessons/?student={self.student.id}'
+        with CaptureQueriesContext(connection) as full:
+            first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        # Проверка фильтра ?student= и один агрегат, без выборки и сериализации
+        self.assertEqual(len(ctx), 2)
+        self.assertLess(len(ctx), len(full))
+
+        modified_since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(modified_since.status_code, 304)
+
+    def test_new_row_changes_etag(self):
+        url = '/api/journal/'
+        first = self.client.get(url)
+        JournalEntry.objects.bulk_create([JournalEntry(
+            student=self.student, good_results="", bad_results="", working_on="",
+            recommended_lessons=1, recommendation_reason=""
+        )])
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.data['results']), 1)
+
+    def test_update_of_nested_model_changes_etag(self):
+        url = f'/api/lessons/{self.lesson.id}/?expand=topic'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.name = "Проценты"
+            self.topic.save()
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['topic']['name'], "Проценты")
+
+    def test_filters_have_separate_validators(self):
+        other = Student.objects.create(
+            full_name="Сидоров", grade=9, learning_goal=self.student.learning_goal,
+            learning_category=self.student.learning_category, teacher=self.student.teacher
+        )
+        first = self.client.get(f'/api/lessons/?student={self.student.id}')
+        second = self.client.get(f'/api/lessons/?student={other.id}')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_cached_reference_data_revalidates_without_queries(self):
+        first = self.client.get('/api/teachers/')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.revalidate('/api/teachers/', first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(len(ctx), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_disables_validators(self):
+        # Версии в locmem не знают о записях другого воркера, агрегат - об UPDATE:
+        # 304 мог бы вернуть старые данные
+        url = f'/api/lessons/{self.lesson.id}/'
+        first = self.client.get(url)
+        self.assertNotIn('ETag', first)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(second.status_code, 200)
+
+    def test_missing_object_is_404(self):
+        response = self.client.get('/api/lessons/999999/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+        self.students = [
+            Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                   learning_category=category, teacher=teacher)
+            for i in range(2)
+        ]
+        for student in self.students:
+            for _ in range(3):
+                lesson = Lesson.objects.create(student=student, lesson_type=lesson_type, topic=self.topic, comment="a, \"b\"")
+                homework = Homework.objects.create(lesson=lesson)
+                HomeworkResult.objects.create(homework=homework, topic=self.topic, difficulty="EASY",
+                                              correct_count=1, total_count=2)
+            JournalEntry.objects.create(student=student, good_results="", bad_results="", working_on="",
+                                        covered_topics=[{"topic_id": self.topic.id}],
+                                        recommended_lessons=1, recommendation_reason="")
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_lessons_csv_is_streamed(self):
+        import csv
+        response = self.client.get(f'/api/lessons/export/?student={self.students[0].id}')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['student_id'] for row in rows}, {str(self.students[0].id)})
+        self.assertEqual(rows[0]['topic_name'], "Дроби")
+        self.assertEqual(rows[0]['comment'], "a, \"b\"")
+
+    def test_homework_results_ndjson(self):
+        import json
+        response = self.client.get(f'/api/homework-results/export/?format=ndjson&lesson__student={self.students[1].id}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['percentage'], 50.0)
+        self.assertEqual(rows[0]['student_id'], self.students[1].id)
+
+    def test_query_count_does_not_depend_on_size(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.read(self.client.get('/api/journal/export/?format=ndjson'))
+        self.assertEqual(len(ctx), 1)
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/lessons/export/?student=abc')
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_data', 'journal', '--format=ndjson', f'--student={self.students[0].id}', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('"covered_topics": [{"topic_id"', lines[0])
+
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'lessons', '--lesson-student=1', stdout=StringIO())
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        self.category = LearningCategory.objects.create(name="ОГЭ")
+        self.goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+        self.student = Student.objects.create(
+            full_name="Петров", grade=9, learning_goal=self.goal, learning_category=self.category, teacher=self.teacher
+        )
+
+    def student_row(self, name, **overrides):
+        row = {
+            'full_name': name, 'grade': 7, 'learning_goal_id': self.goal.id,
+            'learning_category_id': self.category.id, 'teacher_id': self.teacher.id,
+        }
+        row.update(overrides)
+        return row
+
+    def test_students_json_with_errors(self):
+        rows = [self.student_row(f"Ученик {i}") for i in range(50)]
+        rows[3]['teacher_id'] = 999999
+        rows[7].pop('full_name')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/students/import/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (48, 2))
+        self.assertEqual([e['row'] for e in response.data['errors']], [4, 8])
+        self.assertIn('teacher_id', response.data['errors'][0]['errors'])
+        # По запросу на каждую связанную таблицу, один INSERT и обрамление транзакции
+        self.assertLessEqual(len(ctx), 6)
+        self.assertEqual(Student.objects.count(), 49)
+
+    def test_topics_csv_with_students(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        other = Student.objects.create(
+            full_name="Сидоров", grade=9, learning_goal=self.goal, learning_category=self.category, teacher=self.teacher
+        )
+        content = f"name,student_ids\nПроценты,\"{self.student.id},{other.id}\"\nУравнения,\n".encode()
+        response = self.client.post(
+            '/api/topics/import/', {'file': SimpleUploadedFile('topics.csv', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        topic = Topic.objects.get(name="Проценты")
+        self.assertEqual(set(topic.students.values_list('id', flat=True)), {self.student.id, other.id})
+        self.assertFalse(Topic.objects.get(name="Уравнения").students.exists())
+
+    def test_lessons_keep_imported_date_and_dry_run(self):
+        rows = [
+            {'student_id': self.student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id,
+             'date': '2024-09-01T10:00:00Z', 'comment': 'Первый урок'},
+            {'student_id': self.student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id},
+        ]
+        dry = self.client.post('/api/lessons/import/?dry_run=1', rows, format='json')
+        self.assertEqual(dry.status_code, 200)
+        self.assertEqual(Lesson.objects.count(), 0)
+
+        response = self.client.post('/api/lessons/import/', rows, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Lesson.objects.get(comment='Первый урок').date.year, 2024)
+        self.assertEqual(Lesson.objects.filter(date__year=2024).count(), 1)
+
+    def test_lessons_import_writes_date_in_insert(self):
+        row = {'student_id': self.student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id,
+               'date': '2024-09-01T10:00:00Z'}
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/api/lessons/import/', [row, dict(row, date='2024-09-02T10:00:00Z')], format='json')
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(sorted(Lesson.objects.values_list('date__day', flat=True)), [1, 2])
+
+    def test_lessons_without_comment_have_no_revisions(self):
+        from unittest import mock
+        row = {'student_id': self.student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id}
+        with override_settings(VERSION_CONTROL_URL='http://version-control'), \
+                mock.patch('tutor.versioning.sender') as sender, self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/lessons/import/', [row, dict(row, comment="Дроби"), dict(row, comment="")],
+                             format='json')
+        self.assertEqual([call.args[2]['content'] for call in sender.submit.call_args_list], ["Дроби"])
+
+    def test_ndjson_parse_errors_are_reported_per_line(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        lines = [json.dumps(self.student_row("Ученик 1")), '{"full_name": ', '', json.dumps(self.student_row("Ученик 2"))]
+        response = self.client.post('/api/students/import/', {
+            'file': SimpleUploadedFile('students.ndjson', '\n'.join(lines).encode()),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertIn('Invalid JSON', response.data['errors'][0]['errors']['non_field_errors'][0])
+
+    def test_integrity_error_keeps_committed_chunks(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from .importer import StudentImporter
+        original, version = StudentImporter.save, model_version(Student)
+
+        def save(importer, objects, validated):
+            if any(student.full_name == "Ученик 3" for student in objects):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return original(importer, objects, validated)
+
+        rows = [self.student_row(f"Ученик {i}") for i in range(6)]
+        with mock.patch.object(StudentImporter, 'save', save), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/students/import/?batch_size=2', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Строки отвергнутой порции повторяются по одной: ошибка только у "Ученик 3"
+        self.assertEqual((response.data['created'], response.data['failed']), (5, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [4])
+        self.assertEqual(Student.objects.count(), 6)
+        # Записанные порции сбрасывают кэш ответов
+        self.assertNotEqual(model_version(Student), version)
+
+    def test_all_rows_invalid(self):
+        response = self.client.post('/api/lessons/import/', [{'student_id': 'abc'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+
+    def test_import_invalidates_cached_topics(self):
+        cache.clear()
+        self.client.get('/api/topics/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/topics/import/', [{'name': 'Новая тема'}], format='json')
+        response = self.client.get('/api/topics/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False, encoding='utf-8') as source:
+            import json
+            for i in range(5):
+                source.write(json.dumps(self.student_row(f"Ученик {i}")) + '\n')
+            source.write(json.dumps(self.student_row("Без учителя", teacher_id=None)) + '\n')
+        self.addCleanup(os.remove, source.name)
+        out = StringIO()
+        call_command('import_data', 'students', source.name, '--batch-size=2', stdout=out)
+        self.assertIn('Imported 5 of 6 rows, 1 failed', out.getvalue())
+        self.assertIn('row 6', out.getvalue())
+
+
+class BatchWriteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+        self.students = [
+            Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                   learning_category=category, teacher=self.teacher)
+            for i in range(3)
+        ]
+
+    def lesson_row(self, student, **overrides):
+        row = {'student_id': student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id, 'comment': 'Урок'}
+        row.update(overrides)
+        return row
+
+    def test_batch_create_lessons(self):
+        rows = [self.lesson_row(student) for student in self.students] * 10
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/lessons/batch/?expand=topic', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(response.data[0]['topic']['name'], "Дроби")
+        self.assertEqual(Lesson.objects.count(), 30)
+        # Проверка связей (3 таблицы), один INSERT, выборка ответа - независимо от размера пакета
+        self.assertLess(len(ctx), 20)
+
+    def test_batch_create_is_all_or_nothing(self):
+        rows = [self.lesson_row(self.students[0]), self.lesson_row(self.students[1], topic_id=999999)]
+        response = self.client.post('/api/lessons/batch/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1])
+        self.assertIn('topic_id', response.data['errors'][0]['errors'])
+        self.assertFalse(Lesson.objects.exists())
+
+    def test_batch_create_topics_with_students(self):
+        rows = [{'name': 'Проценты', 'students': [s.id for s in self.students[:2]]}, {'name': 'Степени'}]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/topics/batch/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Связи новых объектов только вставляются: ни выборки старых связей для удаления, ни DELETE
+        self.assertFalse([q for q in ctx.captured_queries
+                          if q['sql'].startswith(('DELETE', 'SELECT "tutor_topic_students"."id"'))])
+        self.assertEqual(sorted(response.data[0]['students']), sorted(s.id for s in self.students[:2]))
+        self.assertEqual(response.data[1]['students'], [])
+
+    def test_batch_update(self):
+        topics = Topic.objects.bulk_create([Topic(name=f"Тема {i}") for i in range(3)])
+        # id строкой, как из формы или CSV, тоже находит объект
+        rows = [{'id': str(topic.id), 'name': f"Новая {topic.id}", 'students': [self.students[0].id]} for topic in topics]
+        response = self.client.patch('/api/topics/batch/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        for topic in topics:
+            topic.refresh_from_db()
+            self.assertEqual(topic.name, f"Новая {topic.id}")
+            self.assertEqual(list(topic.students.values_list('id', flat=True)), [self.students[0].id])
+
+        response = self.client.patch('/api/students/batch/', [
+            {'id': self.students[0].id, 'grade': 10},
+            {'id': 999999, 'grade': 10},
+            {'id': self.students[1].id, 'grade': 'десятый'},
+            {'id': 'abc', 'grade': 10},
+            {'id': True, 'grade': 10},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2, 3, 4])
+        self.students[0].refresh_from_db()
+        self.assertEqual(self.students[0].grade, 9)
+
+    def test_batch_homework_results_recalculate_percentage(self):
+        lesson = Lesson.objects.create(**{'student': self.students[0], 'lesson_type': self.lesson_type, 'topic': self.topic})
+        homework = Homework.objects.create(lesson=lesson)
+        rows = [{'homework_id': homework.id, 'topic_id': self.topic.id, 'difficulty': 'EASY',
+                 'correct_count': 1, 'total_count': 4}]
+        created = self.client.post('/api/homework-results/batch/', rows, format='json')
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.data[0]['percentage'], 25.0)
+
+        updated = self.client.patch('/api/homework-results/batch/',
+                                    [{'id': created.data[0]['id'], 'correct_count': 3}], format='json')
+        self.assertEqual(updated.data[0]['percentage'], 75.0)
+
+    def test_batch_delete(self):
+        ids = [s.id for s in self.students[:2]]
+        missing = self.client.delete('/api/students/batch/', {'ids': ids + [999999]}, format='json')
+        self.assertEqual(missing.status_code, 400)
+        self.assertEqual(Student.objects.count(), 3)
+
+        response = self.client.delete('/api/students/batch/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(list(Student.objects.values_list('id', flat=True)), [self.students[2].id])
+
+
+class StudentTopicMasteryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.student = Student.objects.create(
+            full_name="Петров", grade=9, learning_goal=goal, learning_category=category, teacher=teacher
+        )
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+        self.other_topic = Topic.objects.create(name="Степени")
+        self.lesson = Lesson.objects.create(student=self.student, lesson_type=self.lesson_type, topic=self.topic)
+        self.homework = Homework.objects.create(lesson=self.lesson)
+
+    def add_result(self, correct, topic=None, difficulty="EASY"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return HomeworkResult.objects.create(homework=self.homework, topic=topic or self.topic,
+                                                 difficulty=difficulty, correct_count=correct, total_count=10)
+
+    def mastery(self, topic=None, difficulty="EASY"):
+        return StudentTopicMastery.objects.get(student=self.student, topic=topic or self.topic, difficulty=difficulty)
+
+    def test_maintained_on_save_and_delete(self):
+        for correct in range(1, 8):
+            last = self.add_result(correct)
+        row = self.mastery()
+        self.assertEqual(row.attempts, 7)
+        self.assertEqual(row.latest_percentage, 70.0)
+        self.assertAlmostEqual(row.average_percentage, 50.0)  # 30..70 - последние 5 попыток
+        self.assertEqual(row.last_attempt_at, last.created_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            last.delete()
+        row = self.mastery()
+        self.assertEqual((row.attempts, row.latest_percentage), (6, 60.0))
+
+    def test_changing_key_moves_attempt(self):
+        result = self.add_result(5)
+        result = HomeworkResult.objects.get(pk=result.pk)
+        result.difficulty = "HARD"
+        with self.captureOnCommitCallbacks(execute=True):
+            result.save()
+        self.assertFalse(StudentTopicMastery.objects.filter(difficulty="EASY").exists())
+        self.assertEqual(self.mastery(difficulty="HARD").attempts, 1)
+
+    def test_bulk_create_and_cascade_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeworkResult.objects.bulk_create([
+                HomeworkResult(homework=self.homework, topic=topic, difficulty=difficulty, correct_count=5, total_count=10)
+                for topic in (self.topic, self.other_topic) for difficulty in ("EASY", "MEDIUM")
+            ])
+        self.assertEqual(StudentTopicMastery.objects.filter(student=self.student).count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.delete()
+        self.assertFalse(StudentTopicMastery.objects.exists())
+
+    def test_cascade_delete_resolves_students_in_one_query(self):
+        other = Homework.objects.create(lesson=self.lesson)
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeworkResult.objects.bulk_create([
+                HomeworkResult(homework=homework, topic=self.topic, difficulty="EASY", correct_count=index,
+                               total_count=10)
+                for homework in (self.homework, other) for index in range(10)
+            ])
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks() as callbacks:
+            self.lesson.delete()
+        lookups = [query['sql'] for query in ctx.captured_queries
+                   if 'FROM "tutor_homework" INNER JOIN "tutor_lesson"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        from .mastery import _deleting
+        self.assertEqual(_deleting.by_alias, {})
+        for callback in callbacks:
+            callback()
+        self.assertFalse(StudentTopicMastery.objects.exists())
+
+    def test_interrupted_delete_does_not_leak(self):
+        from .mastery import _deleting, expect_delete
+        result = self.add_result(5)
+        # pre_delete без post_delete: удаление прервалось и было откачено
+        expect_delete(result, origin=self.homework)
+        other = Homework.objects.create(lesson=Lesson.objects.create(
+            student=self.student, lesson_type=self.lesson_type, topic=self.topic))
+        HomeworkResult.objects.create(homework=other, topic=self.topic, difficulty="EASY", correct_count=1, total_count=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(_deleting.by_alias, {})
+        self.assertEqual(self.mastery().attempts, 1)
+
+    def test_new_attempt_is_appended_without_recompute(self):
+        for correct in range(1, 8):
+            self.add_result(correct)
+        with CaptureQueriesContext(connection) as ctx:
+            self.add_result(9)
+        self.assertFalse([query for query in ctx.captured_queries if 'ROW_NUMBER' in query['sql']])
+        row = self.mastery()
+        self.assertEqual((row.attempts, row.latest_percentage), (8, 90.0))
+        self.assertEqual(row.recent_percentages, [90.0, 70.0, 60.0, 50.0, 40.0])
+        self.assertAlmostEqual(row.average_percentage, 62.0)
+
+        # Попытка задним числом пересчитывается из результатов
+        with keep_timestamps(HomeworkResult), self.captureOnCommitCallbacks(execute=True):
+            HomeworkResult.objects.bulk_create([HomeworkResult(
+                homework=self.homework, topic=self.topic, difficulty="EASY", correct_count=0, total_count=10,
+                created_at=row.last_attempt_at - datetime.timedelta(days=1),
+            )])
+        row = self.mastery()
+        self.assertEqual((row.attempts, row.latest_percentage), (9, 90.0))
+        self.assertEqual(row.recent_percentages, [90.0, 70.0, 60.0, 50.0, 40.0])
+
+    def test_moving_lesson_or_homework_to_another_student(self):
+        other = Student.objects.create(
+            full_name="Сидоров", grade=9, learning_goal=self.student.learning_goal,
+            learning_category=self.student.learning_category, teacher=self.student.teacher
+        )
+        self.add_result(5)
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.student = other
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.save()
+        self.assertEqual(list(StudentTopicMastery.objects.values_list('student_id', 'attempts')), [(other.id, 1)])
+
+        homework = Homework.objects.get(pk=self.homework.pk)
+        homework.lesson = Lesson.objects.create(student=self.student, lesson_type=self.lesson_type, topic=self.topic)
+        with self.captureOnCommitCallbacks(execute=True):
+            homework.save()
+        self.assertEqual(list(StudentTopicMastery.objects.values_list('student_id', 'attempts')), [(self.student.id, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/lessons/batch/', [{'id': homework.lesson_id, 'student_id': other.id}], format='json')
+        self.assertEqual(list(StudentTopicMastery.objects.values_list('student_id', 'attempts')), [(other.id, 1)])
+
+    def test_rebuild_command_and_endpoint(self):
+        self.add_result(10)
+        self.add_result(4, topic=self.other_topic, difficulty="HARD")
+        StudentTopicMastery.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_mastery', stdout=out)
+        self.assertIn('Rebuilt 2 mastery rows', out.getvalue())
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/mastery/?student={self.student.id}')
+        self.assertEqual(response.status_code, 200)
+        rows = {(row['topic_name'], row['difficulty']): row for row in response.data['results']}
+        self.assertEqual(rows[("Дроби", "EASY")]['latest_percentage'], 100.0)
+        self.assertEqual(rows[("Степени", "HARD")]['attempts'], 1)
+        # Фильтр ?student=, агрегат для ETag, страница с темами
+        self.assertLessEqual(len(ctx), 4)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.teachers = [Teacher.objects.create(full_name=f"Учитель {i}", subject="Математика") for i in range(2)]
+        self.category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.individual = LessonType.objects.create(name="Индивидуальный")
+        self.group = LessonType.objects.create(name="Групповой")
+        self.fractions = Topic.objects.create(name="Дроби")
+        self.powers = Topic.objects.create(name="Степени")
+        self.students = [
+            Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                   learning_category=self.category, teacher=self.teachers[i % 2])
+            for i in range(4)
+        ]
+        with keep_timestamps(Lesson, HomeworkResult):
+            for index, student in enumerate(self.students):
+                for week in range(2):
+                    date = timezone.make_aware(datetime.datetime(2025, 3, 3 + 7 * week, 10))
+                    lesson = Lesson.objects.create(student=student, lesson_type=self.group if week else self.individual,
+                                                   topic=self.fractions, date=date)
+                    homework = Homework.objects.create(lesson=lesson)
+                    HomeworkResult.objects.bulk_create([
+                        HomeworkResult(homework=homework, topic=self.fractions, difficulty="EASY",
+                                       correct_count=8, total_count=10, created_at=date),
+                        HomeworkResult(homework=homework, topic=self.powers, difficulty="HARD",
+                                       correct_count=index, total_count=10, created_at=date),
+                    ])
+
+    def report(self, name, **params):
+        response = self.client.get(f'/api/analytics/{name}/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def test_topic_performance(self):
+        rows = self.report('topic-performance').data['results']
+        self.assertEqual([(r['topic_name'], r['difficulty'], r['attempts']) for r in rows],
+                         [("Дроби", "EASY", 8), ("Степени", "HARD", 8)])
+        self.assertAlmostEqual(rows[1]['average_percentage'], 15.0)
+
+        by_teacher = self.report('topic-performance', teacher_id=self.teachers[1].id).data['results']
+        self.assertAlmostEqual(by_teacher[1]['average_percentage'], 20.0)  # ученики 1 и 3
+        self.assertEqual(by_teacher[1]['attempts'], 4)
+
+    def test_lessons_per_week_with_date_range(self):
+        rows = self.report('lessons-per-week').data['results']
+        self.assertEqual([(r['week'].date(), r['lesson_type_name'], r['lessons']) for r in rows], [
+            (datetime.date(2025, 3, 3), "Индивидуальный", 4),
+            (datetime.date(2025, 3, 10), "Групповой", 4),
+        ])
+        rows = self.report('lessons-per-week', date_from='2025-03-10', date_to='2025-03-10').data['results']
+        self.assertEqual([r['lessons'] for r in rows], [4])
+
+    def test_weakest_topics(self):
+        rows = self.report('weakest-topics', category_id=self.category.id, limit=1).data['results']
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['topic_name'], "Степени")
+        self.assertEqual(rows[0]['students'], 4)
+
+    def test_query_count_and_caching(self):
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.report('topic-performance')
+        self.assertEqual(len(ctx), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.report('topic-performance')
+        self.assertEqual((second['X-Cache'], len(ctx)), ('HIT', 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HomeworkResult.objects.filter(topic=self.powers).first().delete()
+        third = self.report('topic-performance')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data['results'][1]['attempts'], 7)
+
+    def test_invalid_filters(self):
+        response = self.client.get('/api/analytics/weakest-topics/', {'date_from': '2025-03-10', 'date_to': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+def async_urlpatterns():
+    from django.urls import include, path
+    from app.urls import router
+    from . import async_views
+    return [path('api/', include(async_views.urlpatterns + router.urls))]
+
+
+# ROOT_URLCONF для AsyncViewsTests: асинхронные маршруты, как при TUTOR_ASYNC_VIEWS=1
+urlpatterns = async_urlpatterns()
+
+
+@override_settings(ROOT_URLCONF='tutor.tests')
+@shared_cache
+class AsyncViewsTests(TestCase):
+    """Асинхронные эндпоинты отдают то же, что синхронные ViewSet'ы."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        goal.categories.add(category)
+        self.student = Student.objects.create(
+            full_name="Петров", grade=9, learning_goal=goal, learning_category=category, teacher=teacher
+        )
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        topic = Topic.objects.create(name="Дроби")
+        topic.students.add(self.student)
+        for index in range(3):
+            lesson = Lesson.objects.create(student=self.student, lesson_type=lesson_type, topic=topic)
+            homework = Homework.objects.create(lesson=lesson)
+            homework.topics.add(topic)
+            HomeworkResult.objects.create(homework=homework, topic=topic, difficulty="EASY",
+                                          correct_count=index, total_count=10)
+        JournalEntry.objects.create(student=self.student, good_results="", bad_results="", working_on="",
+                                    recommended_lessons=1, recommendation_reason="")
+
+    def sync_get(self, url, **headers):
+        # Синхронный ViewSet по тому же адресу (маршруты из app.urls)
+        with override_settings(ROOT_URLCONF='app.urls'):
+            return self.client.get(url, **headers)
+
+    async def assert_same(self, url):
+        expected = await sync_to_async(self.sync_get)(url)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response, expected
+
+    async def test_lists_match_sync_views(self):
+        for url in (
+            '/api/lessons/', f'/api/lessons/?student={self.student.id}', '/api/lessons/?page_size=2',
+            '/api/homework/', f'/api/homework/?lesson__student={self.student.id}',
+            '/api/journal/', f'/api/journal/?student={self.student.id}',
+            '/api/lessons/?expand=*', '/api/journal/?expand=student.teacher&fields=id,student',
+        ):
+            with self.subTest(url=url):
+                response, expected = await self.assert_same(url)
+                self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_cursor_pages_match(self):
+        first, _ = await self.assert_same('/api/lessons/?page_size=2')
+        response, _ = await self.assert_same(first.json()['next'].replace('http://testserver', ''))
+        self.assertEqual(len(response.json()['results']), 1)
+
+    async def test_invalid_filter_and_cursor(self):
+        await self.assert_same('/api/lessons/?student=999999')
+        await self.assert_same('/api/homework/?lesson=abc')
+        await self.assert_same('/api/lessons/?cursor=broken')
+
+    async def test_conditional_get(self):
+        first = await self.async_client.get('/api/lessons/')
+        second = await self.async_client.get('/api/lessons/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+
+    async def test_access_policy_of_sync_viewset(self):
+        from unittest import mock
+        from rest_framework.permissions import IsAuthenticated
+        from .views import JournalViewSet, LessonViewSet
+        with mock.patch.object(LessonViewSet, 'permission_classes', [IsAuthenticated]), \
+                mock.patch.object(JournalViewSet, 'permission_classes', [IsAuthenticated]):
+            response, _ = await self.assert_same('/api/lessons/')
+            generate = await self.async_client.post('/api/journal/generate/', {'student_id': self.student.id},
+                                                    content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(generate.status_code, 403)
+
+    async def test_writes_go_to_sync_viewset(self):
+        response = await self.async_client.post('/api/journal/', {
+            'student_id': self.student.id, 'good_results': "-", 'bad_results': "-", 'working_on': "-",
+            'recommended_lessons': 2, 'recommendation_reason': "-",
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await JournalEntry.objects.acount(), 2)
+
+    async def test_journal_generate(self):
+        def sync_generate():
+            with override_settings(ROOT_URLCONF='app.urls'):
+                return self.client.post('/api/journal/generate/', {'student_id': self.student.id}, format='json')
+
+        expected = (await sync_to_async(sync_generate)()).json()
+        response = await self.async_client.post(
+            '/api/journal/generate/', {'student_id': self.student.id}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        for volatile in ('id', 'created_at'):
+            data.pop(volatile), expected.pop(volatile)
+        self.assertEqual(data, expected)
+        self.assertEqual(data['working_on'], "Мы продолжаем работать над: Дроби easy уровня.")
+
+        missing = await self.async_client.post('/api/journal/generate/', {'student_id': 0},
+                                               content_type='application/json')
+        self.assertEqual(missing.status_code, 404)
+
+
+class ReplicaParityTests(TransactionTestCase):
+    """FastAPI-реплика из main.py отдает то же, что DRF, по тем же адресам и курсорам."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        categories = [LearningCategory.objects.create(name=name) for name in ("ОГЭ", "ЕГЭ")]
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        goal.categories.set(categories)
+        self.students = [
+            Student.objects.create(full_name=f"Ученик {i}", grade=9, learning_goal=goal,
+                                   learning_category=categories[i % 2], teacher=teacher)
+            for i in range(3)
+        ]
+        lesson_type = LessonType.objects.create(name="Индивидуальный")
+        topic = Topic.objects.create(name="Дроби")
+        topic.students.set(self.students[:2])
+        same_date = timezone.make_aware(datetime.datetime(2025, 3, 3, 10))
+        with keep_timestamps(Lesson, HomeworkResult):
+            for index, student in enumerate(self.students * 2):
+                # Совпадающие даты проверяют сортировку по id внутри курсора
+                date = same_date if index % 2 else same_date + datetime.timedelta(microseconds=index * 1001)
+                lesson = Lesson.objects.create(student=student, lesson_type=lesson_type, topic=topic,
+                                               date=date, comment=None if index % 3 else "Урок")
+                homework = Homework.objects.create(lesson=lesson)
+                HomeworkResult.objects.create(homework=homework, topic=topic, difficulty="EASY",
+                                              correct_count=index, total_count=10 if index else 0, created_at=date)
+        for student in self.students:
+            JournalEntry.objects.create(student=student, good_results="-", bad_results="-", working_on="-",
+                                        covered_topics="В ходе занятий были пройдены следующие темы: Дроби.",
+                                        recommended_lessons=2, recommendation_reason="-")
+        self.lesson = Lesson.objects.first()
+
+    def replica(self, *urls):
+        """Ответы реплики (status, json) на urls; приложение живет на время вызова."""
+        import asyncio
+        from urllib.parse import urlsplit
+        from main import create_app
+
+        app = create_app(connection.settings_dict)
+
+        async def get(url):
+            parts = urlsplit(url)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+                'query_string': parts.query.encode(), 'root_path': '', 'headers': [(b'host', b'testserver')],
+                'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await app(scope, receive, send)
+            body = b''.join(message.get('body', b'') for message in messages[1:])
+            return messages[0]['status'], json.loads(body)
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                return [await get(url) for url in urls]
+
+        return asyncio.run(run())
+
+    def assert_parity(self, *urls):
+        responses = self.replica(*urls)
+        for url, (status, data) in zip(urls, responses):
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                self.assertEqual(status, expected.status_code)
+                self.assertEqual(data, expected.json())
+        return [data for _, data in responses]
+
+    def test_lists_and_filters(self):
+        student, category = self.students[0], self.students[0].learning_category
+        pages = self.assert_parity(
+            '/api/students/', f'/api/students/?learning_category={category.id}',
+            '/api/lessons/', f'/api/lessons/?student={student.id}',
+            '/api/homework-results/', f'/api/homework-results/?homework__lesson={self.lesson.id}',
+            f'/api/homework-results/?homework__lesson__student={student.id}',
+            '/api/journal/', f'/api/journal/?student={student.id}',
+        )
+        # У ученика два урока с одним результатом ДЗ на каждом
+        self.assertEqual(len(pages[6]['results']), 2)
+
+    def test_cursor_pagination_both_ways(self):
+        for resource in ('students', 'lessons', 'homework-results', 'journal'):
+            url, seen = f'/api/{resource}/?page_size=2', []
+            while url:
+                page, = self.assert_parity(url)
+                seen.append(page)
+                url = page['next']
+            self.assertGreater(len(seen), 1)
+            previous, = self.assert_parity(seen[-1]['previous'])
+            self.assertEqual(previous['results'], seen[-2]['results'])
+
+    def test_detail_and_errors(self):
+        self.assert_parity(
+            f'/api/lessons/{self.lesson.id}/', f'/api/students/{self.students[0].id}/',
+            f'/api/journal/{JournalEntry.objects.first().id}/',
+            '/api/lessons/999999/', '/api/lessons/abc/',
+            '/api/lessons/?student=999999', '/api/lessons/?student=abc', '/api/lessons/?cursor=broken',
+        )
+
+    def test_fields_and_expand(self):
+        self.assert_parity(
+            '/api/lessons/?expand=*', '/api/lessons/?expand=student.learning_goal,topic&page_size=2',
+            '/api/lessons/?fields=id,date,student.full_name&expand=student',
+            '/api/students/?expand=learning_goal.categories,teacher&fields=id,learning_goal,teacher',
+            f'/api/journal/{JournalEntry.objects.first().id}/?expand=student&fields=student.learning_goal,id',
+            '/api/homework-results/?fields=id,percentage',
+        )
+
+    def test_output_matches_schemas(self):
+        from replica import schemas
+        for query in ('', '?expand=*'):
+            (_, lessons), (_, journal) = self.replica('/api/lessons/' + query, '/api/journal/' + query)
+            self.assertEqual(len(schemas.Page[schemas.Lesson].model_validate(lessons).results), 6)
+            self.assertEqual(len(schemas.Page[schemas.JournalEntry].model_validate(journal).results), 3)
+
+
+class VersionControlHookTests(TestCase):
+    """Ревизии журнала и комментариев уходят в живой сервис version_control после фиксации."""
+
+    def setUp(self):
+        import socket
+        import threading
+        import uvicorn
+        from version_control.main import create_app
+
+        self.tmp = tempfile.TemporaryDirectory()
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+        app = create_app(os.path.join(self.tmp.name, 'revisions.sqlite3'))
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            self.thread.join(0.01)
+
+        teacher = Teacher.objects.create(full_name="Иванова", subject="Математика")
+        category = LearningCategory.objects.create(name="ОГЭ")
+        goal = LearningGoal.objects.create(name="Сдать экзамен")
+        self.student = Student.objects.create(full_name="Петров", grade=9, learning_goal=goal,
+                                              learning_category=category, teacher=teacher)
+        self.lesson_type = LessonType.objects.create(name="Индивидуальный")
+        self.topic = Topic.objects.create(name="Дроби")
+
+    def tearDown(self):
+        self.server.should_exit = True
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def history(self, path, count):
+        import requests
+        import time
+        deadline = time.monotonic() + 5
+        while True:
+            response = requests.get(f'{self.url}/documents/{path}/revisions')
+            if response.status_code == 200 and len(response.json()) >= count or time.monotonic() > deadline:
+                return response.json()
+            time.sleep(0.05)
+
+    def test_comment_and_journal_revisions(self):
+        with override_settings(VERSION_CONTROL_URL=self.url):
+            with self.captureOnCommitCallbacks(execute=True):
+                lesson = Lesson.objects.create(student=self.student, lesson_type=self.lesson_type,
+                                               topic=self.topic, comment="Дроби")
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                lesson = Lesson.objects.get(pk=lesson.pk)
+                lesson.save()  # комментарий не менялся
+            # Остается только сброс версий кэша (tutor.signals)
+            self.assertEqual([callback for callback in callbacks if getattr(callback, 'func', None) is not bump_version], [])
+            with self.captureOnCommitCallbacks(execute=True):
+                lesson.comment = "Дроби и проценты"
+                lesson.save()
+                entry = JournalEntry.objects.create(student=self.student, good_results="-", bad_results="-",
+                                                    working_on="Дроби", recommended_lessons=2,
+                                                    recommendation_reason="-")
+
+        self.assertEqual([r['version'] for r in self.history(f'lesson-comment/{lesson.pk}', 2)], [1, 2])
+        self.assertEqual(len(self.history(f'journal/{entry.pk}', 1)), 1)
+        import requests
+        latest = requests.get(f'{self.url}/documents/journal/{entry.pk}/revisions/latest').json()
+        self.assertIn('"working_on": "Дроби"', latest['content'])
+
+    def test_bulk_writes_record_revisions(self):
+        client = APIClient()
+        row = {'student_id': self.student.id, 'lesson_type_id': self.lesson_type.id, 'topic_id': self.topic.id}
+        with override_settings(VERSION_CONTROL_URL=self.url):
+            with self.captureOnCommitCallbacks(execute=True):
+                imported = client.post('/api/lessons/import/', [{**row, 'comment': "Импорт"}], format='json')
+            lesson = Lesson.objects.get()
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch('/api/lessons/batch/', [{'id': lesson.pk, 'comment': "Пакет"}], format='json')
+                client.patch('/api/lessons/batch/', [{'id': lesson.pk, 'date': '2025-01-01T10:00:00Z'}], format='json')
+            with self.captureOnCommitCallbacks(execute=True):
+                client.post(reverse('journalentry-generate-batch'), {'student_ids': [self.student.id]}, format='json')
+        self.assertEqual(imported.data['created'], 1)
+        # Ревизии отправляются по очереди: запись журнала ушла последней
+        self.assertEqual(len(self.history(f'journal/{JournalEntry.objects.get().pk}', 1)), 1)
+        # Смена даты без смены комментария ревизии не создает
+        comments = self.history(f'lesson-comment/{lesson.pk}', 2)
+        self.assertEqual([r['version'] for r in comments], [1, 2])
+        import requests
+        latest = requests.get(f'{self.url}/documents/lesson-comment/{lesson.pk}/revisions/latest').json()
+        self.assertEqual(latest['content'], "Пакет")
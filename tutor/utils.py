@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """Разбивает итерируемое на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """
+    Временно отключает auto_now/auto_now_add у полей моделей, чтобы при
+    переносе или импорте сохранились исходные даты.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -0,0 +1,106 @@
+"""
+Отправка ревизий в сервис истории версий (version_control/main.py): записи
+журнала целиком и комментарии к урокам.
+
+Включается настройкой VERSION_CONTROL_URL. После фиксации транзакции ревизия
+ставится в очередь, а фоновый поток отправляет накопившиеся ревизии одним
+запросом POST /revisions через общий requests.Session. Недоступность сервиса
+не замедляет и не ломает запись в API - ошибка только пишется в лог. Поток
+один: ревизии одного документа приходят в сервис в порядке фиксации.
+
+Очередь в памяти ограничена VERSION_CONTROL_QUEUE_SIZE: при переполнении,
+ошибке сервиса или перезапуске процесса ревизии теряются (данные остаются в
+БД, пропадает только промежуточная версия в истории). Пустые документы не
+отправляются. Массовые операции (bulk_create / bulk_update) сигналов не
+отправляют - пакетная запись, импорт и пакетная генерация журнала вызывают
+record_objects() сами.
+"""
+import itertools
+import logging
+import queue
+import threading
+
+import requests
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import JournalEntry, Lesson
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FIELDS = (
+    'good_results', 'bad_results', 'covered_topics', 'working_on', 'recommended_lessons', 'recommendation_reason',
+)
+# Наибольшее число ревизий в одном запросе к сервису
+BATCH_SIZE = 100
+
+
+def journal_document(entry):
+    return {field: getattr(entry, field) for field in JOURNAL_FIELDS}
+
+
+def send(session, base_url, timeout, revisions):
+    try:
+        response = session.post(f"{base_url.rstrip('/')}/revisions", json=revisions, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        logger.warning("Не удалось сохранить %d ревизий: %s", len(revisions), exc)
+
+
+class RevisionSender:
+    """
+    Ограниченная очередь ревизий и один поток, который отправляет их пачками.
+    Поток запускается при первой ревизии.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._session = requests.Session()
+
+    def submit(self, base_url, timeout, revision):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(settings.VERSION_CONTROL_QUEUE_SIZE)
+                threading.Thread(target=self._run, name='version-control', daemon=True).start()
+        try:
+            self._queue.put_nowait((base_url, timeout, revision))
+        except queue.Full:
+            logger.warning("Очередь ревизий переполнена, ревизия %s:%s пропущена", revision['kind'], revision['doc_id'])
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Адрес сервиса мог смениться (override_settings), порядок ревизий сохраняется
+            for (base_url, timeout), items in itertools.groupby(batch, key=lambda item: item[:2]):
+                send(self._session, base_url, timeout, [revision for _, _, revision in items])
+
+
+sender = RevisionSender()
+
+
+def record(kind, pk, content, using):
+    """Планирует отправку ревизии после фиксации транзакции."""
+    if settings.VERSION_CONTROL_URL and content:
+        args = (settings.VERSION_CONTROL_URL, settings.VERSION_CONTROL_TIMEOUT,
+                {'kind': kind, 'doc_id': pk, 'content': content})
+        transaction.on_commit(lambda: sender.submit(*args), using=using)
+
+
+def record_objects(model, objects, created=False, using=DEFAULT_DB_ALIAS):
+    """Ревизии записей журнала и измененных комментариев уроков из objects."""
+    if not settings.VERSION_CONTROL_URL:
+        return
+    if model is JournalEntry:
+        for entry in objects:
+            record('journal', entry.pk, journal_document(entry), using)
+    elif model is Lesson:
+        for lesson in objects:
+            if created or lesson.comment != getattr(lesson, '_loaded_comment', None):
+                record('lesson-comment', lesson.pk, lesson.comment or '', using)
+                lesson._loaded_comment = lesson.comment
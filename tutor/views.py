@@ -1,39 +1,57 @@
 from rest_framework import viewsets, filters, mixins, status
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from .models import *
 from .serializers import *
+from .eager import EagerLoadingMixin
+from .fastpath import ValuesListMixin
+from .cache import ResponseCacheMixin, stats as cache_stats
+from .conditional import ConditionalGetMixin, ReferenceDataMixin
+from .export import ExportMixin
+from .importer import ImportMixin
+from .batch import BatchWriteMixin
+from .profiling import ProfilingMixin
+from .pagination import LessonPagination, CreatedAtPagination
+from .journal import latest_results, build_entry, select_students, generate_entries
+from .analytics import REPORTS
 import logging
 
 logger = logging.getLogger(__name__)
 
-class TeacherViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    return Response(cache_stats.snapshot())
+
+class TeacherViewSet(ProfilingMixin, ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = Teacher.objects.all()
     serializer_class = TeacherSerializer
     permission_classes = [AllowAny]
 
     def create(self, request, *args, **kwargs):
-        logger.info(f"Создание учителя: {request.data}")
+        logger.info("Создание учителя: %s", request.data)
         return super().create(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
-        logger.info(f"Обновление учителя: {request.data}")
+        logger.info("Обновление учителя: %s", request.data)
         return super().update(request, *args, **kwargs)
 
-class LearningGoalViewSet(viewsets.ModelViewSet):
+class LearningGoalViewSet(ProfilingMixin, ReferenceDataMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = LearningGoal.objects.all()
+    cache_dependencies = (LearningGoal, LearningCategory)
     serializer_class = LearningGoalSerializer
     permission_classes = [AllowAny]
     
     def get_queryset(self):
+        queryset = super().get_queryset()
         category_id = self.request.query_params.get('category')
         if category_id:
-            return self.queryset.filter(categories__id=category_id)
-        return self.queryset
+            return queryset.filter(categories__id=category_id)
+        return queryset
 
-class LearningCategoriesViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class LearningCategoriesViewSet(ProfilingMixin, ReferenceDataMixin, mixins.CreateModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     queryset = LearningCategory.objects.all()
     serializer_class = LearningCategorySerializer
     filter_backends = [DjangoFilterBackend]
@@ -41,69 +59,62 @@ class LearningCategoriesViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin
     permission_classes = [AllowAny]
 
     def create(self, request, *args, **kwargs):
-        logger.info(f"Создание категории обучения: {request.data}")
+        logger.info("Создание категории обучения: %s", request.data)
         return super().create(request, *args, **kwargs)
 
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(ProfilingMixin, ConditionalGetMixin, ImportMixin, BatchWriteMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
+    import_name = 'students'
     serializer_class = StudentSerializer
     permission_classes = [AllowAny]
     filterset_fields = ['learning_category']
     
     def create(self, request, *args, **kwargs):
-        logger.info(f"Создание ученика: {request.data}")
+        logger.info("Создание ученика: %s", request.data)
         return super().create(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
-        logger.info(f"Обновление ученика: {request.data}")
+        logger.info("Обновление ученика: %s", request.data)
         return super().update(request, *args, **kwargs)
 
-class LessonTypeViewSet(viewsets.ModelViewSet):
+class LessonTypeViewSet(ProfilingMixin, ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = LessonType.objects.all()
     serializer_class = LessonTypeSerializer
     permission_classes = [AllowAny]
 
-class TopicViewSet(viewsets.ModelViewSet):
+class TopicViewSet(ProfilingMixin, ReferenceDataMixin, ImportMixin, BatchWriteMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Topic.objects.all()
+    # Удаление ученика каскадом чистит связи без m2m_changed
+    cache_dependencies = (Topic, Student)
+    import_name = 'topics'
     serializer_class = TopicSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['id', 'students']
     permission_classes = [AllowAny]
 
-class LessonViewSet(viewsets.ModelViewSet):
+class LessonViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, ImportMixin, BatchWriteMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
+    import_name = 'lessons'
     serializer_class = LessonSerializer
+    pagination_class = LessonPagination
+    conditional_field = 'date'
+    export_name = 'lessons'
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['student']
     permission_classes = [AllowAny]
 
     def list(self, request, *args, **kwargs):
-        logger.info(f"Запрос уроков: {request.query_params}")
+        logger.info("Запрос уроков: %s", request.query_params)
         return super().list(request, *args, **kwargs)
 
-class HomeworkViewSet(viewsets.ModelViewSet):
+class HomeworkViewSet(ProfilingMixin, ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Homework.objects.all()
     serializer_class = HomeworkSerializer
+    pagination_class = CreatedAtPagination
+    conditional_field = 'created_at'
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['lesson', 'lesson__student']  # Поддержка фильтрации по lesson__student
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        homework = serializer.save()
-
-        results = request.data.get('results', [])
-        for result in results:
-            HomeworkResult.objects.create(
-                homework=homework,
-                topic_id=result['topic_id'],
-                difficulty=result['difficulty'],
-                correct_count=result.get('correct_count', 0),
-                total_count=result.get('total_count', 0)
-            )
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
     @action(detail=True, methods=['get'])
     def results(self, request, pk=None):
         homework = self.get_object()
@@ -111,21 +122,37 @@ class HomeworkViewSet(viewsets.ModelViewSet):
         serializer = HomeworkResultSerializer(results, many=True)
         return Response(serializer.data)
 
-class HomeworkResultViewSet(viewsets.ModelViewSet):
+class HomeworkResultViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, BatchWriteMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = HomeworkResult.objects.all()
     serializer_class = HomeworkResultSerializer
+    batch_serializer_class = HomeworkResultBatchSerializer
+    pagination_class = CreatedAtPagination
+    conditional_field = 'created_at'
+    export_name = 'homework-results'
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['homework__lesson']
+    filterset_fields = ['homework__lesson', 'homework__lesson__student']
 
-class JournalViewSet(viewsets.ModelViewSet):
+class StudentTopicMasteryViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """Освоение тем: строки таблицы StudentTopicMastery, по индексу (ученик, тема, сложность)."""
+    queryset = StudentTopicMastery.objects.select_related('topic').order_by('student_id', 'topic_id', 'difficulty')
+    serializer_class = StudentTopicMasterySerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['student', 'topic', 'difficulty']
+    conditional_field = 'last_attempt_at'
+
+class JournalViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = JournalEntry.objects.all()
     serializer_class = JournalEntrySerializer
+    pagination_class = CreatedAtPagination
+    conditional_field = 'created_at'
+    export_name = 'journal'
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         student_id = self.request.query_params.get('student')
         if student_id:
-            return self.queryset.filter(student_id=student_id)
-        return self.queryset
+            return queryset.filter(student_id=student_id)
+        return queryset
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -137,95 +164,71 @@ class JournalViewSet(viewsets.ModelViewSet):
         except Student.DoesNotExist:
             return Response({"detail": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Получаем последние уроки для студента
-        lessons = Lesson.objects.filter(student=student).order_by('-date')[:lessons_count]
-        if not lessons:
+        if lessons_count < 1 or not Lesson.objects.filter(student=student).exists():
             return Response({"detail": "No lessons found for this student"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Получаем ID уроков
-        lesson_ids = lessons.values_list('id', flat=True)
-
-        # Получаем домашние задания для этих уроков
-        homeworks = Homework.objects.filter(lesson__in=lesson_ids)
-        homework_ids = homeworks.values_list('id', flat=True)
-
-        # Получаем результаты ДЗ и берем только последние для каждой комбинации topic_id и difficulty
-        results = HomeworkResult.objects.filter(homework__in=homework_ids).order_by('topic_id', 'difficulty', '-created_at')
-        latest_results = {}
-        for result in results:
-            key = f"{result.topic_id}-{result.difficulty}"
-            if key not in latest_results:
-                latest_results[key] = result
-
-        # Собираем данные для журнала
-        good_results_list = []
-        bad_results_list = []
-        covered_topics = []
-        bad_topics = []
-
-        for result in latest_results.values():
-            topic_entry = f"{result.topic.name} {result.difficulty.lower()} уровня"
-            topic_data = {
-                "topic_id": result.topic.id,
-                "topic_name": result.topic.name,
-                "difficulty": result.difficulty,
-                "percentage": result.percentage
-            }
-            covered_topics.append(topic_data)
-            if result.percentage == 100:
-                good_results_list.append(topic_entry)
-            else:
-                bad_results_list.append(topic_entry)
-                bad_topics.append(topic_entry)
-
-        # Формируем первый блок: Хорошие и плохие результаты
-        if good_results_list and bad_results_list:
-            good_results = (
-                f"У ученика такая оценка, т.к. в ходе обучения он хорошо освоил следующие темы: "
-                f"{', '.join(good_results_list)}. "
-                f"Но при этом ещё плохо понимает следующие темы: {', '.join(bad_results_list)}."
-            )
-        elif good_results_list:
-            good_results = (
-                f"У ученика такая оценка, т.к. в ходе обучения он хорошо освоил следующие темы: "
-                f"{', '.join(good_results_list)}."
-            )
-        elif bad_results_list:
-            good_results = (
-                f"У ученика такая оценка, т.к. в ходе обучения он плохо освоил следующие темы: "
-                f"{', '.join(bad_results_list)}."
-            )
-        else:
-            good_results = "У ученика нет результатов по домашним заданиям."
-
-        # Формируем второй блок: Пройденные темы
-        covered_topics_names = [f"{t['topic_name']} {t['difficulty'].lower()} уровня" for t in covered_topics]
-        covered_topics_text = (
-            f"В ходе занятий были пройдены следующие темы: {', '.join(covered_topics_names)}."
-            if covered_topics_names else "В ходе занятий темы не были пройдены."
-        )
+        # Последние результаты по каждой паре (тема, сложность) - одним запросом
+        results = latest_results(student, lessons_count)
+
+        # Создаем запись в журнале
+        journal_entry = build_entry(results, student=student)
+        journal_entry.save()
 
-        # Формируем третий блок: Работаем над и рекомендации
-        working_on = (
-            f"Мы продолжаем работать над: {', '.join(bad_topics)}." if bad_topics
-            else "Все темы освоены на 100%."
+        serializer = self.get_serializer(journal_entry)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='generate-batch')
+    def generate_batch(self, request):
+        serializer = JournalBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        student_ids = select_students(
+            teacher_id=params.get('teacher_id'),
+            category_id=params.get('category_id'),
+            student_ids=params.get('student_ids'),
         )
-        recommended_lessons = max(1, len(bad_topics))  # Минимум 1 урок, больше при проблемах
-        recommendation_reason = (
-            f"Я советую такой объем занятий, т.к. ученик ещё не освоил {', '.join(bad_topics)}."
-            if bad_topics else "Я советую такой объем занятий для поддержания текущего уровня знаний."
+        summary = generate_entries(
+            student_ids.iterator(chunk_size=params['chunk_size']),
+            lessons_count=params['lessons_count'],
+            chunk_size=params['chunk_size'],
+            progress=lambda processed, created: logger.info(
+                "Пакетная генерация журнала: обработано %s учеников, создано %s записей", processed, created
+            ),
         )
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+class AnalyticsViewSet(ProfilingMixin, ResponseCacheMixin, viewsets.GenericViewSet):
+    """
+    Отчеты для дашбордов, считаются агрегатами в БД и кэшируются до изменения
+    исходных данных. Фильтры: teacher_id, category_id, student_id, date_from, date_to.
+    """
+    serializer_class = AnalyticsFilterSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+    # StudentTopicMastery пересчитывается после любого изменения результатов, в том числе bulk
+    cache_dependencies = (HomeworkResult, StudentTopicMastery, Homework, Lesson, LessonType, Student, Topic)
 
-        # Создаем запись в журнале
-        journal_entry = JournalEntry.objects.create(
-            student=student,
-            good_results=good_results,
-            bad_results=covered_topics_text,  # Храним список всех тем
-            covered_topics=covered_topics_text,
-            working_on=working_on,
-            recommended_lessons=recommended_lessons,
-            recommendation_reason=recommendation_reason
-        )
+    def list(self, request):
+        return Response({name: request.build_absolute_uri(f'{name}/') for name in REPORTS})
 
-        serializer = self.get_serializer(journal_entry)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    def report(self, request, name):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response({
+            'report': name,
+            'filters': serializer.data,
+            'results': REPORTS[name](serializer.validated_data),
+        })
+
+    @action(detail=False, url_path='topic-performance')
+    def topic_performance(self, request):
+        return self.cached_response(request, self.report, name='topic-performance')
+
+    @action(detail=False, url_path='lessons-per-week')
+    def lessons_per_week(self, request):
+        return self.cached_response(request, self.report, name='lessons-per-week')
+
+    @action(detail=False, url_path='weakest-topics')
+    def weakest_topics(self, request):
+        return self.cached_response(request, self.report, name='weakest-topics')
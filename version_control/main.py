@@ -1,25 +1,124 @@
-from fastapi import FastAPI
+"""
+Сервис истории версий: записи журнала (journal) и комментарии к урокам
+(lesson-comment). Ревизии хранятся в version_control/storage.py.
+
+    uvicorn version_control.main:app --port 8001
+
+VERSION_CONTROL_DB - путь к файлу SQLite (по умолчанию рядом с модулем),
+VERSION_CONTROL_SNAPSHOT_INTERVAL - через сколько ревизий писать полный снимок.
+"""
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+try:
+    from .storage import RevisionNotFound, RevisionStore
+except ImportError:  # запуск из каталога сервиса: uvicorn main:app
+    from storage import RevisionNotFound, RevisionStore
+
+DOCUMENT_KINDS = ('journal', 'lesson-comment')
+
+
+class RevisionIn(BaseModel):
+    content: Any
+    author: Optional[str] = None
+
+
+class DocumentRevisionIn(RevisionIn):
+    kind: str
+    doc_id: int
+
+
+def create_app(path=None, snapshot_interval=None):
+    path = path or os.getenv('VERSION_CONTROL_DB', str(Path(__file__).resolve().parent / 'revisions.sqlite3'))
+    snapshot_interval = snapshot_interval or int(os.getenv('VERSION_CONTROL_SNAPSHOT_INTERVAL', 16))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.store = RevisionStore(path, snapshot_interval)
+        try:
+            yield
+        finally:
+            app.state.store.close()
+
+    app = FastAPI(
+        title="Version Control API",
+        description="Version Control service for Tutor Control",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+
+    # Add CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    def document(kind, doc_id):
+        if kind not in DOCUMENT_KINDS:
+            raise HTTPException(404, f"Unknown document kind {kind!r}, expected one of {', '.join(DOCUMENT_KINDS)}")
+        return f'{kind}:{doc_id}'
+
+    # Обработчики синхронные: FastAPI выполняет их в пуле потоков, хранилище под блокировкой
+    @app.get("/")
+    def root():
+        return {"message": "Version Control API is running"}
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    @app.post("/documents/{kind}/{doc_id}/revisions", status_code=201)
+    def commit(kind: str, doc_id: int, revision: RevisionIn):
+        return app.state.store.commit(document(kind, doc_id), revision.content, revision.author)
+
+    @app.post("/revisions", status_code=201)
+    def commit_batch(revisions: list[DocumentRevisionIn]):
+        """Несколько ревизий разных документов одним запросом и одной транзакцией."""
+        documents = [document(revision.kind, revision.doc_id) for revision in revisions]
+        return app.state.store.commit_many(
+            (name, revision.content, revision.author) for name, revision in zip(documents, revisions)
+        )
+
+    @app.get("/documents/{kind}/{doc_id}/revisions")
+    def history(kind: str, doc_id: int):
+        try:
+            return app.state.store.history(document(kind, doc_id))
+        except RevisionNotFound:
+            raise HTTPException(404, "Document has no revisions")
+
+    @app.get("/documents/{kind}/{doc_id}/revisions/latest")
+    def latest(kind: str, doc_id: int):
+        try:
+            return app.state.store.head(document(kind, doc_id))
+        except RevisionNotFound:
+            raise HTTPException(404, "Document has no revisions")
+
+    @app.get("/documents/{kind}/{doc_id}/revisions/{version}")
+    def get_version(kind: str, doc_id: int, version: int):
+        try:
+            return {'version': version, 'content': app.state.store.get(document(kind, doc_id), version)}
+        except RevisionNotFound:
+            raise HTTPException(404, "Revision not found")
+
+    @app.get("/documents/{kind}/{doc_id}/diff")
+    def diff(kind: str, doc_id: int, from_version: int = Query(alias='from'), to_version: int = Query(alias='to'),
+             context: int = Query(3, ge=0)):
+        try:
+            lines = app.state.store.diff(document(kind, doc_id), from_version, to_version, context)
+        except RevisionNotFound:
+            raise HTTPException(404, "Revision not found")
+        return {'from': from_version, 'to': to_version, 'diff': lines}
+
+    return app
+
 
-app = FastAPI(
-    title="Version Control API",
-    description="Version Control service for Tutor Control",
-    version="1.0.0"
-)
-
-# Add CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.get("/")
-async def root():
-    return {"message": "Version Control API is running"}
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+app = create_app()
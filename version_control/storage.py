@@ -0,0 +1,243 @@
+"""
+Хранилище ревизий документов (записи журнала, комментарии к урокам).
+
+Журнал ревизий только дописывается. Каждая ревизия хранится либо целиком
+(snapshot), либо дельтой к предыдущей (delta); полный снимок пишется для
+первой ревизии, после каждых snapshot_interval - 1 дельт подряд и когда
+дельта выходит не меньше половины самого текста. Payload сжимается zlib.
+
+- Запись: на диск пишется только сама ревизия, полный текст - только в
+  снимках. Текст последней версии берется из кэша в памяти (head_cache_size
+  документов), а при промахе собирается из снимка и не более
+  snapshot_interval - 1 дельт. Общие начало и конец отбрасываются за один
+  проход, а дельта строится только по измененному участку. Ее размер
+  пропорционален изменению.
+- Чтение версии N: ближайший снимок <= N и не более snapshot_interval - 1
+  дельт после него.
+"""
+import datetime
+import difflib
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+# Дольше этого измененный участок не выравнивается посимвольно, а заменяется целиком
+MAX_MATCH_REGION = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revisions (
+    document TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    author TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (document, version)
+);
+CREATE INDEX IF NOT EXISTS revisions_snapshots ON revisions (document, kind, version);
+"""
+
+
+class RevisionNotFound(LookupError):
+    pass
+
+
+def make_delta(old, new):
+    """
+    Операции, превращающие old в new: ['=', n] - скопировать n символов,
+    ['-', n] - пропустить n символов, ['+', текст] - вставить текст.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-suffix - 1] == new[-suffix - 1]:
+        suffix += 1
+    old_middle, new_middle = old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+
+    ops = [['=', prefix]] if prefix else []
+    if len(old_middle) + len(new_middle) <= MAX_MATCH_REGION:
+        matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append(['=', i2 - i1])
+                continue
+            if i2 > i1:
+                ops.append(['-', i2 - i1])
+            if j2 > j1:
+                ops.append(['+', new_middle[j1:j2]])
+    else:
+        if old_middle:
+            ops.append(['-', len(old_middle)])
+        if new_middle:
+            ops.append(['+', new_middle])
+    if suffix:
+        ops.append(['=', suffix])
+    return ops
+
+
+def apply_delta(old, ops):
+    parts, position = [], 0
+    for op, value in ops:
+        if op == '=':
+            parts.append(old[position:position + value])
+            position += value
+        elif op == '-':
+            position += value
+        else:
+            parts.append(value)
+    return ''.join(parts)
+
+
+def canonical(content):
+    """Текст документа: строки как есть, структуры - JSON с сортировкой ключей построчно."""
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, ensure_ascii=False, sort_keys=True, indent=1)
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode())
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+class RevisionStore:
+    def __init__(self, path, snapshot_interval=16, head_cache_size=1024):
+        self.snapshot_interval = max(int(snapshot_interval), 1)
+        self.head_cache_size = head_cache_size
+        self._heads = OrderedDict()  # документ -> (версия, текст), последние использованные в конце
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def commit(self, document, content, author=None):
+        """
+        Добавляет ревизию. Возвращает {'version', 'kind', 'size', 'created'};
+        если текст не изменился, новая ревизия не создается (created=False).
+        """
+        return self.commit_many([(document, content, author)])[0]
+
+    def commit_many(self, revisions):
+        """Ревизии [(document, content, author)] по порядку в одной транзакции."""
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                results = [self._commit(document, content, author) for document, content, author in revisions]
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                self._heads.clear()  # в кэше могли остаться откаченные версии
+                raise
+        return results
+
+    def _commit(self, document, content, author):
+        content = canonical(content)
+        latest = self._latest(document)
+        version, kind, value, chain = 1, SNAPSHOT, content, 0
+        if latest is not None:
+            head = self._head(document, latest[0])
+            if head == content:
+                return {'version': latest[0], 'kind': None, 'size': 0, 'created': False}
+            version = latest[0] + 1
+            delta = make_delta(head, content)
+            # Вставленный текст плюс примерно по символу на операцию
+            delta_size = sum(len(v) if op == '+' else 1 for op, v in delta)
+            if latest[1] + 1 < self.snapshot_interval and delta_size * 2 < len(content):
+                kind, value, chain = DELTA, delta, latest[1] + 1
+        payload = _pack(value)
+        self._conn.execute(
+            'INSERT INTO revisions (document, version, kind, payload, size, author, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (document, version, kind, payload, len(payload), author,
+             datetime.datetime.now(datetime.timezone.utc).isoformat()),
+        )
+        self._remember(document, version, content)
+        return {'version': version, 'kind': kind, 'size': len(payload), 'created': True}
+
+    def _latest(self, document):
+        """(последняя версия, число дельт после снимка) или None. Оба MAX - по индексам."""
+        latest, snapshot = self._conn.execute(
+            'SELECT (SELECT MAX(version) FROM revisions WHERE document = ?), '
+            '(SELECT MAX(version) FROM revisions WHERE document = ? AND kind = ?)',
+            (document, document, SNAPSHOT),
+        ).fetchone()
+        return None if latest is None else (latest, latest - snapshot)
+
+    def _head(self, document, version):
+        cached = self._heads.get(document)
+        if cached is not None and cached[0] == version:
+            self._heads.move_to_end(document)
+            return cached[1]
+        # Версию мог записать другой процесс - собираем текст из ревизий
+        content = self._read(document, version)
+        self._remember(document, version, content)
+        return content
+
+    def _remember(self, document, version, content):
+        self._heads[document] = (version, content)
+        self._heads.move_to_end(document)
+        while len(self._heads) > self.head_cache_size:
+            self._heads.popitem(last=False)
+
+    def _read(self, document, version):
+        rows = self._conn.execute(
+            'SELECT version, kind, payload FROM revisions WHERE document = ? AND version <= ? AND version >= ('
+            '  SELECT MAX(version) FROM revisions WHERE document = ? AND kind = ? AND version <= ?'
+            ') ORDER BY version',
+            (document, version, document, SNAPSHOT, version),
+        ).fetchall()
+        if not rows or rows[-1][0] != version:
+            raise RevisionNotFound(f'{document}@{version}')
+        content = None
+        for _, kind, payload in rows:
+            value = _unpack(payload)
+            content = value if kind == SNAPSHOT else apply_delta(content, value)
+        return content
+
+    def head(self, document):
+        with self._lock:
+            latest = self._latest(document)
+            if latest is None:
+                raise RevisionNotFound(document)
+            return {'version': latest[0], 'content': self._head(document, latest[0])}
+
+    def get(self, document, version):
+        """Текст версии version: снимок и не более snapshot_interval - 1 дельт."""
+        with self._lock:
+            return self._read(document, version)
+
+    def history(self, document):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT version, kind, size, author, created_at FROM revisions WHERE document = ? ORDER BY version',
+                (document,),
+            ).fetchall()
+        if not rows:
+            raise RevisionNotFound(document)
+        return [
+            {'version': version, 'kind': kind, 'size': size, 'author': author, 'created_at': created_at}
+            for version, kind, size, author, created_at in rows
+        ]
+
+    def diff(self, document, from_version, to_version, context=3):
+        """Построчный unified diff между двумя версиями."""
+        old, new = self.get(document, from_version), self.get(document, to_version)
+        return list(difflib.unified_diff(
+            old.splitlines(), new.splitlines(),
+            fromfile=f'{document}@{from_version}', tofile=f'{document}@{to_version}',
+            n=context, lineterm='',
+        ))